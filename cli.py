@@ -1,5 +1,169 @@
-# from src.__main__ import main
-from src.dt.DigitalTwinInterface import main
+# Program: cli.py
+# Purpose: The command line of the digital twin. Every command imports only what it needs, so that
+#   simulate, ingest and bench never load pyplot or a GUI backend, and a command starts as fast as
+#   its own dependencies allow (measure with python -X importtime cli.py <command> ...).
+#
+# Usage:
+#   python cli.py simulate --set R_a=0.6 --set controller="'pid'" --record run.tankrec
+#   python cli.py render --recording run.tankrec --output run.gif
+#   python cli.py ingest --host localhost --vehicles 0 1 2 --record fleet.tankrec
+#   python cli.py bench run --output results.json
+#
+# With no command the default scenario is simulated and animated, as before.
+
+import argparse
+import ast
+import sys
+
+def parseSettings(settings: list) -> dict:
+    '''
+    Parses KEY=VALUE scenario parameters, reading each value as a Python literal (so numbers,
+    lists and quoted strings) and falling back to the plain string
+    '''
+    parameters = dict()
+    for setting in settings or []:
+        key, sep, value = setting.partition('=')
+        if not sep: raise SystemExit("Expected KEY=VALUE, got '%s'" % setting)
+        try:
+            parameters[key.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            parameters[key.strip()] = value
+    return parameters
+
+def buildTwin(args):
+    '''Simulates the scenario given by --set and --controller as a Tank_TD, without plotting'''
+    from src.dt.Scenario import Scenario
+    from src.dt.DigitalTwinInterface import Tank_TD
+
+    parameters = parseSettings(args.set)
+    if args.controller is not None: parameters['controller'] = args.controller
+    try:
+        return Tank_TD(Scenario(**parameters), to_plot=False)
+    except KeyError as error:
+        raise SystemExit(error.args[0])
+
+def simulate(args) -> int:
+    twin = buildTwin(args)
+    x, y, theta = twin.tank.integrateTrajectory(twin.time, twin.port_rpm, twin.strb_rpm)
+    print('samples      %d over %g s' % (len(twin.time), twin.time[-1] if len(twin.time) else 0.))
+    print('final rpm    port %.3f  starboard %.3f' % (twin.port_rpm[-1], twin.strb_rpm[-1]))
+    print('final pose   x %.3f  y %.3f  theta %.3f' % (x[-1], y[-1], theta[-1]))
+    if args.record: twin.record(args.record)
+    if args.packets:
+        with open(args.packets, 'wb') as f:
+            f.write(twin.getPackets(args.vehicle_id).tobytes())
+    return 0
+
+def render(args) -> int:
+    if args.recording:
+        from src.pipeline.recording import Replayer
+        replayer = Replayer(args.recording, args.start, args.stop)
+        if args.output:
+            from src.gui.FrameExporter import FrameExporter
+            from src.objects.Tank import Tank
+            data = replayer.recording.read(('time', 'port_rpm', 'strb_rpm'), replayer.start, replayer.stop)
+            exporter = FrameExporter(Tank(), data['time'], data['port_rpm'], data['strb_rpm'], args.workers,
+                                     poses=replayer.getPoses())
+        else:
+            replayer.animator().animate(speed=args.speed)
+            return 0
+    else:
+        twin = buildTwin(args)
+        if not args.output:
+            from src.gui.TankAnimator import TankAnimator
+            TankAnimator(tank=twin.tank, time=twin.time, port_rpm=twin.port_rpm,
+                         strb_rpm=twin.strb_rpm).animate(speed=args.speed)
+            return 0
+        from src.gui.FrameExporter import FrameExporter
+        exporter = FrameExporter(twin.tank, twin.time, twin.port_rpm, twin.strb_rpm, args.workers)
+
+    exporter.exportVideo(args.output, args.fps)
+    return 0
+
+def ingest(args) -> int:
+    import asyncio
+    from src.pipeline.ingest import TelemetryIngestor, PahoClient
+    from src.pipeline.packet import decodeBatch
+
+    recorder = None
+    if args.record:
+        from src.pipeline.recording import Recorder
+        recorder = Recorder(args.record)
+        sink = recorder.appendPackets
+    else:
+        def sink(packets):
+            for packet in packets: print(packet)
+    ingestor = TelemetryIngestor(PahoClient(args.host, args.port), vehicles=args.vehicles, decoder=decodeBatch,
+                                 sink=sink, queue_size=args.queue_size, drop_policy=args.drop_policy)
+    try:
+        asyncio.run(ingestor.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder is not None: recorder.close()
+    print(ingestor.getStats(), file=sys.stderr)
+    return 0
+
+def bench(args) -> int:
+    from src.analysis import benchmarks
+    return benchmarks.main(args)
+
+def addScenarioArguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE',
+                        help='A scenario parameter (see Scenario.DEFAULTS), may be repeated')
+    parser.add_argument('--controller', choices=('pid', 'lqr'), help='Track the rpm schedules in closed loop')
+
+def buildParser(bench_commands: bool=False) -> argparse.ArgumentParser:
+    '''
+    Builds the parser from the standard library alone, so the choices of the ingest drop policy
+    mirror src.pipeline.ingest.DROP_POLICIES. The bench commands are defined by the benchmarks
+    module, which is only imported if bench_commands is True
+    '''
+    parser = argparse.ArgumentParser(description='The tank digital twin')
+    commands = parser.add_subparsers(dest='command')
+
+    simulate_parser = commands.add_parser('simulate', help='Simulate a scenario headlessly')
+    addScenarioArguments(simulate_parser)
+    simulate_parser.add_argument('--record', help='Save the run to a recording')
+    simulate_parser.add_argument('--packets', help='Save the run as raw telemetry packets')
+    simulate_parser.add_argument('--vehicle-id', type=int, default=0)
+    simulate_parser.set_defaults(run=simulate)
+
+    render_parser = commands.add_parser('render', help='Animate a scenario or a recording, or export it')
+    addScenarioArguments(render_parser)
+    render_parser.add_argument('--recording', help='Render this recording instead of simulating')
+    render_parser.add_argument('--start', type=float, help='The start of the recording window (s)')
+    render_parser.add_argument('--stop', type=float, help='The end of the recording window (s)')
+    render_parser.add_argument('--output', '-o', help='Export to this GIF or video without a window')
+    render_parser.add_argument('--fps', type=float, default=30.)
+    render_parser.add_argument('--workers', type=int, default=1)
+    render_parser.add_argument('--speed', type=float, default=1., help='The playback speed of the window')
+    render_parser.set_defaults(run=render)
+
+    ingest_parser = commands.add_parser('ingest', help='Receive vehicle telemetry from an MQTT broker')
+    ingest_parser.add_argument('--host', default='localhost')
+    ingest_parser.add_argument('--port', type=int, default=1883)
+    ingest_parser.add_argument('--vehicles', nargs='+', default=['+'], help="The vehicle ids, '+' for all")
+    ingest_parser.add_argument('--queue-size', type=int, default=10000)
+    ingest_parser.add_argument('--drop-policy', choices=('drop_oldest', 'drop_newest', 'block'), default='drop_oldest')
+    ingest_parser.add_argument('--record', help='Append the packets to this recording instead of printing them')
+    ingest_parser.set_defaults(run=ingest)
+
+    bench_parser = commands.add_parser('bench', help='Time the hot paths or compare against a baseline')
+    bench_parser.set_defaults(run=bench)
+    if bench_commands:
+        from src.analysis import benchmarks
+        benchmarks.addArguments(bench_parser)
+    return parser
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = buildParser(bench_commands=argv[:1] == ['bench']).parse_args(argv)
+    if args.command is None:
+        from src.dt.DigitalTwinInterface import main as animate
+        animate()
+        return 0
+    return args.run(args)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
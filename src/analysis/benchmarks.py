@@ -0,0 +1,235 @@
+# Program: benchmarks.py
+# Purpose: Time the hot paths of the twin (solvers, kinematics and rendering) headlessly, with fixed
+#   seeds and sizes, save the results as JSON and compare them against a stored baseline.
+#
+# Usage:
+#   python -m src.analysis.benchmarks run --output results.json
+#   python -m src.analysis.benchmarks compare baseline.json results.json --threshold 0.2
+
+import argparse
+import json
+import platform
+import sys
+import time as clock
+
+import numpy as np
+
+SEED = 0
+
+# name -> (setup, number, size): setup() returns the function to time, which is called number times
+# per repeat on a problem of the given size
+BENCHMARKS = dict()
+
+def benchmark(name: str, number: int=1, size: int=None):
+    '''Registers a setup function as the benchmark name'''
+    def register(setup):
+        BENCHMARKS[name] = (setup, number, size)
+        return setup
+    return register
+
+def _motorInputs(samples: int) -> tuple:
+    rng = np.random.default_rng(SEED)
+    time = np.linspace(0, 10, samples)
+    return time, 12 + rng.normal(0, 1, samples), np.full(samples, -0.05)
+
+@benchmark('ss_solver_foh', size=10000)
+def _ssSolverFOH():
+    from src.objects.DC_Motor import DC_Motor
+    from src.simulation.ss_solver import ss_solver
+    time, voltage, load = _motorInputs(10000)
+    sys, U = DC_Motor().createStateSpace(), np.column_stack((voltage, load))
+    return lambda: ss_solver(sys, time, U, method='foh')
+
+@benchmark('ss_solver_odeint', size=200)
+def _ssSolverOdeint():
+    from src.objects.DC_Motor import DC_Motor
+    from src.simulation.ss_solver import ss_solver
+    time, voltage, load = _motorInputs(200)
+    sys, U = DC_Motor().createStateSpace(), np.column_stack((voltage, load))
+    return lambda: ss_solver(sys, time, U, method='odeint')
+
+@benchmark('ss_solver_batch', size=1000)
+def _ssSolverBatch():
+    from src.objects.DC_Motor import DC_Motor
+    time, voltage, load = _motorInputs(1000)
+    R_a = np.random.default_rng(SEED).uniform(0.4, 0.6, 1000)
+    return lambda: DC_Motor.simulateEnsemble(time, voltage, load, R_a=R_a)
+
+@benchmark('DC_Motor.simulateMotor', size=10000)
+def _simulateMotor():
+    from src.objects.DC_Motor import DC_Motor
+    time, voltage, load = _motorInputs(10000)
+    motor = DC_Motor()
+    return lambda: motor.simulateMotor(time, voltage, load)
+
+@benchmark('Tank.simulateMotors', size=10000)
+def _simulateMotors():
+    from src.objects.Tank import Tank
+    time, voltage, load = _motorInputs(10000)
+    tank = Tank()
+    return lambda: tank.simulateMotors(time, voltage, voltage[::-1], load, load)
+
+@benchmark('Tank.move', number=10, size=1000)
+def _move():
+    from src.objects.Tank import Tank
+    rng = np.random.default_rng(SEED)
+    rpm = rng.uniform(-20, 20, (1000, 2))
+    tank = Tank()
+    def run():
+        tank.updatePosition(0, 0, 0)
+        for port, strb in rpm: tank.move(port, strb, 0.03)
+    return run
+
+@benchmark('Tank.integrateTrajectory', size=100000)
+def _integrateTrajectory():
+    from src.objects.Tank import Tank
+    rng = np.random.default_rng(SEED)
+    time = np.arange(100000) * 0.001
+    port, strb = rng.uniform(-20, 20, (2, 100000))
+    tank = Tank()
+    return lambda: tank.integrateTrajectory(time, port, strb)
+
+def _headlessAxes():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(-50, 50)
+    ax.set_ylim(-50, 50)
+    return fig, ax
+
+@benchmark('DrawTank.update', number=100, size=1)
+def _drawTankUpdate():
+    from src.gui import DrawTank
+    from src.objects.Tank import Tank
+    tank = Tank()
+    fig, ax = _headlessAxes()
+    parts = [DrawTank.Chassis(tank), DrawTank.Tread(tank, 'port'), DrawTank.Tread(tank, 'strb'), DrawTank.FrontDot(tank)]
+    ridges = [DrawTank.Ridges(tank, 0., 'port'), DrawTank.Ridges(tank, 0., 'strb')]
+    frame = [0]
+    def run():
+        frame[0] += 1
+        tank.move(10, 12, 0.03)
+        for part in parts: part.update()
+        for ridge in ridges: ridge.update(frame[0] * 0.03)
+    return run
+
+@benchmark('BlitManager.update', number=50, size=1)
+def _blitManagerUpdate():
+    from src.gui.TankAnimator import TankAnimator
+    from src.objects.Tank import Tank
+    time = np.arange(0, 30, 0.03)
+    anim = TankAnimator(tank=Tank(), time=time, port_rpm=20 + 0 * time, strb_rpm=15 + 0 * time, headless=True)
+    frame = [0]
+    def run():
+        frame[0] = (frame[0] + 1) % len(time)
+        anim.showFrame(frame[0])
+        anim.bm.update()
+    return run
+
+@benchmark('FleetRenderer.update', number=20, size=1000)
+def _fleetRendererUpdate():
+    from src.gui.FleetRenderer import FleetRenderer
+    rng = np.random.default_rng(SEED)
+    fig, ax = _headlessAxes()
+    ax.set_xlim(-500, 500)
+    ax.set_ylim(-500, 500)
+    fleet = FleetRenderer(ax, 1000)
+    x, y, theta = rng.uniform(-450, 450, 1000), rng.uniform(-450, 450, 1000), rng.uniform(0, 6, 1000)
+    def run():
+        fleet.update(x, y, theta, np.ones(1000), -np.ones(1000), 1.)
+        fig.canvas.draw()
+    return run
+
+def timeBenchmark(name: str, repeat: int=5) -> dict:
+    '''Times one benchmark, returning the min, median and mean time per call (s) over repeat repeats'''
+    setup, number, size = BENCHMARKS[name]
+    np.random.seed(SEED)
+    function = setup()
+    function()  # Warm up caches, imports and lazy initialization
+    times = list()
+    for _ in range(repeat):
+        start = clock.perf_counter()
+        for _ in range(number): function()
+        times.append((clock.perf_counter() - start) / number)
+    return {'min': min(times), 'median': float(np.median(times)), 'mean': float(np.mean(times)),
+            'repeat': repeat, 'number': number, 'size': size}
+
+def run(names=None, repeat: int=5, progress=None) -> dict:
+    '''Runs the benchmarks (all by default) and returns the results with a description of the machine'''
+    names = list(BENCHMARKS) if not names else names
+    results = dict()
+    for name in names:
+        if progress is not None: progress(name)
+        results[name] = timeBenchmark(name, repeat)
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'platform': platform.platform(), 'timestamp': clock.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': SEED}
+    return {'meta': meta, 'results': results}
+
+def save(results: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline: dict, current: dict, threshold: float=0.1, statistic: str='median') -> list:
+    '''
+    Compares two sets of results benchmark by benchmark, returning (name, baseline, current, ratio,
+    status) rows where status is 'regression' if current is slower than baseline by more than
+    threshold (a fraction), 'improvement' if faster by more than threshold, and otherwise 'ok',
+    or 'new' / 'missing' for benchmarks in only one of the two
+    '''
+    base, cur = baseline['results'], current['results']
+    rows = list()
+    for name in list(base) + [n for n in cur if n not in base]:
+        if name not in cur: rows.append((name, base[name][statistic], None, None, 'missing'))
+        elif name not in base: rows.append((name, None, cur[name][statistic], None, 'new'))
+        else:
+            ratio = cur[name][statistic] / base[name][statistic]
+            if ratio > 1 + threshold: status = 'regression'
+            elif ratio < 1 / (1 + threshold): status = 'improvement'
+            else: status = 'ok'
+            rows.append((name, base[name][statistic], cur[name][statistic], ratio, status))
+    return rows
+
+def formatComparison(rows: list) -> str:
+    def ms(value): return '-' if value is None else '%.3f' % (value * 1e3)
+    lines = ['%-28s %12s %12s %8s  %s' % ('benchmark', 'baseline ms', 'current ms', 'ratio', 'status')]
+    for name, base, cur, ratio, status in rows:
+        lines.append('%-28s %12s %12s %8s  %s' % (name, ms(base), ms(cur), '-' if ratio is None else '%.2f' % ratio, status))
+    return '\n'.join(lines)
+
+def addArguments(parser: argparse.ArgumentParser):
+    '''Adds the run and compare commands to parser'''
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='Time the benchmarks and save the results')
+    run_parser.add_argument('names', nargs='*', help='The benchmarks to run, all by default: ' + ', '.join(BENCHMARKS))
+    run_parser.add_argument('--output', '-o', help='The JSON file to save the results to')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    compare_parser = commands.add_parser('compare', help='Flag regressions against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='The slowdown, as a fraction, beyond which a benchmark regressed')
+
+def main(args) -> int:
+    '''Runs a parsed command, returning the exit status: 1 if compare found a regression'''
+    if args.command == 'run':
+        unknown = [n for n in args.names if n not in BENCHMARKS]
+        if unknown: raise SystemExit("Unknown benchmarks: " + ', '.join(unknown))
+        results = run(args.names, args.repeat, progress=lambda name: print('running ' + name, file=sys.stderr))
+        for name, result in results['results'].items():
+            print('%-28s %10.3f ms' % (name, result['median'] * 1e3))
+        if args.output: save(results, args.output)
+        return 0
+    rows = compare(load(args.baseline), load(args.current), args.threshold)
+    print(formatComparison(rows))
+    return 1 if any(row[-1] == 'regression' for row in rows) else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the hot paths of the twin')
+    addArguments(parser)
+    sys.exit(main(parser.parse_args()))
@@ -1,7 +1,9 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 def plotSimResults(T, Y, X):
+    # Imported here so that simulating without plotting never loads pyplot
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
     ax.plot(T, X[:, 1], label='Angular Velocity')
     ax.plot(T, X[:, 2], label='Angular Position')
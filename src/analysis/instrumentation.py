@@ -0,0 +1,182 @@
+# Program: instrumentation.py
+# Purpose: Switchable timing of the stages of the twin (simulation, resampling, geometry, blitting,
+#   event processing), kept as latency histograms and counters that can be dumped as a summary or
+#   exported in the Prometheus text format for a local collector to scrape.
+#
+# Usage:
+#   from src.analysis import instrumentation as inst
+#   inst.enable()
+#   with inst.span('animate.blit', deadline=1 / 60): bm.update()
+#   print(inst.summary())
+
+import os
+import threading
+import time as clock
+from bisect import bisect_left
+
+# The upper bounds of the histogram buckets (s), from a microsecond to ten seconds
+BUCKETS = tuple(m * 10. ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.,)
+
+# Off unless switched on, here or with the environment variable TWIN_INSTRUMENT=1
+ENABLED = os.environ.get('TWIN_INSTRUMENT', '') not in ('', '0')
+
+class Histogram:
+    '''The latencies of one stage, counted into BUCKETS, with their sum, maximum and deadline misses'''
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+        self.misses = 0
+
+    def observe(self, seconds: float, deadline: float=None):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max: self.max = seconds
+        if deadline is not None and seconds > deadline: self.misses += 1
+
+    def quantile(self, q: float) -> float:
+        '''Estimates a quantile as the upper bound of the bucket it falls in'''
+        if self.count == 0: return 0.
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS + (self.max,), self.counts):
+            seen += n
+            if seen >= rank: return min(bound, self.max)
+        return self.max
+
+HISTOGRAMS = dict()
+COUNTERS = dict()
+_lock = threading.Lock()
+
+class _Span:
+    __slots__ = ('name', 'deadline', 'start')
+
+    def __init__(self, name: str, deadline: float):
+        self.name = name
+        self.deadline = deadline
+
+    def __enter__(self):
+        self.start = clock.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        observe(self.name, clock.perf_counter() - self.start, self.deadline)
+
+class _NullSpan:
+    '''What span() returns while disabled, so a disabled span costs one call and one check'''
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *args): pass
+
+_NULL_SPAN = _NullSpan()
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    '''Forgets every histogram and counter'''
+    with _lock:
+        HISTOGRAMS.clear()
+        COUNTERS.clear()
+
+def span(name: str, deadline: float=None):
+    '''
+    Returns a context manager timing its body into the histogram name, counting the times it takes
+    longer than deadline (s) if one is given
+    '''
+    return _Span(name, deadline) if ENABLED else _NULL_SPAN
+
+def timed(name: str, deadline: float=None):
+    '''Decorates a function so that every call is timed as span(name, deadline)'''
+    def decorate(function):
+        def wrapper(*args, **kwargs):
+            if not ENABLED: return function(*args, **kwargs)
+            with _Span(name, deadline):
+                return function(*args, **kwargs)
+        wrapper.__name__, wrapper.__doc__ = function.__name__, function.__doc__
+        return wrapper
+    return decorate
+
+def observe(name: str, seconds: float, deadline: float=None):
+    '''Adds one latency (s) to the histogram name'''
+    with _lock:
+        histogram = HISTOGRAMS.get(name)
+        if histogram is None: histogram = HISTOGRAMS[name] = Histogram()
+        histogram.observe(seconds, deadline)
+
+def count(name: str, value: float=1):
+    '''Adds value to the counter name, if enabled'''
+    if not ENABLED: return
+    with _lock:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def summary() -> str:
+    '''Returns a table of every stage's latencies (ms) and deadline misses, and of every counter'''
+    lines = ['%-24s %8s %10s %10s %10s %10s %7s' % ('stage', 'count', 'mean ms', 'p50 ms', 'p99 ms', 'max ms', 'missed')]
+    with _lock:
+        for name in sorted(HISTOGRAMS):
+            h = HISTOGRAMS[name]
+            lines.append('%-24s %8d %10.3f %10.3f %10.3f %10.3f %7d' % (name, h.count, h.sum / max(1, h.count) * 1e3,
+                         h.quantile(0.5) * 1e3, h.quantile(0.99) * 1e3, h.max * 1e3, h.misses))
+        for name in sorted(COUNTERS):
+            lines.append('%-24s %8g' % (name, COUNTERS[name]))
+    return '\n'.join(lines)
+
+def _metricName(name: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+def exportPrometheus(prefix: str='twin') -> str:
+    '''Returns every histogram and counter in the Prometheus text exposition format'''
+    lines = list()
+    with _lock:
+        if HISTOGRAMS:
+            metric = prefix + '_stage_seconds'
+            lines += ['# HELP %s Latency of each stage of the twin.' % metric, '# TYPE %s histogram' % metric]
+            for name in sorted(HISTOGRAMS):
+                h, seen = HISTOGRAMS[name], 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    seen += n
+                    lines.append('%s_bucket{stage="%s",le="%g"} %d' % (metric, name, bound, seen))
+                lines.append('%s_bucket{stage="%s",le="+Inf"} %d' % (metric, name, h.count))
+                lines.append('%s_sum{stage="%s"} %r' % (metric, name, h.sum))
+                lines.append('%s_count{stage="%s"} %d' % (metric, name, h.count))
+            metric = prefix + '_deadline_misses_total'
+            lines += ['# TYPE %s counter' % metric]
+            lines += ['%s{stage="%s"} %d' % (metric, name, HISTOGRAMS[name].misses) for name in sorted(HISTOGRAMS)]
+        for name in sorted(COUNTERS):
+            metric = '%s_%s_total' % (prefix, _metricName(name))
+            lines += ['# TYPE %s counter' % metric, '%s %r' % (metric, COUNTERS[name])]
+    return '\n'.join(lines) + '\n'
+
+def serve(port: int=9464, host: str='127.0.0.1'):
+    '''
+    Serves exportPrometheus() at http://host:port/metrics from a daemon thread, and returns the
+    server (call .shutdown() to stop it)
+    '''
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = exportPrometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
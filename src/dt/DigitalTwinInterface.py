@@ -1,90 +1,71 @@
 import numpy as np
 
 from src.objects import *
-from src.objects.DC_Motor import DC_Motor
-from src.objects.Sprocket import Sprocket
-from src.objects.Tread import Tread
-from src.objects.Tank import Tank
+from src.dt.Scenario import Scenario
 
-from src.gui.TankAnimator import TankAnimator
+from src.pipeline.packet import encodePackets
+from src.pipeline.recording import Recorder
+from src.analysis.instrumentation import span
 
 class Tank_TD:
-    def __init__(self):
-        end_time = 10
-
-        # Simulation parameters
-        self.time = np.arange(0, end_time, 0.03)
-
-        # Motor Parameters
-        R_a = 0.5 #Ohms
-        L_a = 1.5e-3 #Hertz
-        J_M = 2.5e-4 #N-m/(rad/s^2)
-        k = 0.05 #N-m/A
-        B_M = 1.0e-4 #N-m/(rad/s)
-        T_L = .5 #N-m
-
-        port_motor = DC_Motor(R_a, L_a, J_M, k, B_M)
-        strb_motor = DC_Motor(R_a, L_a, J_M, k, B_M)
-
-        # Sprockets Parameters
-        spkt_mass = 0.2 #kg
-        spkt_radius = 0.02 #m
-        spkt_axle_radius = 0.005 #m
-        spkt_rolling_friction = 0.6 #kinetic coeff of friction
-
-        self.driver = Sprocket(mass=spkt_mass, radius=spkt_radius, axle_radius=spkt_axle_radius,
-                                rolling_friciton=spkt_rolling_friction)
-        self.follower = Sprocket(mass=spkt_mass, radius=spkt_radius, axle_radius=spkt_axle_radius,
-                                rolling_friciton=spkt_rolling_friction)
-
-        # Tread Parameters
-        tread_mass_links = 0.907
-        tread_num_followers = 6
-        tread_num_links = 200
-        tread_link_friction = 0.60
-        tread_ground_lift_force = 0.0
-
-        self.tread = Tread(driver=self.driver, follower=self.follower, mass_links=tread_mass_links,
-                           num_followers=tread_num_followers, num_links=tread_num_links, link_friction=tread_link_friction,
-                           ground_lift_force=tread_ground_lift_force)
-
-        # Tank Parameters
-        chassis_height = 10.
-        chassis_width = 5.
-        tread_height = 12.
-        tread_width = 2.
-        driving_radius = 1.
-
-        self.tank = Tank(ch_height=chassis_height, ch_width=chassis_width,
-                    td_height=tread_height, td_width=tread_width, 
-                    radius=driving_radius, port_motor=port_motor, strb_motor=strb_motor, tread=self.tread)
-
-        # Voltage parameters
-        self.port_voltage = list()
-        self.strb_voltage = list()
-        for z in self.time:
-            if z < end_time * 1/3:
-                self.port_voltage.append(18)
-                self.strb_voltage.append(12)
-            elif z < end_time * 1/2:
-                self.port_voltage.append(18)
-                self.strb_voltage.append(-18)
-            elif z < end_time * 2/3:
-                self.port_voltage.append(-12)
-                self.strb_voltage.append(-18)
+    def __init__(self, scenario: Scenario=None, to_plot: bool=True):
+        '''
+        Simulates the tank described by scenario, by default the T-Rex platform driven through
+        four constant voltage segments (see `Scenario`), plotting the drivetrain response unless
+        to_plot is False.
+        '''
+        if scenario is None: scenario = Scenario()
+        self.scenario = scenario
+
+        with span('twin.build'):
+            # Simulation parameters
+            self.time = scenario.getTime()
+
+            self.tank = scenario.buildTank()
+            self.tread = self.tank.tread
+            self.driver = self.tread.driver
+            self.follower = self.tread.follower
+
+            # Voltage and Load parameters
+            self.port_voltage, self.strb_voltage = scenario.getVoltages(self.time)
+            self.port_load, self.strb_load = scenario.getLoads(self.time, self.tank)
+
+        with span('twin.simulate'):
+            if scenario.controller is None:
+                # The voltages are sampled for recording, but solved as the segments of the schedules
+                self.port_rpm, self.strb_rpm = self.tank.simulateDrivetrain(self.time, *scenario.getVoltageSegments(),
+                                                                    *scenario.getLoadValues(self.tank), to_plot)
             else:
-                self.port_voltage.append(12)
-                self.strb_voltage.append(24)
-
-        # Load parameters
-        self.port_load = [self.tread.torque_friction for z in self.time]
-        self.strb_load = [self.tread.torque_friction for z in self.time]
-
-        self.port_rpm, self.strb_rpm = self.tank.simulateMotors(self.time, self.port_voltage, self.strb_voltage, 
-                                                        self.port_load, self.strb_load, True) 
-        #TODO: Figure out how the Moment of Inertia changes with both motors arbitrarily engaged
+                # The voltages are what the speed controllers apply to track the rpm schedules
+                self.port_rpm, self.strb_rpm, self.port_voltage, self.strb_voltage = \
+                    scenario.simulateClosedLoop(self.tank, self.time)
+
+    def getPoses(self) -> tuple:
+        '''
+        Returns the pose (x, y, theta) of the tank at every time: its starting pose at time[0], then
+        the pose after each step, which ends at the next time (see `Tank.integrateTrajectory`)
+        '''
+        x, y, theta = self.tank.integrateTrajectory(self.time, self.port_rpm, self.strb_rpm)
+        start = (self.tank.x, self.tank.y, self.tank.theta)
+        return tuple(np.concatenate(([a0], a[:-1])) for a0, a in zip(start, (x, y, theta)))
+
+    def getPackets(self, vehicle_id: int=0) -> np.ndarray:
+        '''Returns the simulated run as telemetry packets, one per sample (see `src.pipeline.packet`)'''
+        x, y, theta = self.getPoses()
+        return encodePackets(self.time, vehicle_id, port_voltage=self.port_voltage, strb_voltage=self.strb_voltage,
+                             port_rpm=self.port_rpm, strb_rpm=self.strb_rpm, x=x, y=y, theta=theta)
+
+    def record(self, path: str):
+        '''Saves the simulated run to a recording, which `src.pipeline.recording.Replayer` plays back'''
+        x, y, theta = self.getPoses()
+        with Recorder(path) as recorder:
+            recorder.append(self.time, port_voltage=self.port_voltage, strb_voltage=self.strb_voltage,
+                            port_load=self.port_load, strb_load=self.strb_load, port_rpm=self.port_rpm,
+                            strb_rpm=self.strb_rpm, x=x, y=y, theta=theta)
 
     def animate(self):
+        from src.gui.TankAnimator import TankAnimator
+
         self.anim = TankAnimator(tank = self.tank, time=self.time, 
                                  port_rpm=self.port_rpm, strb_rpm=self.strb_rpm)
         self.anim.animate()
@@ -0,0 +1,180 @@
+# Class: Scenario.py
+# Purpose: Describe one configuration of the digital twin (voltage schedules, loads, motor,
+#   sprocket, tread and tank parameters) and build and simulate the tank it describes.
+
+import itertools
+import numpy as np
+
+from src.objects.DC_Motor import DC_Motor
+from src.objects.Sprocket import Sprocket
+from src.objects.Tread import Tread
+from src.objects.Tank import Tank
+from src.simulation.control import PIDController, LQRController
+from src.simulation.resample import resample
+from src.simulation.segments import InputSegments
+
+class Scenario:
+    '''
+    A single configuration of the digital twin. By default this is the configuration simulated by
+    `Tank_TD`: the T-Rex platform driven through four constant voltage segments.
+    '''
+    DEFAULTS = {
+        # Simulation parameters
+        'end_time': 10.,
+        'time_step': 0.03,
+        # Motor Parameters
+        'R_a': 0.5, #Ohms
+        'L_a': 1.5e-3, #Hertz
+        'J_M': 2.5e-4, #N-m/(rad/s^2)
+        'k': 0.05, #N-m/A
+        'B_M': 1.0e-4, #N-m/(rad/s)
+        # Sprockets Parameters
+        'spkt_mass': 0.2, #kg
+        'spkt_radius': 0.02, #m
+        'spkt_axle_radius': 0.005, #m
+        'spkt_rolling_friction': 0.6, #kinetic coeff of friction
+        # Tread Parameters
+        'tread_mass_links': 0.907,
+        'tread_num_followers': 6,
+        'tread_num_links': 200,
+        'tread_link_friction': 0.60,
+        'tread_ground_lift_force': 0.0,
+        # Tank Parameters
+        'chassis_height': 10.,
+        'chassis_width': 5.,
+        'tread_height': 12.,
+        'tread_width': 2.,
+        'driving_radius': 1.,
+        'mass': 5.,
+        # Voltage schedules, as (start time, voltage) pairs held until the next start time. The
+        # default schedules switch at 1/3, 1/2 and 2/3 of end_time
+        'port_schedule': None,
+        'strb_schedule': None,
+        # Load on each motor (N-m), the friction torque of the tread if None
+        'port_load': None,
+        'strb_load': None,
+        # Closed-loop speed control: None drives the motors with the voltage schedules, 'pid' or
+        # 'lqr' tracks the rpm schedules (sprocket rpm) instead, sampled every control_step
+        'controller': None,
+        'control_step': 1e-3, #s
+        'supply_voltage': 24., #V
+        'port_rpm_schedule': None,
+        'strb_rpm_schedule': None,
+    }
+
+    def __init__(self, **kwargs):
+        '''
+        Keyword Arguments:
+        ---
+        Any of the keys of `Scenario.DEFAULTS`, which are used for every key not given.
+        '''
+        for key in kwargs:
+            if key not in self.DEFAULTS: raise KeyError("Unknown scenario parameter '%s'" % key)
+        for key, value in self.DEFAULTS.items():
+            setattr(self, key, kwargs.get(key, value))
+
+        if self.port_schedule is None:
+            self.port_schedule = self.defaultSchedule((18, 18, -12, 12))
+        if self.strb_schedule is None:
+            self.strb_schedule = self.defaultSchedule((12, -18, -18, 24))
+        if self.port_rpm_schedule is None:
+            self.port_rpm_schedule = self.defaultSchedule((30, 30, -20, 20))
+        if self.strb_rpm_schedule is None:
+            self.strb_rpm_schedule = self.defaultSchedule((20, -30, -30, 40))
+        if self.controller not in (None, 'pid', 'lqr'):
+            raise ValueError("controller must be None, 'pid' or 'lqr'")
+
+    def defaultSchedule(self, voltages) -> list:
+        '''Returns a schedule switching between the four voltages at 1/3, 1/2 and 2/3 of end_time'''
+        starts = (0., self.end_time * 1/3, self.end_time * 1/2, self.end_time * 2/3)
+        return list(zip(starts, voltages))
+
+    @staticmethod
+    def grid(**kwargs) -> list:
+        '''
+        Returns a Scenario for every combination of the given parameter values (the cartesian
+        product), in a deterministic order with the last parameter varying fastest. Each keyword
+        is a parameter name with a list of values, e.g. grid(R_a=[0.4, 0.5], mass=[4., 5.])
+        '''
+        keys = list(kwargs)
+        return [Scenario(**dict(zip(keys, values))) for values in itertools.product(*kwargs.values())]
+
+    def getTime(self) -> np.ndarray:
+        return np.arange(0, self.end_time, self.time_step)
+
+    def buildTank(self) -> Tank:
+        '''Builds the tank, with its motors, sprockets and treads, described by the scenario'''
+        port_motor = DC_Motor(self.R_a, self.L_a, self.J_M, self.k, self.B_M)
+        strb_motor = DC_Motor(self.R_a, self.L_a, self.J_M, self.k, self.B_M)
+
+        driver = Sprocket(mass=self.spkt_mass, radius=self.spkt_radius, axle_radius=self.spkt_axle_radius,
+                          rolling_friction=self.spkt_rolling_friction)
+        follower = Sprocket(mass=self.spkt_mass, radius=self.spkt_radius, axle_radius=self.spkt_axle_radius,
+                            rolling_friction=self.spkt_rolling_friction)
+        tread = Tread(driver=driver, follower=follower, mass_links=self.tread_mass_links,
+                      num_followers=self.tread_num_followers, num_links=self.tread_num_links,
+                      link_friction=self.tread_link_friction, ground_lift_force=self.tread_ground_lift_force)
+
+        return Tank(ch_height=self.chassis_height, ch_width=self.chassis_width,
+                    td_height=self.tread_height, td_width=self.tread_width, radius=self.driving_radius,
+                    mass=self.mass, port_motor=port_motor, strb_motor=strb_motor, tread=tread)
+
+    @staticmethod
+    def evaluateSchedule(schedule, time) -> np.ndarray:
+        '''Samples a list of (start time, value) pairs at every time, holding each value'''
+        return InputSegments.fromSchedule(schedule).evaluate(time)[:, 0]
+
+    def getVoltages(self, time) -> tuple:
+        '''Returns the port and starboard voltage at every time'''
+        return self.evaluateSchedule(self.port_schedule, time), self.evaluateSchedule(self.strb_schedule, time)
+
+    def getVoltageSegments(self) -> tuple:
+        '''Returns the port and starboard voltage schedules as `InputSegments`'''
+        return InputSegments.fromSchedule(self.port_schedule), InputSegments.fromSchedule(self.strb_schedule)
+
+    def getLoadValues(self, tank: Tank) -> tuple:
+        '''Returns the port and starboard load, which is constant'''
+        port_load = tank.tread.torque_friction if self.port_load is None else self.port_load
+        strb_load = tank.tread.torque_friction if self.strb_load is None else self.strb_load
+        return port_load, strb_load
+
+    def getLoads(self, time, tank: Tank) -> tuple:
+        '''Returns the port and starboard load at every time'''
+        port_load, strb_load = self.getLoadValues(tank)
+        return np.zeros(len(time)) + port_load, np.zeros(len(time)) + strb_load
+
+    def buildController(self, tank: Tank):
+        '''
+        Builds the speed controller of the scenario for the motors of tank, designed on a motor
+        carrying the inertia reflected onto its shaft by the drivetrain (see `Tank.calcMassMatrix`)
+        '''
+        motor = DC_Motor(self.R_a, self.L_a, tank.calcMassMatrix()[0, 0], self.k, self.B_M)
+        kind = PIDController if self.controller == 'pid' else LQRController
+        return kind.fromMotor(motor, self.control_step, v_min=-self.supply_voltage, v_max=self.supply_voltage)
+
+    def simulateClosedLoop(self, tank: Tank, time) -> tuple:
+        '''
+        Simulates tank tracking the rpm schedules under the scenario's controller, and returns the port
+        and starboard sprocket rpm and voltage at every time
+        '''
+        fine = np.arange(0, self.end_time, self.control_step)
+        port_rpm, strb_rpm = (self.evaluateSchedule(s, fine) for s in (self.port_rpm_schedule, self.strb_rpm_schedule))
+        port_load, strb_load = self.getLoads(fine, tank)
+        results = tank.simulateClosedLoop(fine, port_rpm, strb_rpm, self.buildController(tank), port_load, strb_load)
+        return tuple(resample(fine, values, time, kind='nearest') for values in results)
+
+    def simulate(self, to_plot=False, tank: Tank=None) -> tuple:
+        '''
+        Simulates the scenario, returning the time and the port and starboard sprocket rpm. The
+        tank is built from the scenario if None, pass one in to reuse it afterwards
+        '''
+        time = self.getTime()
+        if tank is None: tank = self.buildTank()
+        if self.controller is not None:
+            port_rpm, strb_rpm, port_voltage, strb_voltage = self.simulateClosedLoop(tank, time)
+            return time, port_rpm, strb_rpm
+        # The schedules are solved segment by segment, exactly across each switch
+        port_voltage, strb_voltage = self.getVoltageSegments()
+        port_load, strb_load = self.getLoadValues(tank)
+        port_rpm, strb_rpm = tank.simulateDrivetrain(time, port_voltage, strb_voltage, port_load, strb_load, to_plot)
+        return time, port_rpm, strb_rpm
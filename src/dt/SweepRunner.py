@@ -0,0 +1,124 @@
+# Class: SweepRunner.py
+# Purpose: Simulate a sweep of Scenarios over a pool of worker processes, writing the results
+#   of every scenario straight into one preallocated shared memory array.
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The quantities stored for every scenario, in order along the second axis of the results
+OUTPUTS = ('port_rpm', 'strb_rpm', 'x', 'y', 'theta')
+
+def simulateInto(results: np.ndarray, scenarios: list, start: int):
+    '''Simulates each scenario and writes its outputs to results[start + i]'''
+    for i, scenario in enumerate(scenarios):
+        tank = scenario.buildTank()
+        time, port_rpm, strb_rpm = scenario.simulate(tank=tank)
+        x, y, theta = tank.integrateTrajectory(time, port_rpm, strb_rpm)
+        results[start + i] = (port_rpm, strb_rpm, x, y, theta)
+
+def _runChunk(name: str, shape: tuple, scenarios: list, start: int) -> int:
+    '''Worker entry point: attaches to the shared results and simulates one chunk of scenarios'''
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        results = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        simulateInto(results, scenarios, start)
+        del results
+    finally:
+        shm.close()
+    return len(scenarios)
+
+class SweepRunner:
+    '''
+    Runs every scenario of a sweep and collects the outputs in one array of shape
+    (len(scenarios), len(OUTPUTS), len(time)), with the results in the same order as the
+    scenarios no matter which worker finishes first. All scenarios must share the same time grid.
+    '''
+
+    def __init__(self, scenarios: list, workers: int=None, chunk_size: int=None, progress=None):
+        '''
+        Inputs:
+        ---
+        scenarios : list
+            The Scenarios to simulate, see `Scenario.grid`
+        workers : int=None
+            The number of worker processes, os.cpu_count() if None. With 1 worker the sweep is
+            run serially in this process
+        chunk_size : int=None
+            The number of scenarios in each unit of work, by default about four units per worker
+        progress : callable=None
+            Called as progress(done, total) each time a unit of work finishes
+        '''
+        self.scenarios = list(scenarios)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        if chunk_size is None: chunk_size = max(1, len(self.scenarios) // (4 * self.workers))
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        grids = {(s.end_time, s.time_step) for s in self.scenarios}
+        if len(grids) > 1: raise ValueError("Every scenario in a sweep must share end_time and time_step.")
+        self.time = self.scenarios[0].getTime() if self.scenarios else np.zeros(0)
+        self.shape = (len(self.scenarios), len(OUTPUTS), len(self.time))
+
+    def chunks(self) -> list:
+        '''Returns the (start, scenarios) units of work'''
+        return [(i, self.scenarios[i:i + self.chunk_size]) for i in range(0, len(self.scenarios), self.chunk_size)]
+
+    def run(self) -> np.ndarray:
+        '''
+        Runs the sweep, in parallel unless there is a single worker. If the pool cannot be used or
+        breaks, the fallback is logged and only the scenarios without a result are run serially.
+        '''
+        results, pending = None, self.chunks()
+        if self.workers > 1 and len(self.scenarios) > self.chunk_size:
+            results, pending, error = self.runParallel()
+            if pending:
+                logger.warning("The process pool failed (%r), running the %d unfinished scenarios serially",
+                               error, sum(len(chunk) for start, chunk in pending))
+        return self.runSerial(results, pending)
+
+    def runSerial(self, results: np.ndarray=None, chunks: list=None) -> np.ndarray:
+        '''Simulates the given units of work (all by default) into results, a new array if None'''
+        if results is None: results = np.empty(self.shape)
+        if chunks is None: chunks = self.chunks()
+        # Progress carries on from whatever has already been simulated
+        done = len(self.scenarios) - sum(len(chunk) for start, chunk in chunks)
+        for start, chunk in chunks:
+            simulateInto(results, chunk, start)
+            done += len(chunk)
+            if self.progress is not None: self.progress(done, len(self.scenarios))
+        return results
+
+    def runParallel(self) -> tuple:
+        '''
+        Runs the sweep over the pool, and returns the results, the units of work left unfinished
+        (empty unless the pool failed) and the error that stopped the pool, if any
+        '''
+        pending = dict(self.chunks())
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(self.shape)) * 8))
+        except OSError as error:
+            return None, self.chunks(), error
+        error = None
+        try:
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    futures = {pool.submit(_runChunk, shm.name, self.shape, chunk, start): start
+                               for start, chunk in pending.items()}
+                    done = 0
+                    for future in as_completed(futures):
+                        done += future.result()
+                        del pending[futures[future]]
+                        if self.progress is not None: self.progress(done, len(self.scenarios))
+            except (OSError, BrokenProcessPool) as e:
+                error = e
+            return np.ndarray(self.shape, dtype=float, buffer=shm.buf).copy(), sorted(pending.items()), error
+        finally:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,84 @@
+# Class: AnimationScheduler.py
+# Purpose: Pace an animation by the wall clock, so that the simulation time shown on screen keeps
+#   up with real time (times a speed factor) no matter how long each frame takes to draw.
+
+from time import perf_counter, sleep
+
+class AnimationScheduler:
+    '''
+    Maps wall-clock time onto simulation time at a chosen speed, and yields the simulation time
+    that should be on screen each time the caller is ready to draw a frame. When drawing falls
+    behind, the samples in between are skipped (dropped); when it is ahead, the caller may sleep
+    until the next frame (up to max_fps) and interpolate between samples.
+
+    Usage:
+    ---
+        for sim_time in AnimationScheduler(time, speed=10):
+            draw the frame for sim_time
+    '''
+
+    def __init__(self, time, speed: float=1., max_fps: float=60., clock=perf_counter, sleep=sleep):
+        '''
+        Inputs:
+        ---
+        time : list
+            The sample times of the simulation (s), in ascending order
+        speed : float=1.
+            Seconds of simulation shown per second of wall-clock time, e.g. 10 or 0.1
+        max_fps : float=60.
+            The highest frame rate to draw at, None to draw as fast as possible
+        clock : callable=time.perf_counter
+            Returns the wall-clock time (s)
+        sleep : callable=time.sleep
+            Waits for the given number of seconds, e.g. a GUI event loop that keeps processing events
+        '''
+        self.time = time
+        self.speed = speed
+        self.max_fps = max_fps
+        self.clock = clock
+        self.sleep = sleep
+        self.start = self.end = None
+        self.frames = 0
+        self.dropped = 0
+        self.lag = 0.
+        self.max_lag = 0.
+
+    def __iter__(self):
+        t_start, t_end = self.time[0], self.time[-1]
+        period = 1 / self.max_fps if self.max_fps else 0.
+        self.start = self.clock()
+        index = 0
+        shown = None
+        while True:
+            now = self.clock()
+            if shown is not None:
+                # How far the simulation has moved on since the last frame was due, in wall time
+                self.lag = max(0., float(now - self.start - (shown - t_start) / self.speed))
+                self.max_lag = max(self.max_lag, self.lag)
+                next_frame = self.due + period
+                if next_frame > now:
+                    self.sleep(next_frame - now)
+                    now = self.clock()
+            self.due = now
+
+            sim_time = min(t_start + (now - self.start) * self.speed, t_end)
+            passed = index
+            while index < len(self.time) - 1 and self.time[index + 1] <= sim_time:
+                index += 1
+            if shown is not None: self.dropped += max(0, index - passed - 1)
+
+            self.frames += 1
+            shown = sim_time
+            yield sim_time
+            if sim_time >= t_end: break
+        self.end = self.clock()
+
+    def getStats(self) -> dict:
+        '''
+        Returns the number of frames drawn, the achieved frames per second, the number of samples
+        that were skipped, and the latest and largest lag behind the wall clock (s)
+        '''
+        if self.start is None: elapsed = 0.
+        else: elapsed = (self.end if self.end is not None else self.clock()) - self.start
+        return {'frames': self.frames, 'fps': self.frames / elapsed if elapsed > 0 else 0.,
+                'dropped': self.dropped, 'lag': self.lag, 'max_lag': self.max_lag}
@@ -1,8 +1,14 @@
-# Example taken from matplotlib example pages: 
+# Example taken from matplotlib example pages:
 # https://matplotlib.org/stable/tutorials/advanced/blitting.html
+# Extended to restore and blit only the regions of the canvas that changed.
+
+from time import perf_counter
+
+import numpy as np
+from matplotlib.transforms import Bbox
 
 class BlitManager:
-    def __init__(self, canvas, animated_artists=()):
+    def __init__(self, canvas, animated_artists=(), dirty_regions=True, full_fraction=0.5):
         """
         Parameters
         ----------
@@ -13,15 +19,33 @@ class BlitManager:
 
         animated_artists : Iterable[Artist]
             List of the artists to manage
+
+        dirty_regions : bool
+            If True, each update only restores, redraws and blits the
+            rectangle covering the artists that moved (where they were and
+            where they are now), instead of the whole figure.
+
+        full_fraction : float
+            If the dirty rectangle covers more than this fraction of the
+            figure, the whole figure is updated instead.
         """
         self.canvas = canvas
         self._bg = None
         self._artists = []
+        self._extents = {}
+        # The limit callbacks of each axes this manager is connected to
+        self._axes_cids = {}
+        self.dirty_regions = dirty_regions
+        self.full_fraction = full_fraction
+        self.stats = {'frames': 0, 'full_frames': 0, 'skipped_frames': 0, 'blit_pixels': 0,
+                      'last_frame_time': 0., 'total_frame_time': 0.}
 
         for a in animated_artists:
             self.add_artist(a)
         # grab the background on every draw
         self.cid = canvas.mpl_connect("draw_event", self.on_draw)
+        # and forget it whenever the figure is resized
+        self.cid_resize = canvas.mpl_connect("resize_event", self.on_resize)
 
     def on_draw(self, event):
         """Callback to register with 'draw_event'."""
@@ -31,6 +55,20 @@ class BlitManager:
                 raise RuntimeError
         self._bg = cv.copy_from_bbox(cv.figure.bbox)
         self._draw_animated()
+        self._extents = self._get_extents()
+
+    def on_resize(self, event):
+        """Callback to register with 'resize_event'."""
+        self.invalidate()
+
+    def on_limits_changed(self, ax):
+        """Callback to register with 'xlim_changed' and 'ylim_changed'."""
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached background, so the next update redraws the whole figure."""
+        self._bg = None
+        self._extents = {}
 
     def add_artist(self, art):
         """
@@ -49,26 +87,146 @@ class BlitManager:
             raise RuntimeError
         art.set_animated(True)
         self._artists.append(art)
+        # The background no longer matches if the view of an axes changes
+        # without a full draw (e.g. limits set programmatically). The
+        # callbacks are bound methods, which matplotlib only holds weakly
+        ax = art.axes
+        if ax is not None and ax not in self._axes_cids:
+            self._axes_cids[ax] = (ax.callbacks.connect('xlim_changed', self.on_limits_changed),
+                                   ax.callbacks.connect('ylim_changed', self.on_limits_changed))
+        self._extents = {}
+
+    def disconnect(self):
+        """Disconnect every callback of this manager from the canvas and axes."""
+        self.canvas.mpl_disconnect(self.cid)
+        self.canvas.mpl_disconnect(self.cid_resize)
+        for ax, cids in self._axes_cids.items():
+            for cid in cids: ax.callbacks.disconnect(cid)
+        self._axes_cids = {}
 
-    def _draw_animated(self):
-        """Draw all of the animated artists."""
+    def _draw_animated(self, artists=None):
+        """Draw all of the animated artists (or only the given ones)."""
         fig = self.canvas.figure
-        for a in self._artists:
+        for a in (self._artists if artists is None else artists):
             fig.draw_artist(a)
 
+    def _get_extents(self):
+        """
+        The window extent of each visible artist, padded for line widths, as
+        (x0, y0, width, height) bounds.
+        """
+        renderer = self.canvas.get_renderer()
+        scale = self.canvas.figure.dpi / 72
+        extents = {}
+        for a in self._artists:
+            if not a.get_visible(): continue
+            try:
+                bbox = a.get_window_extent(renderer)
+            except (AttributeError, NotImplementedError):
+                bbox = None
+            if (bbox is None or not np.isfinite(bbox.extents).all()) and hasattr(a, 'get_datalim'):
+                # collections only know their extent in data coordinates
+                bbox = a.get_datalim(a.axes.transData).transformed(a.axes.transData)
+            if bbox is None or not np.isfinite(bbox.extents).all():
+                extents[a] = self.canvas.figure.bbox.bounds
+                continue
+            width = getattr(a, 'get_linewidth', lambda: 1.)()
+            try: width = max(width)
+            except TypeError: pass
+            extents[a] = bbox.padded(width * scale / 2 + 2).bounds
+        return extents
+
+    @staticmethod
+    def _moved(old, new):
+        """Whether an artist's bounds changed, allowing for rounding noise."""
+        if old is None or new is None: return old is not new
+        return not np.allclose(old, new, rtol=0, atol=1e-6)
+
+    def _get_dirty(self, old, new):
+        """
+        The rectangle covering every artist that moved or was changed in
+        place (is stale), grown until it also covers every artist that
+        overlaps it (those have to be redrawn in full on top of the restored
+        background). old and new map artists to bounds, see `_get_extents`.
+        """
+        changed = [Bbox.from_bounds(*b) for a in set(old) | set(new)
+                   if self._moved(old.get(a), new.get(a)) or (a in new and a.stale)
+                   for b in (old.get(a), new.get(a)) if b is not None]
+        if not changed: return None, []
+        dirty = Bbox.union(changed)
+        boxes = {a: Bbox.from_bounds(*b) for a, b in new.items()}
+        drawn = set()
+        while True:
+            overlapping = [a for a, b in boxes.items() if a not in drawn and b.overlaps(dirty)]
+            if not overlapping: break
+            drawn.update(overlapping)
+            dirty = Bbox.union([dirty] + [boxes[a] for a in overlapping])
+        dirty = Bbox.intersection(dirty, self.canvas.figure.bbox)
+        return dirty, [a for a in self._artists if a in drawn]
+
     def update(self):
         """Update the screen with animated artists."""
+        start = perf_counter()
         cv = self.canvas
         fig = cv.figure
         # paranoia in case we missed the draw event,
         if self._bg is None:
-            self.on_draw(None)
-        else:
+            cv.draw()
+            if self._bg is None: self.on_draw(None)
+            cv.blit(fig.bbox)
+            self._count_frame(start, fig.bbox, full=True)
+        elif not self.dirty_regions:
             # restore the background
             cv.restore_region(self._bg)
             # draw all of the animated artists
             self._draw_animated()
             # update the GUI state
             cv.blit(fig.bbox)
+            self._count_frame(start, fig.bbox, full=True)
+        else:
+            new = self._get_extents()
+            dirty, artists = self._get_dirty(self._extents, new)
+            self._extents = new
+            if dirty is None:
+                self._count_frame(start, None)
+            elif dirty.width * dirty.height > self.full_fraction * fig.bbox.width * fig.bbox.height:
+                cv.restore_region(self._bg)
+                self._draw_animated()
+                cv.blit(fig.bbox)
+                self._count_frame(start, fig.bbox, full=True)
+            else:
+                # snap outwards to whole pixels; restore_region takes the
+                # rectangle in pixels measured from the top of the figure and
+                # an offset, which is zero as the background is not moved
+                x0, y0, x1, y1 = int(dirty.x0), int(dirty.y0), int(dirty.x1) + 1, int(dirty.y1) + 1
+                height = int(fig.bbox.height)
+                cv.restore_region(self._bg, bbox=(x0, height - y1, x1, height - y0), xy=(0, 0))
+                self._draw_animated(artists)
+                region = Bbox.from_extents(x0, y0, x1, y1)
+                cv.blit(region)
+                self._count_frame(start, region)
         # let the GUI event loop process anything it has to do
-        cv.flush_events()
\ No newline at end of file
+        cv.flush_events()
+
+    def _count_frame(self, start, region, full=False):
+        elapsed = perf_counter() - start
+        self.stats['frames'] += 1
+        if full: self.stats['full_frames'] += 1
+        if region is None: self.stats['skipped_frames'] += 1
+        else: self.stats['blit_pixels'] += int(region.width * region.height)
+        self.stats['last_frame_time'] = elapsed
+        self.stats['total_frame_time'] += elapsed
+
+    def get_stats(self):
+        """
+        Return the per-frame counters: the number of frames, of full-figure
+        frames and of frames where nothing changed, the pixels blitted, the
+        time of the last frame and the mean time and blitted fraction of the
+        figure per frame.
+        """
+        stats = dict(self.stats)
+        frames = max(1, stats['frames'])
+        bbox = self.canvas.figure.bbox
+        stats['mean_frame_time'] = stats['total_frame_time'] / frames
+        stats['mean_blit_fraction'] = stats['blit_pixels'] / frames / (bbox.width * bbox.height)
+        return stats
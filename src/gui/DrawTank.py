@@ -9,34 +9,107 @@
 #   https://matplotlib.org/stable/gallery/shapes_and_collections/artist_reference.html#sphx-glr-gallery-shapes-and-collections-artist-reference-py
 
 
+import weakref
 import numpy as np
 import matplotlib.patches as mpatches
-import matplotlib.lines as mlines
+from matplotlib.collections import LineCollection
 
 from src.objects.Tank import Tank
 
-class SuperPatch:
-    def __init__(self):
-        pass
+class TankGeometry:
+    '''
+    Computes the world coordinates of every part of a tank from its pose, by applying one rotation
+    to arrays of points in the tank's own frame. The geometry of a tank is shared by all of its
+    parts (see `TankGeometry.of`) and only recomputed when the pose or time changes, so the cost
+    of a frame does not depend on the number of ridge lines.
+    '''
+    shared = weakref.WeakKeyDictionary()
 
-    def rotate(self, x, y, theta):
-        ''' Rotates a point (x, y) around the origin by theta (radians)'''
-        rotation = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
-        return rotation @ np.array([[x], [y]])
+    # Rows of the anchor array
+    CHASSIS, PORT_TREAD, STRB_TREAD, FRONT_DOT = range(4)
 
-    def translate(self, del_x, del_y, point: list): 
-        ''' Translates a point by del_x and del_y'''
-        shifted_x = del_x + point[0][0]
-        shifted_y = del_y + point[1][0]
-        return (shifted_x, shifted_y) 
-
-    def rotateAndTranslate(self, corner_x, corner_y, center_x, center_y, theta):
-        return self.translate(center_x, center_y, self.rotate(corner_x, corner_y, theta))
+    def __init__(self, tank: Tank):
+        self.tank = tank
+        self.anchor_key = None
+        self.ridge_key = None
+
+    @classmethod
+    def of(cls, tank: Tank):
+        ''' Returns the geometry shared by every part of tank'''
+        if tank not in cls.shared: cls.shared[tank] = cls(tank)
+        return cls.shared[tank]
+
+    def getPose(self) -> tuple:
+        return (self.tank.x, self.tank.y, self.tank.theta)
+
+    def toWorld(self, points):
+        ''' Rotates and translates an array of points (... x 2) from the tank's frame'''
+        x, y, theta = self.getPose()
+        c, s = np.cos(theta), np.sin(theta)
+        return points @ np.array([[c, s], [-s, c]]) + (x, y)
+
+    def localAnchors(self) -> np.ndarray:
+        ''' The corner that anchors the chassis and each tread, and the center of the front dot'''
+        t = self.tank
+        return np.array([[-t.ch_width / 2, -t.ch_height / 2],
+                         [-t.td_width - t.ch_width / 2, -t.td_height / 2],
+                         [t.ch_width / 2, -t.td_height / 2],
+                         [0., (t.ch_height / 2) * 4/5]])
+
+    def getAnchors(self) -> np.ndarray:
+        ''' Returns the anchors in world coordinates (4 x 2), see `localAnchors`'''
+        key = self.getPose()
+        if key != self.anchor_key:
+            self.anchors = self.toWorld(self.localAnchors())
+            self.anchor_key = key
+        return self.anchors
+
+    @staticmethod
+    def ridgeHeights(td_height, direction, time, num_ridge_lines, ridge_steps_per_second):
+        '''
+        The height of each ridge line along a tread, measured from the center of the tread. The
+        ridges step along the tread in the direction of its sprocket (the sign of its rpm) and wrap
+        around at its ends. direction may be an array of any shape, which gains a trailing axis of
+        length num_ridge_lines.
+        '''
+        direction = np.asarray(direction, dtype=float)[..., np.newaxis]
+        spacing = td_height / num_ridge_lines
+        bump_size = td_height / num_ridge_lines / ridge_steps_per_second
+        bump = bump_size + np.floor((time - np.fix(time)) * ridge_steps_per_second)
+        bottom, top = -td_height / 2, td_height / 2
+
+        y = bottom + np.arange(num_ridge_lines) * spacing + direction * bump
+        y = np.where((y - top > 0) & (direction == 1), y - top + bottom, y)
+        return np.where((y - bottom < 0) & (direction == -1), y - bottom + top, y)
+
+    def localRidges(self, time, num_ridge_lines, ridge_steps_per_second) -> np.ndarray:
+        '''
+        The end points of the ridge lines of both treads in the tank's frame, as an array of
+        (side, ridge, end, xy) with the port tread first, see `ridgeHeights`.
+        '''
+        t = self.tank
+        y = self.ridgeHeights(t.td_height, np.sign([t.port_rpm, t.strb_rpm]), time, 
+                              num_ridge_lines, ridge_steps_per_second)
+        left = np.array([[-t.td_width - t.ch_width / 2], [t.ch_width / 2]])
+        points = np.empty((2, num_ridge_lines, 2, 2))
+        points[:, :, 0, 0] = left
+        points[:, :, 1, 0] = left + t.td_width
+        points[:, :, :, 1] = y[:, :, np.newaxis]
+        return points
+
+    def getRidges(self, time, num_ridge_lines=4, ridge_steps_per_second=7) -> np.ndarray:
+        ''' Returns the ridge lines in world coordinates, see `localRidges`'''
+        key = self.getPose() + (np.sign(self.tank.port_rpm), np.sign(self.tank.strb_rpm), time, 
+                                num_ridge_lines, ridge_steps_per_second)
+        if key != self.ridge_key:
+            self.ridges = self.toWorld(self.localRidges(time, num_ridge_lines, ridge_steps_per_second))
+            self.ridge_key = key
+        return self.ridges
 
 class Chassis:
     def __init__(self, tank: Tank):
-        self.util = SuperPatch()
         self.tank = tank
+        self.geometry = TankGeometry.of(tank)
         self.chassis = self.drawPatch()
 
     def drawPatch(self):
@@ -47,14 +120,14 @@ class Chassis:
         return chassis
 
     def calculateXY(self):
-        x = -self.tank.ch_width / 2
-        y = -self.tank.ch_height / 2
-        return self.util.rotateAndTranslate(x, y, self.tank.x, self.tank.y, self.tank.theta)
+        return tuple(self.geometry.getAnchors()[TankGeometry.CHASSIS])
 
     def update(self):
         (x, y) = self.calculateXY()
         theta = self.tank.theta * 180 / np.pi
-        self.chassis.set(xy=(x, y), angle=theta)
+        # Setting an unchanged pose would still mark the patch stale and have it redrawn
+        if (x, y, theta) != (*self.chassis.get_xy(), self.chassis.get_angle()):
+            self.chassis.set(xy=(x, y), angle=theta)
         return self.chassis
 
     def get_patch(self):
@@ -62,8 +135,8 @@ class Chassis:
 
 class Tread:
     def __init__(self, tank: Tank, side: str="port"):
-        self.util = SuperPatch()
         self.tank = tank
+        self.geometry = TankGeometry.of(tank)
         self.side = side
         if side == "port": self.color = 'r'
         else: self.color = 'b'
@@ -77,15 +150,15 @@ class Tread:
         return chassis
 
     def calculateXY(self):
-        if self.side == "port": x = -self.tank.td_width - self.tank.ch_width / 2
-        else: x = self.tank.ch_width / 2
-        y = -self.tank.td_height / 2
-        return self.util.rotateAndTranslate(x, y, self.tank.x, self.tank.y, self.tank.theta)
+        if self.side == "port": row = TankGeometry.PORT_TREAD
+        else: row = TankGeometry.STRB_TREAD
+        return tuple(self.geometry.getAnchors()[row])
 
     def update(self):
         (x, y) = self.calculateXY()
         theta = self.tank.theta * 180 / np.pi
-        self.tread.set(xy=(x, y), angle=theta)
+        if (x, y, theta) != (*self.tread.get_xy(), self.tread.get_angle()):
+            self.tread.set(xy=(x, y), angle=theta)
         return self.tread
 
     def get_patch(self):
@@ -93,8 +166,8 @@ class Tread:
 
 class Ridges:
     def __init__(self, tank: Tank,  time: float, side: str="port"):
-        self.util = SuperPatch()
         self.tank = tank
+        self.geometry = TankGeometry.of(tank)
         self.time = time
         self.side = side
 
@@ -104,78 +177,29 @@ class Ridges:
         self.ridges = self.drawPatch(0.)
 
     def drawPatch(self, time):
-        x_c, y_c = self.calculateXYs(time)
-        ridges = list()
-        for i in range(self.num_ridge_lines):
-            ridges.append(mlines.Line2D([x_c[0][i], x_c[1][i]], [y_c[0][i], y_c[1][i]], c='k', lw=2))
-
-        return ridges
-
-    def calculateXYs(self, time):
-        x_c, y_c = self.getXYlive(time)
-
-        new_x = list()
-        new_y = list()
-        for i in range(len(x_c)):
-            new_x.append(list())
-            new_y.append(list())
-            for j in range(len(x_c[i])):
-                x, y = self.util.rotateAndTranslate(x_c[i][j], y_c[i][j], self.tank.x, self.tank.y, self.tank.theta)
-                new_x[i].append(x)
-                new_y[i].append(y)
-        
-        return new_x, new_y
-
-    def getXYlive(self, time):
-        self.computeSpecs(time)
-
-        x_coord = np.zeros((2, self.num_ridge_lines))
-        y_coord = np.zeros((2, self.num_ridge_lines))
-
-        for i in range(self.num_ridge_lines):
-            x_coord[0][i] = self.btm_lft[0]
-            y_coord[0][i] = self.btm_lft[1] + (i * self.spacing + self.dir * self.bump)
-            
-            overshoot = y_coord[0][i] - self.top_lft[1]
-            undershoot = y_coord[0][i] - self.btm_lft[1]
-            if overshoot > 0 and self.dir == 1:
-                y_coord[0][i] = self.btm_lft[1] + overshoot
-            elif undershoot < 0 and self.dir == -1:
-                y_coord[0][i] = self.top_lft[1] + undershoot
-            
-            x_coord[1][i] = x_coord[0][i] + self.tank.td_width
-            y_coord[1][i] = y_coord[0][i]
-
-        return x_coord, y_coord
-
-    def computeSpecs(self, time):
-        self.theta = self.tank.theta + np.pi/2
-        self.spacing = self.tank.td_height / self.num_ridge_lines
-
-        bump_size = self.tank.td_height / self.num_ridge_lines / self.ridge_steps_per_second
-        self.bump = bump_size + np.floor((time - np.fix(time)) * self.ridge_steps_per_second)
-        if self.side == "port":
-            self.dir = np.sign(self.tank.port_rpm)
-            self.btm_lft = [-self.tank.td_width - self.tank.ch_width / 2, -self.tank.td_height / 2]
-            self.top_lft = [-self.tank.td_width - self.tank.ch_width / 2, self.tank.td_height / 2]
-        else:
-            self.dir = np.sign(self.tank.strb_rpm)
-            self.btm_lft = [self.tank.ch_width / 2, -self.tank.td_height / 2]
-            self.top_lft = [self.tank.ch_width / 2, self.tank.td_height / 2]
-            
+        ''' Draws every ridge line of the tread with a single LineCollection'''
+        self.segments = self.calculateSegments(time)
+        return LineCollection(self.segments, colors='k', linewidths=2, animated=True)
+
+    def calculateSegments(self, time):
+        ''' Returns the ridge lines as an array of (ridge, end, xy) in world coordinates'''
+        ridges = self.geometry.getRidges(time, self.num_ridge_lines, self.ridge_steps_per_second)
+        return ridges[0 if self.side == "port" else 1]
+
     def update(self, time):
-        (x_c, y_c) = self.calculateXYs(time)
-        for i in range(self.num_ridge_lines):
-            self.ridges[i].set(xdata=[x_c[0][i], x_c[1][i]], ydata=[y_c[0][i], y_c[1][i]])
+        segments = self.calculateSegments(time)
+        if not np.array_equal(segments, self.segments):
+            self.ridges.set_segments(segments)
+            self.segments = segments
         return self.ridges
 
     def get_lines(self):
-        return self.ridges
+        return [self.ridges]
 
 class FrontDot:
     def __init__(self, tank: Tank):
-        self.util = SuperPatch()
         self.tank = tank
+        self.geometry = TankGeometry.of(tank)
         self.height_prop = 4/5
         self.radius = .5
         self.front_dot = self.drawPatch()
@@ -186,18 +210,13 @@ class FrontDot:
         return chassis
 
     def calculateXY(self):
-        dot_height = (self.tank.ch_height / 2) * 4/5
-        x = self.tank.x + dot_height * np.cos(np.pi/2 + self.tank.theta)
-        y = self.tank.y + dot_height * np.sin(np.pi/2 + self.tank.theta)
-        return (x, y)
+        return tuple(self.geometry.getAnchors()[TankGeometry.FRONT_DOT])
 
     def update(self):
         (x, y) = self.calculateXY()
-        self.front_dot.set(center=(x, y))
+        if (x, y) != tuple(self.front_dot.get_center()):
+            self.front_dot.set(center=(x, y))
         return self.front_dot
 
     def get_patch(self):
         return self.front_dot
-
-    
-
@@ -0,0 +1,129 @@
+# Class: FleetRenderer.py
+# Purpose: Draw a fleet of identical differential drive vehicles with a handful of collection
+#   artists, whose vertices are updated in bulk from arrays of poses.
+
+import numpy as np
+from matplotlib.collections import PolyCollection, LineCollection, EllipseCollection
+
+from src.gui.DrawTank import TankGeometry
+from src.objects.Tank import Tank
+
+class FleetRenderer:
+    '''
+    Draws N tanks with the same dimensions as a template tank using three artists: one
+    PolyCollection for every chassis and tread, one LineCollection for every ridge line and one
+    EllipseCollection for every front dot. Each update rotates the shapes of all tanks at once, so
+    the cost of a frame grows with the number of vertices rather than the number of artists.
+
+    As a level of detail, the ridges are hidden and the outlines thinned whenever a tank is drawn
+    shorter than `detail_pixels` on screen.
+    '''
+
+    def __init__(self, ax, num_tanks: int, tank: Tank=None, num_ridge_lines: int=4,
+                 ridge_steps_per_second: float=7, detail_pixels: float=20.):
+        '''
+        Inputs:
+        ---
+        ax : Axes
+            The axes to draw the fleet on
+        num_tanks : int
+            The number of tanks in the fleet
+        tank : Tank=None
+            The tank whose dimensions every tank shares, a default Tank if None
+        num_ridge_lines : int=4
+            The number of ridge lines drawn on each tread
+        ridge_steps_per_second : float=7
+            How quickly the ridges step along the treads
+        detail_pixels : float=20.
+            The on-screen length of a tank (pixels) below which ridges are hidden
+        '''
+        self.ax = ax
+        self.num_tanks = num_tanks
+        self.tank = tank if tank is not None else Tank()
+        self.num_ridge_lines = num_ridge_lines
+        self.ridge_steps_per_second = ridge_steps_per_second
+        self.detail_pixels = detail_pixels
+
+        # The chassis and both treads as (polygon, corner, xy) in the tank's frame
+        t = self.tank
+        corners = np.array([[0., 0.], [1., 0.], [1., 1.], [0., 1.]])
+        anchors = TankGeometry(t).localAnchors()
+        self.local_bodies = np.stack((anchors[TankGeometry.CHASSIS] + corners * (t.ch_width, t.ch_height),
+                                      anchors[TankGeometry.PORT_TREAD] + corners * (t.td_width, t.td_height),
+                                      anchors[TankGeometry.STRB_TREAD] + corners * (t.td_width, t.td_height)))
+        self.local_dot = anchors[TankGeometry.FRONT_DOT]
+        self.ridge_x = np.array([[-t.td_width - t.ch_width / 2], [t.ch_width / 2]])
+
+        zeros = np.zeros(num_tanks)
+        self.bodies = PolyCollection(self.calculateBodies(zeros, zeros, zeros), animated=True,
+                                     facecolors=['k', 'r', 'b'] * num_tanks, edgecolors='k', linewidths=2)
+        self.ridges = LineCollection(self.calculateRidges(zeros, zeros, zeros, zeros, zeros, 0.),
+                                     animated=True, colors='k', linewidths=2)
+        self.dots = EllipseCollection(np.ones(num_tanks), np.ones(num_tanks), zeros, units='xy',
+                                      offsets=self.calculateDots(zeros, zeros, zeros),
+                                      offset_transform=ax.transData, animated=True, facecolors='y')
+        ax.add_collection(self.bodies, autolim=False)
+        ax.add_collection(self.ridges, autolim=False)
+        ax.add_collection(self.dots, autolim=False)
+
+    @staticmethod
+    def rotations(theta) -> np.ndarray:
+        '''Returns the transposed rotation matrix of every tank (N x 2 x 2), for row vectors'''
+        c, s = np.cos(theta), np.sin(theta)
+        return np.stack((np.stack((c, s), -1), np.stack((-s, c), -1)), -2)
+
+    def toWorld(self, points, x, y, theta):
+        '''Maps points (N x ... x 2) in each tank's frame to the world'''
+        R = self.rotations(np.asarray(theta, dtype=float))
+        shape = points.shape
+        points = points.reshape(shape[0], -1, 2) @ R + np.stack((x, y), -1)[:, np.newaxis]
+        return points.reshape(shape)
+
+    def calculateBodies(self, x, y, theta) -> np.ndarray:
+        '''Returns the chassis and tread polygons of every tank (3N x 4 x 2)'''
+        local = np.broadcast_to(self.local_bodies, (len(x),) + self.local_bodies.shape)
+        return self.toWorld(local, x, y, theta).reshape(-1, 4, 2)
+
+    def calculateDots(self, x, y, theta) -> np.ndarray:
+        '''Returns the center of the front dot of every tank (N x 2)'''
+        local = np.broadcast_to(self.local_dot, (len(x), 1, 2))
+        return self.toWorld(local, x, y, theta)[:, 0]
+
+    def calculateRidges(self, x, y, theta, port_rpm, strb_rpm, time) -> np.ndarray:
+        '''Returns the ridge lines of every tank (2N * num_ridge_lines x 2 x 2)'''
+        t = self.tank
+        direction = np.sign(np.stack((port_rpm, strb_rpm), -1))
+        heights = TankGeometry.ridgeHeights(t.td_height, direction, time, self.num_ridge_lines,
+                                            self.ridge_steps_per_second)
+        points = np.empty((len(x), 2, self.num_ridge_lines, 2, 2))
+        points[..., 0, 0] = self.ridge_x
+        points[..., 1, 0] = self.ridge_x + t.td_width
+        points[..., 1] = heights[..., np.newaxis]
+        return self.toWorld(points, x, y, theta).reshape(-1, 2, 2)
+
+    def isDetailed(self) -> bool:
+        '''True if tanks are drawn large enough on screen for their ridges to be shown'''
+        x_min, x_max = self.ax.get_xlim()
+        pixels_per_unit = self.ax.bbox.width / abs(x_max - x_min)
+        return self.tank.td_height * pixels_per_unit >= self.detail_pixels
+
+    def update(self, x, y, theta, port_rpm=None, strb_rpm=None, time: float=0.) -> list:
+        '''
+        Moves every tank to its pose (arrays of length N), with its ridges stepping in the
+        direction of its sprocket speeds at the given time, and returns the artists
+        '''
+        x, y, theta = (np.asarray(a, dtype=float) for a in (x, y, theta))
+        self.bodies.set_verts(self.calculateBodies(x, y, theta))
+        self.dots.set_offsets(self.calculateDots(x, y, theta))
+
+        detailed = self.isDetailed()
+        self.ridges.set_visible(detailed)
+        self.bodies.set_linewidth(2 if detailed else 0.5)
+        if detailed:
+            if port_rpm is None: port_rpm = np.zeros(len(x))
+            if strb_rpm is None: strb_rpm = np.zeros(len(x))
+            self.ridges.set_segments(self.calculateRidges(x, y, theta, port_rpm, strb_rpm, time))
+        return self.get_artists()
+
+    def get_artists(self) -> list:
+        return [self.bodies, self.ridges, self.dots]
@@ -0,0 +1,91 @@
+# Class: FrameExporter.py
+# Purpose: Render a TankAnimator run offscreen on the Agg canvas and export it as a numbered PNG
+#   sequence, a GIF or a video, splitting the frames across worker processes by frame range.
+
+import copy
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from src.gui.TankAnimator import TankAnimator
+from src.objects.Tank import Tank
+
+def _exportRange(tank: Tank, time, port_rpm, strb_rpm, start: int, stop: int, directory: str, pattern: str,
+                 poses=None) -> int:
+    '''Worker entry point: renders frames [start, stop) of a run to PNG files'''
+    anim = TankAnimator(tank=tank, time=time, port_rpm=port_rpm, strb_rpm=strb_rpm, headless=True,
+                        **({} if poses is None else {'poses': poses}))
+    for j in range(start, stop):
+        frame = np.asarray(anim.renderFrame(j))
+        Image.fromarray(frame).save(os.path.join(directory, pattern % j))
+    return stop - start
+
+class FrameExporter:
+    '''
+    Renders every sample of a run as one frame, without a GUI and without pausing, so that
+    exporting is bound only by drawing. Every worker builds its own headless `TankAnimator` and
+    renders a contiguous range of frames, which it can start anywhere because the pose of every
+    frame comes from `Tank.integrateTrajectory`.
+    '''
+
+    def __init__(self, tank: Tank, time, port_rpm, strb_rpm, workers: int=1, poses=None):
+        '''
+        Inputs:
+        ---
+        tank : Tank
+            The tank to render, at its starting pose
+        time, port_rpm, strb_rpm : list
+            The samples of the run, as for `TankAnimator`
+        workers : int=1
+            The number of worker processes to split the frames across
+        poses : tuple=None
+            The recorded (x, y, theta) at every time, drawn instead of integrating the rpm
+        '''
+        self.tank = tank
+        self.time = np.asarray(time)
+        self.port_rpm = np.asarray(port_rpm)
+        self.strb_rpm = np.asarray(strb_rpm)
+        self.workers = max(1, workers)
+        self.poses = poses
+
+    def ranges(self) -> list:
+        '''Returns the (start, stop) frame range of each worker'''
+        bounds = np.linspace(0, len(self.time), self.workers + 1).astype(int)
+        return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def exportFrames(self, directory: str, pattern: str='frame_%06d.png') -> int:
+        '''Writes every frame to directory as a numbered PNG, and returns the number of frames'''
+        os.makedirs(directory, exist_ok=True)
+        # Every range gets its own copy of the tank, as a worker process would, so rendering never
+        # moves self.tank and a serial export starts from the same pose every time
+        args = [(copy.deepcopy(self.tank), self.time, self.port_rpm, self.strb_rpm, start, stop, directory, pattern,
+                 self.poses) for start, stop in self.ranges()]
+        if len(args) == 1: return _exportRange(*args[0])
+        with ProcessPoolExecutor(max_workers=len(args)) as pool:
+            return sum(pool.map(_exportRange, *zip(*args)))
+
+    def exportVideo(self, path: str, fps: float=30.):
+        '''
+        Writes the run to path, as a GIF (with Pillow) if path ends in .gif and otherwise as a video
+        encoded by ffmpeg, which must be installed
+        '''
+        pattern = 'frame_%06d.png'
+        directory = tempfile.mkdtemp()
+        try:
+            count = self.exportFrames(directory, pattern)
+            if path.lower().endswith('.gif'):
+                frames = (Image.open(os.path.join(directory, pattern % j)) for j in range(1, count))
+                first = Image.open(os.path.join(directory, pattern % 0))
+                first.save(path, save_all=True, append_images=frames, duration=1000 / fps, loop=0)
+            else:
+                from matplotlib import rcParams
+                subprocess.run([rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+                                '-framerate', str(fps), '-i', os.path.join(directory, pattern),
+                                '-pix_fmt', 'yuv420p', path], check=True)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,91 @@
+# Class: RouteTrail.py
+# Purpose: Draw the route travelled by the tank as one persistent line, fed from a bounded ring
+#   buffer so that the cost of each frame does not grow with the length of the run.
+
+import numpy as np
+import matplotlib.lines as mlines
+
+class RouteTrail:
+    '''
+    Keeps the most recent `max_length` points of the route in a ring buffer and shows them, plus
+    the current position of the tank, with a single animated Line2D that is updated in place.
+    A point is only kept once the tank has travelled `min_distance` along its path since the last
+    kept point, so slow or stationary periods do not use up the buffer.
+    '''
+
+    def __init__(self, ax, max_length: int=10000, min_distance: float=0.):
+        '''
+        Inputs:
+        ---
+        ax : Axes
+            The axes to draw the trail on
+        max_length : int=10000
+            The maximum number of points kept in the trail
+        min_distance : float=0.
+            The path length travelled between kept points (units of length)
+        '''
+        self.max_length = max_length
+        self.min_distance = min_distance
+
+        # Every point is written twice, max_length apart, so that the most recent points are
+        # always a contiguous slice of the buffer
+        self.buffer = np.empty((2 * max_length, 2))
+        self.line = mlines.Line2D([], [], ls='--', lw=2, color="#F56600", animated=True)
+        ax.add_line(self.line)
+        self.reset()
+
+    def reset(self):
+        '''Empties the trail'''
+        self.total = 0
+        self.path = 0.
+        self.bin = -1
+        self.last = None
+
+    def getPoints(self) -> np.ndarray:
+        '''Returns the kept points, oldest first, as a view of the buffer'''
+        count = min(self.total, self.max_length)
+        start = (self.total - count) % self.max_length
+        return self.buffer[start:start + count]
+
+    def commit(self, points):
+        '''Writes points (k x 2) to the ring buffer, of which only the last max_length are kept'''
+        skipped = max(0, len(points) - self.max_length)
+        slots = (self.total + skipped + np.arange(len(points) - skipped)) % self.max_length
+        self.buffer[slots] = self.buffer[slots + self.max_length] = points[skipped:]
+        self.total += len(points)
+
+    def append(self, x, y):
+        '''Adds the tank's position to the trail and updates the line'''
+        self.extend([x], [y])
+
+    def extend(self, xs, ys):
+        '''
+        Adds the positions of a route to the trail and updates the line. A position is kept each time
+        the path length of the route crosses another multiple of min_distance.
+        '''
+        points = np.column_stack((xs, ys)).astype(float)
+        if len(points) == 0: return self.line
+        previous = points[:1] if self.last is None else np.array([self.last])
+        steps = np.hypot(*np.diff(np.concatenate((previous, points)), axis=0).T)
+        lengths = self.path + np.cumsum(steps)
+
+        if self.min_distance > 0: bins = np.floor(lengths / self.min_distance)
+        else: bins = self.bin + 1 + np.arange(len(points))
+        keep = bins > np.concatenate(([self.bin], bins[:-1]))
+        self.commit(points[keep])
+
+        self.path = lengths[-1]
+        self.bin = bins[-1]
+        self.last = tuple(points[-1])
+        return self.update()
+
+    def update(self):
+        '''Shows the kept points followed by the current position'''
+        points = self.getPoints()
+        if self.last is not None:
+            points = np.concatenate((points, [self.last]))
+        self.line.set_data(points[:, 0], points[:, 1])
+        return self.line
+
+    def get_line(self):
+        return self.line
@@ -5,10 +5,17 @@
 #   vehicle given a inputted speed or voltage.
 # Permissions: All rights reserved. Do not reuse without written permission from the owner.
 
-import matplotlib.pyplot as plt
-from numpy import arange
+from time import sleep as time_sleep
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from numpy import arange, asarray, concatenate, column_stack
 
 from src.gui.BlitManager import BlitManager
+from src.gui.RouteTrail import RouteTrail
+from src.gui.AnimationScheduler import AnimationScheduler
+from src.simulation.resample import resample
+from src.analysis.instrumentation import span, count
 from src.gui.DrawTank import *
 from src.objects.Tank import Tank
 
@@ -19,31 +26,70 @@ class TankAnimator:
             if key == "time": self.time = value
             if key == "port_rpm": self.port_rpm = value
             if key == "strb_rpm": self.strb_rpm = value
+            if key == "headless": self.headless = value
+            if key == "trail_length": self.trail_length = value
+            if key == "trail_spacing": self.trail_spacing = value
+            if key == "poses": self.recorded_poses = value
 
         if "tank" not in kwargs: self.tank = Tank()
         if "time" not in kwargs: self.time = list(arange(0, 5, 0.1))
         if "port_rpm" not in kwargs: self.port_rpm = [20 for z in self.time]
         if "strb_rpm" not in kwargs: self.strb_rpm = [10 for z in self.time]
-
-        self.fig, self.ax = plt.subplots()
+        if "headless" not in kwargs: self.headless = False
+        if "trail_length" not in kwargs: self.trail_length = 10000
+        if "trail_spacing" not in kwargs: self.trail_spacing = 0.
+        if "poses" not in kwargs: self.recorded_poses = None
+
+        # The pose after every step, so that any frame can be shown without replaying the ones before it
+        if self.recorded_poses is None:
+            self.x0, self.y0, self.theta0 = self.tank.x, self.tank.y, self.tank.theta
+            self.x, self.y, self.theta = self.tank.integrateTrajectory(self.time, self.port_rpm, self.strb_rpm)
+        else:
+            # Recorded (x, y, theta) at every time are drawn as they are, the tank starting at the first
+            # and each step ending at the next, with the last pose held after the last step
+            x, y, theta = (asarray(a, dtype=float) for a in self.recorded_poses)
+            self.tank.updatePosition(x[0], y[0], theta[0])
+            self.x0, self.y0, self.theta0 = x[0], y[0], theta[0]
+            self.x, self.y, self.theta = (concatenate((a[1:], a[-1:])) for a in (x, y, theta))
+
+        # Step j ends at the next sample time, so the pose is known at each of these times
+        last_step = self.time[-1] - self.time[-2] if len(self.time) > 1 else 0.
+        self.pose_time = concatenate((self.time[:1], self.time[1:], [self.time[-1] + last_step]))
+        self.poses = column_stack((concatenate(([self.x0], self.x)), concatenate(([self.y0], self.y)),
+                                   concatenate(([self.theta0], self.theta))))
+
+        if self.headless:
+            # Render on an Agg canvas that never touches pyplot or a GUI backend
+            self.fig = Figure()
+            FigureCanvasAgg(self.fig)
+            self.ax = self.fig.add_subplot()
+        else:
+            # pyplot, and with it the GUI backend, is only loaded for an interactive window
+            import matplotlib.pyplot as plt
+            self.fig, self.ax = plt.subplots()
         self.patch_objects = list()
         self.line_objects = list()
         self.patches = list()
         self.lines = list()
-        self.x_coords = [self.tank.x]
-        self.y_coords = [self.tank.y]
+        self.trail = RouteTrail(self.ax, self.trail_length, self.trail_spacing)
+        self.trail.append(self.tank.x, self.tank.y)
+        self.frame = None
         self.getObjects()
         self.initializePlot()
 
         for a in self.patches:
             self.ax.add_patch(a)
         for a in self.lines:
-            self.ax.add_line(a)
-        all_artists = self.patches + self.lines
+            self.ax.add_collection(a, autolim=False)
+        self.title = self.ax.set_title("")
+        all_artists = [self.trail.get_line()] + self.patches + self.lines + [self.title]
         self.bm = BlitManager(self.fig.canvas, all_artists)
 
-        plt.show(block=False)
-        plt.pause(.1)
+        if self.headless: self.fig.canvas.draw()
+        else:
+            import matplotlib.pyplot as plt
+            plt.show(block=False)
+            plt.pause(.1)
 
     def getObjects(self):
         self.patch_objects.append(Chassis(self.tank))
@@ -70,32 +116,82 @@ class TankAnimator:
         self.ax.set_xlim(self.tank.x - plot_width, self.tank.x + plot_width) #Set Screen Limits
         self.ax.set_ylim(self.tank.y - plot_width, self.tank.y + plot_width)
         self.ax.set_aspect('equal', adjustable='box')     
-        plt.suptitle('Differential Drive Simulation')
-        plt.xlabel('X-Coordinate (cm)')
-        plt.ylabel('Y-Coordinate (cm)')
-
-    def moveTank(self, port_rpm, strb_rpm, step_duration):
-        ''' Moves the tank and updates the travel route'''
-        self.tank.move(port_rpm, strb_rpm, step_duration)
-        self.x_coords.append(self.tank.x)
-        self.y_coords.append(self.tank.y)
-
-    def plotRoute(self):
-        self.ax.plot(self.x_coords, self.y_coords, ls='--', lw=2, color="#F56600")
-
-    def animate(self):
-        for j in range(len(self.time)):
-            if j == len(self.time) - 1: step_duration = self.time[j] - self.time[j-1]
-            else: step_duration = self.time[j+1] - self.time[j]
-            self.moveTank(self.port_rpm[j], self.strb_rpm[j], step_duration)
-            self.plotRoute()
-            for a in self.patch_objects:
-                a.update()
-            for a in self.line_objects:
-                a.update(self.time[j])
-
-            self.bm.update()
-            plt.title("Port RPM: {:.2f} Starboard RPM: {:.2f}".format(self.tank.port_rpm, self.tank.strb_rpm))
-            plt.pause(0.001)
-
-        plt.show(block=True)
+        self.fig.suptitle('Differential Drive Simulation')
+        self.ax.set_xlabel('X-Coordinate (cm)')
+        self.ax.set_ylabel('Y-Coordinate (cm)')
+
+    def plotRoute(self, j):
+        ''' Updates the travel route to end at the pose after step j'''
+        if self.frame is not None and j >= self.frame:
+            self.trail.extend(self.x[self.frame+1:j+1], self.y[self.frame+1:j+1])
+        else:
+            self.trail.reset()
+            self.trail.extend(concatenate(([self.x0], self.x[:j+1])), concatenate(([self.y0], self.y[:j+1])))
+        self.frame = j
+
+    def showFrame(self, j):
+        ''' Puts the tank at its pose after step j and updates every artist, without drawing them'''
+        self.tank.updatePosition(self.x[j], self.y[j], self.theta[j])
+        self.tank.updateSpeed(self.port_rpm[j], self.strb_rpm[j])
+        self.plotRoute(j)
+        for a in self.patch_objects:
+            a.update()
+        for a in self.line_objects:
+            a.update(self.time[j])
+        self.title.set_text("Port RPM: {:.2f} Starboard RPM: {:.2f}".format(self.tank.port_rpm, self.tank.strb_rpm))
+
+    def renderFrame(self, j):
+        ''' Draws frame j offscreen and returns the canvas as an RGBA array (headless mode)'''
+        self.showFrame(j)
+        self.bm.update()
+        return self.fig.canvas.buffer_rgba()
+
+    def showTime(self, sim_time, interpolate=True):
+        '''
+        Puts the tank where it is at sim_time, interpolating between the poses at each sample
+        time if interpolate is True, and updates every artist without drawing them
+        '''
+        j = int(resample(self.time, arange(len(self.time)), [sim_time], kind='hold')[0])
+        if interpolate: x, y, theta = resample(self.pose_time, self.poses, [sim_time], kind='linear')[0]
+        else: x, y, theta = self.poses[j]
+        self.tank.updatePosition(x, y, theta)
+        self.tank.updateSpeed(self.port_rpm[j], self.strb_rpm[j])
+        if j > 0: self.plotRoute(j - 1)
+        for a in self.patch_objects:
+            a.update()
+        for a in self.line_objects:
+            a.update(sim_time)
+        self.title.set_text("Port RPM: {:.2f} Starboard RPM: {:.2f}".format(self.tank.port_rpm, self.tank.strb_rpm))
+
+    def animate(self, speed=1., interpolate=True, max_fps=60.):
+        '''
+        Plays the run in real time, scaled by speed (e.g. 10 or 0.1), so that the tank is shown
+        where it is now rather than wherever drawing has reached. Frames are dropped when drawing
+        falls behind. If speed is None, every sample is drawn once instead. The achieved frame rate
+        and lag are kept in self.scheduler (see `AnimationScheduler.getStats`).
+        '''
+        if not self.headless: import matplotlib.pyplot as plt
+        deadline = 1 / max_fps if max_fps else None
+        if speed is None:
+            for j in range(len(self.time)):
+                with span('animate.frame', deadline):
+                    with span('animate.geometry'): self.showFrame(j)
+                    with span('animate.blit'): self.bm.update()
+                if not self.headless:
+                    with span('animate.events'): plt.pause(0.001)
+                count('animate.frames')
+        else:
+            if self.headless: wait = None
+            else: wait = self.fig.canvas.start_event_loop
+            def sleep(seconds):
+                with span('animate.events'): (wait or time_sleep)(seconds)
+            self.scheduler = AnimationScheduler(self.time, speed, max_fps, sleep=sleep)
+            for sim_time in self.scheduler:
+                with span('animate.frame', deadline):
+                    with span('animate.geometry'): self.showTime(sim_time, interpolate)
+                    with span('animate.blit'): self.bm.update()
+            stats = self.scheduler.getStats()
+            count('animate.frames', stats['frames'])
+            count('animate.dropped', stats['dropped'])
+
+        if not self.headless: plt.show(block=True)
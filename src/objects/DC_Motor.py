@@ -11,9 +11,16 @@
 
 import numpy as np
 from scipy import signal
-from src.simulation.ss_solver import ss_solver
+from src.simulation.ss_solver import ss_solver, ss_solver_batch
+from src.simulation.segments import InputSegments
+from src.simulation.stepper import Stepper
+from src.simulation.kalman import KalmanFilter
+from src.simulation.cache import LRUCache
 from src.analysis.charts import plotSimResults
 
+# Motors with identical constants share one state space, keyed on (R_a, L_a, J_M, k, B_M)
+STATE_SPACE_CACHE = LRUCache('motor_state_space', maxsize=256)
+
 class DC_Motor:
     def __init__(self, resistance_armature=0.5, winding_leakage_inductance=1.5e-3, 
                  rotor_moment_of_intertia=2.5e-4, torque_constant=0.05, frictional_coefficient=1e-4):
@@ -42,8 +49,16 @@ class DC_Motor:
         # State Variables
         self.sys = self.createStateSpace()
 
+    def getParameters(self) -> tuple:
+        ''' Returns the motor constants (R_a, L_a, J_M, k, B_M), which key the shared caches'''
+        return (self.R_a, self.L_a, self.J_M, self.k, self.B_M)
+
     def createStateSpace(self) -> signal.StateSpace:
         '''
+        Returns the state space of the motor, shared through `STATE_SPACE_CACHE` with every motor
+        that has the same constants, so it should not be modified in place. After changing the
+        constants of a motor, call `createStateSpace` again to update `sys`.
+
         States:
         ---
         1. i_a
@@ -60,6 +75,9 @@ class DC_Motor:
         1. omega
         2. theta
         '''
+        return STATE_SPACE_CACHE.get(tuple(float(p) for p in self.getParameters()), self._buildStateSpace)
+
+    def _buildStateSpace(self) -> signal.StateSpace:
         A = np.array([[-self.R_a / self.L_a, -self.k / self.L_a, 0],
                       [self.k / self.J_M, -self.B_M / self.J_M, 0],
                       [0, 1, 0]])
@@ -71,7 +89,8 @@ class DC_Motor:
         return signal.StateSpace(A, B, C, D)
 
     def simulateMotor(self, time : list, voltage_source : list, torque_of_payload : list, 
-                      i_a_0: float=0., omega_0: float=0., theta_0: float=0., to_plot: bool=False) -> tuple:
+                      i_a_0: float=0., omega_0: float=0., theta_0: float=0., to_plot: bool=False,
+                      method: str='foh') -> tuple:
         '''
         Simulate the motor response.
         
@@ -79,10 +98,11 @@ class DC_Motor:
         ---
         time : list
             Every time in the system to solve for a system response
-        voltage_source : list
-            The input voltage to the motor at every time step in <time>
-        torque_of_payload : list
-            The torque of the payload on the motor at every time step in <time>
+        voltage_source : list or InputSegments
+            The input voltage to the motor at every time step in <time>, or its segments
+        torque_of_payload : list or InputSegments
+            The torque of the payload on the motor at every time step in <time>, or its segments
+            (or one value if the voltage is segmented)
         i_a_0 : float=0.
             The initial current to the motor (A)
         omega_0 : float=0.
@@ -91,20 +111,112 @@ class DC_Motor:
             The initial angular position (rad)
         to_plot : bool=False
             True if desired to chart results of simulation
+        method : str='foh'
+            The solver method passed to `ss_solver`. 'foh' discretizes the motor exactly
+            and matches 'odeint' to within the tolerance of odeint, at a fraction of the cost.
         '''
-        #TODO: These motors are coupled, and cannot be solved for independently. This simulation needs to be
-        #brought over to the Tank.py file, and then the relationship between the MoI for tank compared to their individual
-        #motions should be solved for.
+        # The motors of a tank are coupled through the vehicle's inertia, see Tank.simulateDrivetrain
         
-        v_s = np.array(voltage_source)
-        T_L = np.array(torque_of_payload)
-
-        U = np.column_stack((v_s, T_L))
+        if isinstance(voltage_source, InputSegments) or isinstance(torque_of_payload, InputSegments):
+            U = InputSegments.stack(voltage_source, torque_of_payload)
+        else:
+            v_s = np.array(voltage_source)
+            T_L = np.array(torque_of_payload)
+            U = np.column_stack((v_s, T_L))
         x0 = [i_a_0, omega_0, theta_0]
-        T, Y, X = ss_solver(self.sys, time, U, x0)
+        T, Y, X = ss_solver(self.sys, time, U, x0, method=method)
         if to_plot: plotSimResults(T, Y, X)
         return T, Y, X
 
+    @staticmethod
+    def createStateSpaces(R_a, L_a, J_M, k, B_M) -> tuple:
+        '''
+        Builds the state space matrices of `createStateSpace` for an ensemble of motors at once. Each
+        parameter may be a scalar or an array of length N, and scalars are shared by every motor.
+
+        Returns
+        ---
+        (A, B, C, D) where A is N x 3 x 3, B is N x 3 x 2, and C and D are shared by the ensemble
+        '''
+        R_a, L_a, J_M, k, B_M = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=float))
+                                                      for p in (R_a, L_a, J_M, k, B_M)])
+        N = len(R_a)
+        A = np.zeros((N, 3, 3))
+        A[:, 0, 0] = -R_a / L_a
+        A[:, 0, 1] = -k / L_a
+        A[:, 1, 0] = k / J_M
+        A[:, 1, 1] = -B_M / J_M
+        A[:, 2, 1] = 1
+        B = np.zeros((N, 3, 2))
+        B[:, 0, 0] = 1 / L_a
+        B[:, 1, 1] = -1 / J_M
+        C = np.array([[0, 1, 0]])
+        D = np.array([[0, 0]])
+        return A, B, C, D
+
+    @staticmethod
+    def simulateEnsemble(time, voltage_source, torque_of_payload, R_a=0.5, L_a=1.5e-3, J_M=2.5e-4,
+                         k=0.05, B_M=1e-4, i_a_0=0., omega_0=0., theta_0=0., method: str='foh') -> tuple:
+        '''
+        Simulate the response of N motors with different parameters in one vectorized call, for
+        Monte Carlo and tolerance studies.
+        
+        Inputs:
+        ---
+        time : list
+            Every time in the system to solve for a system response, shared by every motor
+        voltage_source : list
+            The input voltage at every time step, either shared (T) or one row per motor (N x T)
+        torque_of_payload : list
+            The torque of the payload at every time step, either shared (T) or per motor (N x T)
+        R_a, L_a, J_M, k, B_M : float or array (N)
+            The motor constants, see `__init__`. Scalars are shared by every motor.
+        i_a_0, omega_0, theta_0 : float or array (N)
+            The initial states of each motor
+        method : str='foh'
+            The discretization used by `ss_solver_batch`
+
+        Returns
+        ---
+        (T, Y, X) where Y is the angular velocity of each motor (N x T) and X the states (N x T x 3)
+        '''
+        A, B, C, D = DC_Motor.createStateSpaces(R_a, L_a, J_M, k, B_M)
+        N, T = A.shape[0], len(time)
+        v_s = np.broadcast_to(np.asarray(voltage_source, dtype=float), (N, T))
+        T_L = np.broadcast_to(np.asarray(torque_of_payload, dtype=float), (N, T))
+        U = np.stack((v_s, T_L), axis=-1)
+        x0 = np.column_stack(np.broadcast_arrays(i_a_0, omega_0, theta_0, np.zeros(N)))[:, :3]
+        return ss_solver_batch((A, B, C, D), time, U, x0, method=method)
+
+    @staticmethod
+    def identify(time, voltage, rpm, current=None, load=0., **kwargs):
+        '''
+        Returns the DC_Motor whose constants best fit a recorded trace of the supply voltage (V),
+        the shaft speed (rpm) and ideally the armature current (A), under a known load (N-m). See
+        `src.simulation.identify.identifyMotors`, which fits many motors at once and to which the
+        kwargs go.
+        '''
+        from src.simulation.identify import identifyMotors
+        fit = identifyMotors(time, voltage, rpm, current, load, **kwargs)
+        return DC_Motor(*fit['parameters'][0])
+
+    def stepper(self, dt: float, i_a_0: float=0., omega_0: float=0., theta_0: float=0.) -> Stepper:
+        '''
+        Returns a `Stepper` that advances this motor one sample at a time with `step((v_s, T_L))`,
+        for live use where the inputs arrive one sample at a time. The step size may be changed for
+        any step, and each step size's transition is cached.
+        '''
+        return Stepper(self.sys, dt, [i_a_0, omega_0, theta_0])
+
+    def kalmanFilter(self, dt: float, Q, R, measure_current: bool=False, **kwargs) -> KalmanFilter:
+        '''
+        Returns a `KalmanFilter` that estimates (i_a, omega, theta) of this motor from measurements
+        of omega, or of (i_a, omega) if measure_current, with `step(t, z, (v_s, T_L))`. Q and R are
+        the process and measurement noise covariances, kwargs go to `KalmanFilter`.
+        '''
+        if measure_current: kwargs['C'] = [[1, 0, 0], [0, 1, 0]]
+        return KalmanFilter(self.sys, dt, Q, R, **kwargs)
+
     def getGeneratedTorque(self, input_current):
         ''' Calculates the torque generated by the motor for the given current.'''
         i_a = input_current
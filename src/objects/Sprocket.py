@@ -23,7 +23,7 @@ class Sprocket:
             if key == "mass": self.mass = value
             if key == "radius": self.radius = value
             if key == "axle_radius": self.axle_radius = value
-            if key == "rolling_friction": self.link_friciton = value
+            if key == "rolling_friction": self.rolling_friction = value
         
         #Default Values
         if "mass" not in kwargs: self.mass = 0.2
@@ -5,9 +5,18 @@
 # Permission: All rights reserved. Do not reuse without written permission from the owner.
 
 import numpy as np
+from scipy import signal
 
 from src.objects.DC_Motor import DC_Motor
 from src.objects.Tread import Tread
+from src.simulation.resample import resample
+from src.simulation.ss_solver import ss_solver
+from src.simulation.segments import InputSegments
+from src.simulation.stepper import TankStepper
+from src.simulation.kalman import KalmanFilter
+from src.simulation.control import simulateClosedLoop, TANK_CHANNELS
+from src.analysis.instrumentation import span
+from src.analysis.charts import plotSimResults
 
 class Tank:
     '''
@@ -100,15 +109,14 @@ class Tank:
         p, s = self.calcDistance(time_step)
         k = self.ch_width + self.td_width
         
+        # The center travels the mean of the tread distances along an arc, so its chord has length
+        # d * sinc(gamma/2) and points along the heading halfway through the turn
         gamma = -(p - s) / k
+        d = (p + s) / 2
+        chord = d * np.sinc(gamma / 2 / np.pi)
         newTheta = self.theta + gamma
-        if p == s:
-            newX = self.x + p * np.cos(np.pi/2 + self.theta)
-            newY = self.y + p * np.sin(np.pi/2 + self.theta)
-        else:
-            r = k / ((p/s) - 1)
-            newX = self.x + (r + k/2) * (np.cos(self.theta) - np.cos(newTheta))
-            newY = self.y - (r + k/2) * (np.sin(newTheta) - np.sin(self.theta))
+        newX = self.x + chord * np.cos(np.pi/2 + self.theta + gamma / 2)
+        newY = self.y + chord * np.sin(np.pi/2 + self.theta + gamma / 2)
 
         return newX, newY, newTheta
         
@@ -118,26 +126,196 @@ class Tank:
         newX, newY, newTheta = self.calcPosition(time_step)
         self.updatePosition(newX, newY, newTheta)
 
+    def integrateTrajectory(self, time, port_rpm, strb_rpm) -> tuple:
+        '''
+        Calculates the pose of the tank over an entire trajectory in one vectorized pass, starting
+        from the current pose. Each speed is held for the step until the next time, and the last
+        speed for the same duration as the step before it, as in `TankAnimator.animate`. The tank
+        itself is not moved.
+
+        Inputs:
+        ---
+        time : list
+            The time of each speed sample (s)
+        port_rpm : list
+            Revolutions Per Minute for port sprocket at each time
+        strb_rpm : list
+            Revolutions Per Minute for starboard sprocket at each time
+
+        Returns
+        ---
+        (x, y, theta), each an array with the pose after every step
+        '''
+        time = np.asarray(time, dtype=float)
+        steps = np.diff(time)
+        steps = np.append(steps, steps[-1] if len(steps) else 0.)
+        circumference = np.pi * self.radius * 2
+        p = np.asarray(port_rpm, dtype=float) / 60 * circumference * steps
+        s = np.asarray(strb_rpm, dtype=float) / 60 * circumference * steps
+        k = self.ch_width + self.td_width
+
+        # Exact integration of each arc, see calcPosition
+        gamma = -(p - s) / k
+        theta = self.theta + np.cumsum(gamma)
+        heading = np.pi/2 + theta - gamma / 2
+        chord = (p + s) / 2 * np.sinc(gamma / 2 / np.pi)
+        x = self.x + np.cumsum(chord * np.cos(heading))
+        y = self.y + np.cumsum(chord * np.sin(heading))
+        return x, y, theta
+
     def calcMomentofInertia(self):
         ''' Adds together the moment of inertia for each object in the tank'''
         #TODO: Make a gearbox object
         J_tread = self.tread.MoI
-        J_load = self.mass ( self.tread.driver.radius ** 2)
+        J_load = self.mass * (self.tread.driver.radius ** 2)
         J_gearbox = 0
         return (J_tread + J_load + J_gearbox) / self.gear_reduction ** 2 + J_gearbox
         
     def simulateMotors(self, time, port_voltage, strb_voltage, port_load, strb_load, to_plot=False) -> tuple:
-        ''' Solve Motor Speeds (returns speeds in rpm)'''
+        ''' Solve Motor Speeds (returns arrays of speeds in rpm at each time)'''
         # Find motor rpm versus input voltage and payload
         port_t, port_y, port_x = self.port_motor.simulateMotor(time, port_voltage, port_load, to_plot=to_plot)
         strb_t, strb_y, strb_x = self.strb_motor.simulateMotor(time, strb_voltage, strb_load)
 
         # Get rpm values at specific time samplings
-        port_motor_rpm = list()
-        strb_motor_rpm = list()
-        for i in range(len(time)):
-            index = np.nonzero(port_t >= time[i])
-            port_motor_rpm.append(port_x[index[0][0]][1] * 60 / 2 / np.pi / self.gear_reduction)
-            strb_motor_rpm.append(strb_x[index[0][0]][1] * 60 / 2 / np.pi / self.gear_reduction)
+        to_rpm = 60 / 2 / np.pi / self.gear_reduction
+        port_motor_rpm = resample(port_t, port_x[:, 1], time, kind='next') * to_rpm
+        strb_motor_rpm = resample(strb_t, strb_x[:, 1], time, kind='next') * to_rpm
         
         return port_motor_rpm, strb_motor_rpm
+
+    def calcMassMatrix(self):
+        '''
+        Calculates the 2x2 inertia matrix of the drivetrain, reflected onto the port and starboard
+        motor shafts (N-m/(rad/s^2)). The diagonal holds each motor's rotor and tread, while the
+        vehicle's mass and yaw inertia couple the two motors. Like `calcLoadInertia`, the vehicle
+        is driven through the tread's driver sprocket radius, not the `radius` used by the
+        kinematics in `move` and `integrateTrajectory`.
+        '''
+        r = self.tread.driver.radius / self.gear_reduction
+        k = self.ch_width + self.td_width
+        length = self.ch_height
+        width = self.ch_width + 2 * self.td_width
+
+        # The vehicle moves at r(w_p + w_s)/2 and yaws at r(w_s - w_p)/track, and its yaw inertia
+        # is taken as a uniform rectangle
+        J_translation = r ** 2 * self.mass / 4
+        J_yaw = r ** 2 * self.mass * (length ** 2 + width ** 2) / 12 / k ** 2
+        J_tread = self.tread.MoI / self.gear_reduction ** 2
+        M = np.array([[J_translation + J_yaw, J_translation - J_yaw], 
+                      [J_translation - J_yaw, J_translation + J_yaw]])
+        M[0, 0] += self.port_motor.J_M + J_tread
+        M[1, 1] += self.strb_motor.J_M + J_tread
+        return M
+
+    def createStateSpace(self) -> signal.StateSpace:
+        '''
+        Combines the port and starboard motors into one system, coupled through the inertia of
+        the vehicle (see `calcMassMatrix`).
+
+        States:
+        ---
+        1. port i_a
+        2. port omega
+        3. port theta
+        4. strb i_a
+        5. strb omega
+        6. strb theta
+
+        Inputs:
+        ---
+        1. port v_s
+        2. port T_L
+        3. strb v_s
+        4. strb T_L
+
+        Outputs:
+        ---
+        1. port omega
+        2. strb omega
+        '''
+        motors = (self.port_motor, self.strb_motor)
+        M_inv = np.linalg.inv(self.calcMassMatrix())
+
+        # Each motor's electrical and position equations are its own block, only the mechanical
+        # equations M (d omega/dt) = k i_a - B_M omega - T_L mix the two motors
+        A = np.zeros((6, 6))
+        B = np.zeros((6, 4))
+        for j, motor in enumerate(motors):
+            A[3*j, 3*j:3*j+2] = [-motor.R_a / motor.L_a, -motor.k / motor.L_a]
+            A[3*j+2, 3*j+1] = 1
+            B[3*j, 2*j] = 1 / motor.L_a
+        for i in range(2):
+            for j, motor in enumerate(motors):
+                A[3*i+1, 3*j] = M_inv[i, j] * motor.k
+                A[3*i+1, 3*j+1] = -M_inv[i, j] * motor.B_M
+                B[3*i+1, 2*j+1] = -M_inv[i, j]
+        C = np.zeros((2, 6))
+        C[0, 1] = C[1, 4] = 1
+        D = np.zeros((2, 4))
+        return signal.StateSpace(A, B, C, D)
+
+    def simulateDrivetrain(self, time, port_voltage, strb_voltage, port_load, strb_load, to_plot=False,
+                           method='foh') -> tuple:
+        ''' 
+        Solve Motor Speeds for both motors together with the coupled model from `createStateSpace`,
+        in a single solve (returns arrays of speeds in rpm at each time). The voltages and loads are
+        either sampled at every time, or `InputSegments` and constants, which are solved exactly
+        across their breakpoints.
+        '''
+        with span('drivetrain.solve'):
+            inputs = (port_voltage, port_load, strb_voltage, strb_load)
+            if any(isinstance(u, InputSegments) for u in inputs): U = InputSegments.stack(*inputs)
+            else: U = np.column_stack(inputs)
+            T, Y, X = ss_solver(self.createStateSpace(), time, U, method=method)
+        if to_plot: plotSimResults(T, Y[:, 0], X[:, :3])
+
+        with span('drivetrain.resample'):
+            to_rpm = 60 / 2 / np.pi / self.gear_reduction
+            port_motor_rpm = resample(T, X[:, 1], time, kind='next') * to_rpm
+            strb_motor_rpm = resample(T, X[:, 4], time, kind='next') * to_rpm
+        
+        return port_motor_rpm, strb_motor_rpm
+
+    def simulateClosedLoop(self, time, port_rpm, strb_rpm, controller, port_load=0., strb_load=0.) -> tuple:
+        '''
+        Simulates the coupled drivetrain with both motors under closed-loop speed control (see
+        `src.simulation.control`), and returns the port and starboard sprocket rpm and voltage at
+        each time, with a leading axis of gain sets if the controller has several.
+
+        Inputs:
+        ---
+        time : list
+            Evenly spaced sample times (s), with the sample time of the controller
+        port_rpm, strb_rpm : list
+            The reference sprocket speeds (rpm), one value or one per time
+        controller : PIDController or LQRController
+            The controller used on each motor
+        port_load, strb_load : list
+            The load on each motor (N-m), one value or one per time
+        '''
+        to_omega = 2 * np.pi / 60 * self.gear_reduction
+        def channels(port, strb):
+            '''The port and starboard values at each time (len(time) x 2)'''
+            return np.column_stack(np.broadcast_arrays(port, strb, np.asarray(time, dtype=float))[:2])
+        reference = channels(port_rpm, strb_rpm) * to_omega
+        voltage, X = simulateClosedLoop(self.createStateSpace(), controller, time, reference,
+                                        channels(port_load, strb_load), TANK_CHANNELS)
+        rpm = X[..., [1, 4]] / to_omega
+        if len(rpm) == 1: rpm, voltage = rpm[0], voltage[0]
+        return rpm[..., 0], rpm[..., 1], voltage[..., 0], voltage[..., 1]
+
+    def stepper(self, dt) -> TankStepper:
+        '''
+        Returns a `TankStepper` that advances the coupled drivetrain and the pose of this tank one
+        sample at a time with `step(port_voltage, strb_voltage, port_load, strb_load)`.
+        '''
+        return TankStepper(self, dt)
+
+    def kalmanFilter(self, dt: float, Q, R, **kwargs) -> KalmanFilter:
+        '''
+        Returns a `KalmanFilter` that estimates the state of the coupled drivetrain (see
+        `createStateSpace`) from measured motor speeds (omega_p, omega_s), with 
+        `step(t, z, (v_p, T_Lp, v_s, T_Ls))`. kwargs go to `KalmanFilter`, e.g. C to also measure currents.
+        '''
+        return KalmanFilter(self.createStateSpace(), dt, Q, R, **kwargs)
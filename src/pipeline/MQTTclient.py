@@ -1,28 +1,19 @@
-# Code is default example from https://pypi.org/project/paho-mqtt/#installation
+# Prints the telemetry batches received from a broker, see src/pipeline/ingest.py.
+# Originally the default example from https://pypi.org/project/paho-mqtt/#installation, which
+# connected at import time; nothing happens now until the script is run.
 
-import paho.mqtt.client as mqtt
+import asyncio
 
-# The callback for when the client receives a CONNACK response from the server.
-def on_connect(client, userdata, flags, rc):
-    print("Connected with result code "+str(rc))
+from src.pipeline.ingest import TelemetryIngestor, PahoClient
+from src.pipeline.packet import decodeBatch
 
-    # Subscribing in on_connect() means that if we lose the connection and
-    # reconnect then subscriptions will be renewed.
-    client.subscribe("$SYS/#")
+def printBatch(packets):
+    for packet in packets:
+        print(packet)
 
-# The callback for when a PUBLISH message is received from the server.
-def on_message(client, userdata, msg):
-    if msg.topic == "real_unique_topic":
-        print(msg.topic+" "+str(msg.payload))
+async def main(host: str="test.mosquitto.org", port: int=1883):
+    ingestor = TelemetryIngestor(PahoClient(host, port), decoder=decodeBatch, sink=printBatch)
+    await ingestor.run()
 
-client = mqtt.Client()
-client.on_connect = on_connect
-client.on_message = on_message
-
-client.connect("test.mosquitto.org", 1883, 60)
-
-# Blocking call that processes network traffic, dispatches callbacks and
-# handles reconnecting.
-# Other loop*() functions are available that give a threaded interface and a
-# manual interface.
-client.loop_forever()
\ No newline at end of file
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+# Class: ingest.py
+# Purpose: Receive telemetry from the vehicles over MQTT without blocking the simulation. Messages
+#   are put on a bounded asyncio queue and handed to the twin in micro-batches, with an explicit
+#   policy for when the twin cannot keep up, and the connection is re-established with backoff.
+
+import asyncio
+import inspect
+import json
+import random
+
+# What happens to a message that arrives while the queue is full
+DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+def topicMatches(pattern: str, topic: str) -> bool:
+    '''True if an MQTT topic matches a subscription pattern, which may use the + and # wildcards'''
+    pattern, topic = pattern.split('/'), topic.split('/')
+    for i, level in enumerate(pattern):
+        if level == '#': return True
+        if i >= len(topic) or (level != '+' and level != topic[i]): return False
+    return len(pattern) == len(topic)
+
+def decodeJSON(batch: list) -> list:
+    '''The default decoder: returns (topic, object) for every (topic, payload) of a batch of JSON messages'''
+    return [(topic, json.loads(payload)) for topic, payload in batch]
+
+class LocalBroker:
+    '''
+    An in-process stand-in for an MQTT broker, for tests and for running the pipeline without a
+    network. publish() awaits the handler of every subscribed client, so a client that holds back
+    its handler holds back the publisher, as TCP flow control would.
+    '''
+
+    def __init__(self):
+        self.clients = []
+        self.available = True
+
+    def client(self):
+        '''Returns a new client of this broker'''
+        return LocalClient(self)
+
+    async def publish(self, topic: str, payload: bytes):
+        for client in list(self.clients):
+            if any(topicMatches(p, topic) for p in client.topics):
+                await client.handler(topic, payload)
+
+    def drop(self):
+        '''Disconnects every client, as if the connection to the broker was lost'''
+        for client in list(self.clients):
+            client._lose()
+
+class LocalClient:
+    '''A client of a LocalBroker, with the same interface as PahoClient'''
+
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self.topics = []
+        self.handler = None
+        self.lost = None
+
+    async def connect(self, handler):
+        '''Connects to the broker and delivers every message as await handler(topic, payload)'''
+        if not self.broker.available: raise ConnectionRefusedError("The local broker is not available.")
+        self.handler = handler
+        self.topics = []
+        self.lost = asyncio.get_running_loop().create_future()
+        self.broker.clients.append(self)
+
+    async def subscribe(self, topics: list):
+        self.topics.extend(topics)
+
+    async def disconnected(self):
+        '''Waits until the connection is lost'''
+        await asyncio.shield(self.lost)
+
+    async def disconnect(self):
+        self._lose()
+
+    def _lose(self):
+        if self in self.broker.clients: self.broker.clients.remove(self)
+        if self.lost is not None and not self.lost.done(): self.lost.set_result(None)
+
+class PahoClient:
+    '''
+    Connects to an MQTT broker with paho-mqtt, which is only imported on connect. paho runs the
+    network on its own thread and every message is handed to the event loop; the thread waits for
+    the handler, so a full queue under the 'block' policy stops reading from the socket.
+    '''
+
+    def __init__(self, host: str, port: int=1883, keepalive: int=60, qos: int=0, client_id: str=''):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.qos = qos
+        self.client_id = client_id
+        self.client = None
+
+    async def connect(self, handler):
+        import paho.mqtt.client as mqtt
+
+        loop = self.loop = asyncio.get_running_loop()
+        self.handler = handler
+        self.lost = loop.create_future()
+        connected = loop.create_future()
+        def resolve(future, value):
+            if not future.done(): future.set_result(value)
+
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id)
+        else: client = mqtt.Client(client_id=self.client_id)
+        # The signatures of these callbacks differ between paho versions, the reason code is the fourth argument
+        client.on_connect = lambda *args: loop.call_soon_threadsafe(resolve, connected, args[3])
+        client.on_disconnect = lambda *args: loop.call_soon_threadsafe(resolve, self.lost, None)
+        client.on_message = self._onMessage
+        self.client = client
+
+        await loop.run_in_executor(None, client.connect, self.host, self.port, self.keepalive)
+        client.loop_start()
+        code = await connected
+        if getattr(code, 'is_failure', code != 0):
+            await self.disconnect()
+            raise ConnectionRefusedError("The broker refused the connection: " + str(code))
+
+    def _onMessage(self, client, userdata, msg):
+        future = asyncio.run_coroutine_threadsafe(self.handler(msg.topic, msg.payload), self.loop)
+        future.result()
+
+    async def subscribe(self, topics: list):
+        self.client.subscribe([(topic, self.qos) for topic in topics])
+
+    async def disconnected(self):
+        await asyncio.shield(self.lost)
+
+    async def disconnect(self):
+        if self.client is None: return
+        client, self.client = self.client, None
+        client.disconnect()
+        await self.loop.run_in_executor(None, client.loop_stop)
+
+class TelemetryIngestor:
+    '''
+    Subscribes to the telemetry topic of every vehicle and passes what arrives to a sink in
+    batches of up to batch_size messages, or whatever arrived within batch_interval seconds.
+
+    Receiving only puts the raw message on a bounded queue; the messages are decoded a batch at
+    a time on their way to the sink. While the sink is busy the queue fills, and once it is full
+    the drop policy applies: 'drop_oldest' discards the oldest queued message, 'drop_newest'
+    discards the message that arrived, and 'block' holds back the client (and so the broker)
+    until there is room.
+
+    Usage:
+    ---
+        ingestor = TelemetryIngestor(PahoClient('localhost'), vehicles=['t1', 't2'], sink=twin.update)
+        await ingestor.run()    # until ingestor.stop()
+    '''
+
+    def __init__(self, client, **kwargs):
+        '''
+        Inputs:
+        ---
+        client : LocalClient or PahoClient
+            The connection to the broker
+        vehicles : list=None
+            The ids of the vehicles to subscribe to, every vehicle if None
+        topic : str='tanks/{vehicle}/telemetry'
+            The topic of each vehicle
+        queue_size : int=10000
+            The most messages waiting to be delivered
+        batch_size : int=1000
+            The most messages in one batch
+        batch_interval : float=0.05
+            The longest a batch waits to fill up (s)
+        drop_policy : str='drop_oldest'
+            One of DROP_POLICIES
+        decoder : callable=decodeJSON
+            Turns a list of (topic, payload) into the records given to the sink
+        sink : callable=None
+            Called with the records of every batch. A coroutine function is awaited, anything else
+            is run on the default executor so that a slow sink does not block the event loop
+        reconnect_delay : float=0.5
+            The wait before the first reconnection attempt (s), doubled after every failure
+        max_reconnect_delay : float=30.
+            The longest wait between reconnection attempts (s)
+        '''
+        self.client = client
+        self.vehicles = None
+        self.topic = 'tanks/{vehicle}/telemetry'
+        self.queue_size = 10000
+        self.batch_size = 1000
+        self.batch_interval = 0.05
+        self.drop_policy = 'drop_oldest'
+        self.decoder = decodeJSON
+        self.sink = None
+        self.reconnect_delay = 0.5
+        self.max_reconnect_delay = 30.
+
+        for key, value in kwargs.items():
+            if not hasattr(self, key): raise KeyError("Unknown TelemetryIngestor option: " + key)
+            setattr(self, key, value)
+        if self.drop_policy not in DROP_POLICIES:
+            raise ValueError("drop_policy must be one of " + str(DROP_POLICIES))
+
+        self.queue = None
+        self._stopping = asyncio.Event()
+        self.stats = {'received': 0, 'dropped': 0, 'batches': 0, 'delivered': 0, 'errors': 0,
+                      'connects': 0, 'disconnects': 0, 'connect_failures': 0, 'max_queued': 0}
+        self.last_error = None
+
+    def getTopics(self) -> list:
+        '''Returns the topics subscribed to'''
+        if self.vehicles is None: return [self.topic.format(vehicle='+')]
+        return [self.topic.format(vehicle=v) for v in self.vehicles]
+
+    async def receive(self, topic: str, payload: bytes):
+        '''The handler given to the client, queues one message'''
+        queue = self.queue
+        self.stats['received'] += 1
+        if queue.full():
+            if self.drop_policy == 'block':
+                await queue.put((topic, payload))
+                return
+            self.stats['dropped'] += 1
+            if self.drop_policy == 'drop_newest': return
+            queue.get_nowait()
+        queue.put_nowait((topic, payload))
+        if queue.qsize() > self.stats['max_queued']: self.stats['max_queued'] = queue.qsize()
+
+    async def run(self):
+        '''Receives and delivers telemetry until stop() is called, then delivers what is still queued'''
+        self.queue = asyncio.Queue(self.queue_size)
+        batcher = asyncio.create_task(self._batchLoop())
+        try:
+            await self._connectLoop()
+        finally:
+            self._stopping.set()
+            await batcher
+
+    def stop(self):
+        '''Ends run(), or makes it return at once if it has not started yet'''
+        self._stopping.set()
+
+    async def _connectLoop(self):
+        delay = self.reconnect_delay
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await self.client.connect(self.receive)
+                    await self.client.subscribe(self.getTopics())
+                except OSError as e:
+                    self.stats['connect_failures'] += 1
+                    self.last_error = e
+                else:
+                    self.stats['connects'] += 1
+                    delay = self.reconnect_delay
+                    lost = asyncio.ensure_future(self.client.disconnected())
+                    await asyncio.wait((lost, stopping), return_when=asyncio.FIRST_COMPLETED)
+                    if stopping.done():
+                        lost.cancel()
+                        await self.client.disconnect()
+                        break
+                    self.stats['disconnects'] += 1
+
+                # Back off, with jitter so that a fleet does not reconnect in lockstep
+                await asyncio.wait((stopping,), timeout=delay * random.uniform(0.5, 1.))
+                delay = min(2 * delay, self.max_reconnect_delay)
+        finally:
+            stopping.cancel()
+
+    async def _nextBatch(self) -> list:
+        '''Waits up to batch_interval for a first message, then for the batch to fill up'''
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+        deadline = loop.time() + self.batch_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0 or (self._stopping.is_set() and batch): break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batchLoop(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = await self._nextBatch()
+            if batch: await self._deliver(batch)
+
+    async def _deliver(self, batch: list):
+        try:
+            records = self.decoder(batch)
+            if self.sink is None: pass
+            elif inspect.iscoroutinefunction(self.sink): await self.sink(records)
+            else: await asyncio.get_running_loop().run_in_executor(None, self.sink, records)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.last_error = e
+            return
+        self.stats['batches'] += 1
+        self.stats['delivered'] += len(batch)
+
+    def getStats(self) -> dict:
+        '''Returns the message, batch and connection counters and the number of messages queued'''
+        stats = dict(self.stats)
+        stats['queued'] = self.queue.qsize() if self.queue is not None else 0
+        return stats
@@ -1,4 +1,24 @@
-class Packet {
-    public:
-        float time_stamp;
-};
\ No newline at end of file
+// The telemetry packet sent by each vehicle, one per sample. Must match PACKET_DTYPE in
+// packet.py: little endian, 56 bytes, no padding. Bump PACKET_VERSION when the layout changes.
+#include <cstdint>
+
+const uint16_t PACKET_VERSION = 1;
+
+struct Packet {
+    uint16_t version = PACKET_VERSION;
+    uint16_t vehicle_id;
+    uint32_t sequence;      // Counts up by one per packet
+    double time_stamp;      // (s)
+    float port_voltage;     // (V)
+    float strb_voltage;
+    float port_current;     // (A)
+    float strb_current;
+    float port_rpm;         // Sprocket speed from the encoders (rpm)
+    float strb_rpm;
+    float x;                // Pose (units of length, rad)
+    float y;
+    float theta;
+    uint32_t reserved = 0;
+};
+
+static_assert(sizeof(Packet) == 56, "Packet must match PACKET_DTYPE in packet.py");
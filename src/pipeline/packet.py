@@ -0,0 +1,80 @@
+# Class: packet.py
+# Purpose: The binary telemetry packet sent by the vehicles (see packet.cpp), with a NumPy
+#   structured dtype of the same layout so that a batch of payloads is decoded in one call.
+
+import numpy as np
+
+# Bumped whenever the layout below changes
+PACKET_VERSION = 1
+
+# Little endian, 56 bytes, every field aligned to its size. Must match struct Packet in packet.cpp
+PACKET_DTYPE = np.dtype([
+    ('version', '<u2'),         # PACKET_VERSION
+    ('vehicle_id', '<u2'),
+    ('sequence', '<u4'),        # Counts up by one per packet from each vehicle
+    ('time', '<f8'),            # (s)
+    ('port_voltage', '<f4'),    # (V)
+    ('strb_voltage', '<f4'),
+    ('port_current', '<f4'),    # (A)
+    ('strb_current', '<f4'),
+    ('port_rpm', '<f4'),        # Sprocket speed from the encoders (rpm)
+    ('strb_rpm', '<f4'),
+    ('x', '<f4'),               # Pose (units of length, rad)
+    ('y', '<f4'),
+    ('theta', '<f4'),
+    ('reserved', '<u4'),
+])
+
+# The measured quantities, which are NaN when a vehicle does not report them
+FIELDS = PACKET_DTYPE.names[4:-1]
+
+def encodePackets(time, vehicle_id: int=0, sequence_start: int=0, **fields) -> np.ndarray:
+    '''
+    Returns one packet per sample time as a structured array, whose .tobytes() is the payload
+
+    Inputs:
+    ---
+    time : list
+        The sample times (s)
+    vehicle_id : int=0
+        The vehicle the samples come from
+    sequence_start : int=0
+        The sequence number of the first packet
+    fields : list
+        Any of FIELDS, e.g. port_rpm=..., an array per sample or one value for all; the rest are NaN
+    '''
+    unknown = set(fields) - set(FIELDS)
+    if unknown: raise KeyError("Unknown packet fields: " + ", ".join(sorted(unknown)))
+    time = np.asarray(time, dtype=float)
+    packets = np.zeros(time.shape, dtype=PACKET_DTYPE)
+    packets['version'] = PACKET_VERSION
+    packets['vehicle_id'] = vehicle_id
+    packets['sequence'] = sequence_start + np.arange(time.size).reshape(time.shape)
+    packets['time'] = time
+    for name in FIELDS:
+        packets[name] = fields.get(name, np.nan)
+    return packets
+
+def toPayloads(packets: np.ndarray, per_payload: int=1) -> list:
+    '''Splits packets into payloads of per_payload packets each, e.g. one MQTT message per payload'''
+    data = packets.tobytes()
+    size = per_payload * PACKET_DTYPE.itemsize
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def decodePackets(payloads) -> np.ndarray:
+    '''
+    Returns the packets of a payload, or of a list of payloads each holding one or more packets, as a
+    structured array. A single payload is decoded without copying; the array is then read-only.
+    '''
+    data = payloads if isinstance(payloads, (bytes, bytearray, memoryview)) else b''.join(payloads)
+    if len(data) % PACKET_DTYPE.itemsize:
+        raise ValueError("Telemetry payloads must be a whole number of %d byte packets." % PACKET_DTYPE.itemsize)
+    packets = np.frombuffer(data, dtype=PACKET_DTYPE)
+    if packets.size and (packets['version'] != PACKET_VERSION).any():
+        versions = np.unique(packets['version'])
+        raise ValueError("Unsupported telemetry packet version: " + str(versions[versions != PACKET_VERSION]))
+    return packets
+
+def decodeBatch(batch: list) -> np.ndarray:
+    '''A decoder for TelemetryIngestor: returns the packets of a batch of (topic, payload)'''
+    return decodePackets([payload for topic, payload in batch])
@@ -0,0 +1,246 @@
+# Class: recording.py
+# Purpose: Persist runs, simulated or live, to a chunked columnar file that is memory-mapped for
+#   reading, so that recordings of many hours can be opened, sought and replayed without loading
+#   them into memory.
+
+import json
+import os
+
+import numpy as np
+
+from src.gui.AnimationScheduler import AnimationScheduler
+
+MAGIC = b'TANKREC1'
+# The header is a JSON object padded with spaces to a fixed size, so it can be rewritten in place
+HEADER_SIZE = 4096
+FORMAT_VERSION = 1
+
+# The columns recorded by default: time, inputs, motor states and pose. Time must come first
+RECORD_COLUMNS = ('time', 'port_voltage', 'strb_voltage', 'port_load', 'strb_load',
+                  'port_current', 'strb_current', 'port_rpm', 'strb_rpm', 'x', 'y', 'theta')
+
+class Recorder:
+    '''
+    Appends samples to a recording. The file is a header followed by chunks of chunk_size rows,
+    and within a chunk every column is stored contiguously (float64), so reading one column over
+    a time window touches only that column's pages. Samples must arrive in time order.
+
+    Usage:
+    ---
+        with Recorder('run.rec') as recorder:
+            recorder.append(time, port_rpm=port_rpm, strb_rpm=strb_rpm)
+    '''
+
+    def __init__(self, path: str, columns: tuple=RECORD_COLUMNS, chunk_size: int=65536):
+        '''
+        Inputs:
+        ---
+        path : str
+            The file to write, which is overwritten
+        columns : tuple=RECORD_COLUMNS
+            The names of the columns, the first of which is the time
+        chunk_size : int=65536
+            The number of rows in each chunk
+        '''
+        self.path = path
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.chunk = None
+        self.last_time = -np.inf
+        self.file = open(path, 'w+b')
+        self.writeHeader()
+
+    def writeHeader(self):
+        header = json.dumps({'version': FORMAT_VERSION, 'columns': self.columns,
+                             'chunk_size': self.chunk_size, 'rows': self.rows}).encode()
+        if len(MAGIC) + len(header) > HEADER_SIZE: raise ValueError("Too many columns for the recording header.")
+        self.file.seek(0)
+        self.file.write(MAGIC + header.ljust(HEADER_SIZE - len(MAGIC)))
+
+    def mapChunk(self, index: int) -> np.memmap:
+        '''Grows the file to hold chunk index and maps it for writing'''
+        chunk_bytes = len(self.columns) * self.chunk_size * 8
+        self.file.truncate(HEADER_SIZE + (index + 1) * chunk_bytes)
+        return np.memmap(self.file, dtype='<f8', mode='r+', offset=HEADER_SIZE + index * chunk_bytes,
+                         shape=(len(self.columns), self.chunk_size))
+
+    def append(self, time, **values):
+        '''
+        Appends samples at the given times (an array, or one time). values holds a value or an array
+        for any of the columns; the columns not given are NaN
+        '''
+        unknown = set(values) - set(self.columns)
+        if unknown: raise KeyError("Unknown recording columns: " + ", ".join(sorted(unknown)))
+        time = np.atleast_1d(np.asarray(time, dtype=float))
+        if len(time) == 0: return
+        if time[0] < self.last_time or (np.diff(time) < 0).any():
+            raise ValueError("Samples must be recorded in time order.")
+        block = np.full((len(self.columns), len(time)), np.nan)
+        block[0] = time
+        for i, name in enumerate(self.columns[1:], 1):
+            if name in values: block[i] = values[name]
+
+        done = 0
+        while done < len(time):
+            row = self.rows % self.chunk_size
+            if row == 0:
+                if self.chunk is not None: self.chunk.flush()
+                self.chunk = self.mapChunk(self.rows // self.chunk_size)
+            count = min(self.chunk_size - row, len(time) - done)
+            self.chunk[:, row:row + count] = block[:, done:done + count]
+            done += count
+            self.rows += count
+        self.last_time = time[-1]
+
+    def appendPackets(self, packets: np.ndarray):
+        '''Appends telemetry packets (see `src.pipeline.packet`), e.g. as the sink of a TelemetryIngestor'''
+        values = {name: packets[name] for name in self.columns[1:] if name in packets.dtype.names}
+        self.append(packets['time'], **values)
+
+    def flush(self):
+        '''Writes the samples so far to disk, where readers can see them'''
+        if self.chunk is not None: self.chunk.flush()
+        self.writeHeader()
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed: return
+        self.flush()
+        self.chunk = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class Recording:
+    '''
+    Reads a recording without loading it: the file is memory-mapped as an array of shape
+    (chunks, columns, chunk_size) and only the pages that are indexed are read from disk. Times
+    are found by binary search, first over the first time of every chunk and then within a chunk.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            head = file.read(HEADER_SIZE)
+        if head[:len(MAGIC)] != MAGIC: raise ValueError(path + " is not a recording.")
+        header = json.loads(head[len(MAGIC):].decode())
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError("Unsupported recording version: " + str(header['version']))
+        self.columns = tuple(header['columns'])
+        self.chunk_size = header['chunk_size']
+        self.rows = header['rows']
+
+        chunks = -(-self.rows // self.chunk_size)
+        if chunks * len(self.columns) * self.chunk_size * 8 + HEADER_SIZE > os.path.getsize(path):
+            raise ValueError(path + " is truncated.")
+        if chunks: self.data = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_SIZE,
+                                         shape=(chunks, len(self.columns), self.chunk_size))
+        else: self.data = np.zeros((0, len(self.columns), self.chunk_size))
+        # Views, so building them reads nothing
+        self.chunk_start_times = self.data[:, 0, 0]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def getTimeRange(self) -> tuple:
+        '''Returns the first and last time recorded'''
+        if self.rows == 0: return np.nan, np.nan
+        last = self.rows - 1
+        return self.data[0, 0, 0], self.data[last // self.chunk_size, 0, last % self.chunk_size]
+
+    def indexOf(self, time: float, side: str='left') -> int:
+        '''Returns the row where time would be inserted to keep the times in order, see np.searchsorted'''
+        if self.rows == 0: return 0
+        last_chunk = len(self.data) - 1
+        chunk = max(0, np.searchsorted(self.chunk_start_times, time, side) - 1)
+        rows = self.chunk_size if chunk < last_chunk else self.rows - last_chunk * self.chunk_size
+        row = np.searchsorted(self.data[chunk, 0, :rows], time, side)
+        return int(min(chunk * self.chunk_size + row, self.rows))
+
+    def read(self, columns=None, start: int=0, stop: int=None) -> dict:
+        '''Returns the rows [start, stop) of the given columns (all by default) as a dict of arrays'''
+        columns = self.columns if columns is None else columns
+        stop = self.rows if stop is None else min(stop, self.rows)
+        start = min(start, stop)
+        indices = [self.columns.index(name) for name in columns]
+        out = {name: np.empty(stop - start) for name in columns}
+        row = start
+        while row < stop:
+            chunk, offset = divmod(row, self.chunk_size)
+            count = min(self.chunk_size - offset, stop - row)
+            for name, i in zip(columns, indices):
+                out[name][row - start:row - start + count] = self.data[chunk, i, offset:offset + count]
+            row += count
+        return out
+
+    def window(self, start_time: float=None, stop_time: float=None, columns=None) -> dict:
+        '''Returns the rows with start_time <= time <= stop_time, of the given columns, as a dict of arrays'''
+        start = 0 if start_time is None else self.indexOf(start_time)
+        stop = self.rows if stop_time is None else self.indexOf(stop_time, 'right')
+        return self.read(columns, start, stop)
+
+class Replayer:
+    '''
+    Plays back a time window of a recording, either to the analysis code in blocks of rows or to
+    a TankAnimator, at any speed.
+    '''
+
+    def __init__(self, recording, start_time: float=None, stop_time: float=None):
+        '''
+        Inputs:
+        ---
+        recording : Recording or str
+            The recording, or its path
+        start_time, stop_time : float=None
+            The window to play, the whole recording by default
+        '''
+        self.recording = recording if isinstance(recording, Recording) else Recording(recording)
+        self.start = 0 if start_time is None else self.recording.indexOf(start_time)
+        self.stop = len(self.recording) if stop_time is None else self.recording.indexOf(stop_time, 'right')
+
+    def blocks(self, rows: int=65536, columns=None):
+        '''Yields the window as dicts of arrays of up to rows samples each, as fast as they can be read'''
+        for start in range(self.start, self.stop, rows):
+            yield self.recording.read(columns, start, min(start + rows, self.stop))
+
+    def play(self, speed: float=1., max_fps: float=60., columns=None, **kwargs):
+        '''
+        Yields the window as dicts of the arrays of samples that became due since the last block, paced
+        by the wall clock at speed times real time (kwargs go to `AnimationScheduler`)
+        '''
+        if self.stop <= self.start: return
+        time = self.recording.read(('time',), self.start, self.stop)['time']
+        done = 0
+        for sim_time in AnimationScheduler(time, speed, max_fps, **kwargs):
+            due = int(np.searchsorted(time, sim_time, 'right'))
+            if due > done:
+                yield self.recording.read(columns, self.start + done, self.start + due)
+                done = due
+
+    def getPoses(self):
+        '''Returns the recorded (x, y, theta) at every time of the window, or None unless all are recorded'''
+        data = self.recording.read(('x', 'y', 'theta'), self.start, self.stop)
+        poses = (data['x'], data['y'], data['theta'])
+        if len(data['x']) == 0 or not np.isfinite(poses).all(): return None
+        return poses
+
+    def animator(self, tank=None, **kwargs):
+        '''
+        Returns a TankAnimator for the window (kwargs go to `TankAnimator`), which draws the recorded
+        poses if every sample has one and otherwise integrates the recorded rpm from the tank's pose.
+        Animate it with .animate(speed=...)
+        '''
+        from src.gui.TankAnimator import TankAnimator
+        from src.objects.Tank import Tank
+
+        data = self.recording.read(('time', 'port_rpm', 'strb_rpm'), self.start, self.stop)
+        if tank is None: tank = Tank()
+        poses = self.getPoses()
+        if poses is not None: kwargs.setdefault('poses', poses)
+        return TankAnimator(tank=tank, time=data['time'], port_rpm=data['port_rpm'],
+                            strb_rpm=data['strb_rpm'], **kwargs)
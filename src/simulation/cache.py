@@ -0,0 +1,55 @@
+# Program: cache.py
+# Purpose: Bounded least-recently-used caches that share system objects (state spaces,
+#   discretizations) between instances with identical parameters.
+
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    A bounded mapping that evicts its least recently used entry once it holds `maxsize` entries,
+    and counts its hits and misses. Every cache is registered by name so that `cacheInfo` and
+    `clearCaches` can report on and invalidate all of them at once.
+    '''
+    registry = dict()
+
+    def __init__(self, name: str, maxsize: int=256):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        LRUCache.registry[name] = self
+
+    def get(self, key, factory):
+        '''Returns the entry for key, calling factory() to create it on a miss'''
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            value = factory()
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize: self.entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def invalidate(self, key=None):
+        '''Removes the entry for key, or every entry (and the statistics) if key is None'''
+        if key is None:
+            self.entries.clear()
+            self.hits = self.misses = 0
+        else: self.entries.pop(key, None)
+
+    def info(self) -> dict:
+        '''Returns the hits, misses, current size and maximum size of the cache'''
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+def cacheInfo() -> dict:
+    '''Returns the statistics of every registered cache, by name'''
+    return {name: cache.info() for name, cache in LRUCache.registry.items()}
+
+def clearCaches():
+    '''Invalidates every registered cache'''
+    for cache in LRUCache.registry.values():
+        cache.invalidate()
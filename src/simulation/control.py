@@ -0,0 +1,227 @@
+# Program: control.py
+# Purpose: Discrete speed controllers for the DC motors, designed once from the motor model, and a
+#   fixed-step simulation of the plant and controller together with the voltage saturated. Every
+#   gain may be an array, in which case the loop is simulated for all of the gain sets at once.
+
+import numpy as np
+from scipy import signal, linalg
+
+from src.simulation.ss_solver import discretize, _DT_DECIMALS
+
+# (voltage input, load input, current state, speed state) of the motor in `DC_Motor.createStateSpace`
+MOTOR_CHANNELS = ((0, 1, 0, 1),)
+# The same for the port and starboard motors of `Tank.createStateSpace`
+TANK_CHANNELS = ((0, 1, 0, 1), (2, 3, 3, 4))
+
+def _column(value) -> np.ndarray:
+    '''A gain given per gain set (N) as a column (N x 1) that broadcasts against N x channels'''
+    value = np.asarray(value, dtype=float)
+    return value[:, np.newaxis] if value.ndim == 1 else value
+
+def firstOrderModel(motor) -> tuple:
+    '''
+    Returns the gain ((rad/s)/V) and time constant (s) of the first order model of a motor's speed
+    response to its voltage, which neglects the much faster electrical time constant L_a / R_a
+    '''
+    R_a, L_a, J_M, k, B_M = motor.getParameters()
+    denominator = R_a * B_M + k ** 2
+    return k / denominator, (R_a * J_M + L_a * B_M) / denominator
+
+class PIDController:
+    '''
+    A discrete PID controller of motor speed: backward Euler integral, a derivative on the error
+    filtered with time constant `derivative_filter`, and an output clamped to [v_min, v_max]. The
+    integral is held while the output is saturated in the direction of the error (anti-windup).
+    '''
+
+    def __init__(self, kp, ki, kd=0., dt: float=1e-3, v_min=-12., v_max=12., derivative_filter: float=None):
+        '''
+        Inputs:
+        ---
+        kp, ki, kd : float or list
+            The proportional (V/(rad/s)), integral (V/rad) and derivative (V/(rad/s^2)) gains, one
+            per gain set to simulate several at once
+        dt : float=1e-3
+            The sample time of the controller (s)
+        v_min, v_max : float=-12., 12.
+            The limits of the supply voltage (V)
+        derivative_filter : float=None
+            The time constant of the derivative filter (s), 10 dt if None
+        '''
+        self.kp, self.ki, self.kd = _column(kp), _column(ki), _column(kd)
+        self.dt = dt
+        self.v_min, self.v_max = v_min, v_max
+        self.tau = 10 * dt if derivative_filter is None else derivative_filter
+        self.size = max(np.size(g) for g in (kp, ki, kd))
+        self.reset((self.size, 1))
+
+    @classmethod
+    def fromMotor(cls, motor, dt: float=1e-3, time_constant: float=0.02, **kwargs):
+        '''
+        Returns a PI controller designed by internal model control on the first order model of the
+        motor (see `firstOrderModel`): the integral zero cancels the mechanical pole, leaving a
+        closed loop time constant of `time_constant` (s), which may be an array. kwargs go to the
+        constructor.
+        '''
+        gain, tau = firstOrderModel(motor)
+        time_constant = np.asarray(time_constant, dtype=float)
+        return cls(tau / gain / time_constant, 1 / gain / time_constant, dt=dt, **kwargs)
+
+    def reset(self, shape: tuple):
+        '''Clears the state of the controller for (gain sets, channels)'''
+        self.integral = np.zeros(shape)
+        self.derivative = np.zeros(shape)
+        self.error = None
+
+    def control(self, reference, current, speed) -> np.ndarray:
+        '''Returns the voltage for one sample, given the reference and measured speeds (rad/s)'''
+        e = reference - speed
+        if self.error is None: self.error = e
+        integral = self.integral + self.ki * self.dt * e
+        self.derivative = (self.tau * self.derivative + self.kd * (e - self.error)) / (self.tau + self.dt)
+        self.error = e
+        v = self.kp * e + integral + self.derivative
+        v_sat = np.clip(v, self.v_min, self.v_max)
+        windup = (v != v_sat) & (np.sign(e) == np.sign(v - v_sat))
+        self.integral = np.where(windup, self.integral, integral)
+        return v_sat
+
+class LQRController:
+    '''
+    A discrete linear quadratic regulator of motor speed, acting on the current, the speed and the
+    integral of the speed error, around the steady state of the motor at the reference speed (so
+    that the equilibrium voltage is fed forward). The integral is held while the output saturates
+    in the direction of the error.
+    '''
+
+    def __init__(self, K, feedforward, dt: float=1e-3, v_min=-12., v_max=12.):
+        '''
+        Inputs:
+        ---
+        K : list
+            The gains on (current, speed, integral of speed error), 3 or N x 3 for N gain sets
+        feedforward : tuple
+            The steady state current (A) and voltage (V) per unit of reference speed (rad/s)
+        dt : float=1e-3
+            The sample time of the controller (s)
+        v_min, v_max : float=-12., 12.
+            The limits of the supply voltage (V)
+        '''
+        K = np.atleast_2d(np.asarray(K, dtype=float))
+        self.k_current, self.k_speed, self.k_integral = (K[:, j:j + 1] for j in range(3))
+        self.feedforward = feedforward
+        self.dt = dt
+        self.v_min, self.v_max = v_min, v_max
+        self.size = len(K)
+        self.reset((self.size, 1))
+
+    @classmethod
+    def fromMotor(cls, motor, dt: float=1e-3, q_current=0., q_speed=1., q_integral=1e3, r_voltage=1., **kwargs):
+        '''
+        Returns the controller minimizing the sum over samples of q_current i^2 + q_speed e^2 +
+        q_integral (integral of e)^2 + r_voltage v^2, with e the speed error and each deviation
+        taken from the steady state. Any weight may be an array, giving one gain set per element.
+        kwargs go to the constructor.
+        '''
+        R_a, L_a, J_M, k, B_M = motor.getParameters()
+        sys = motor.createStateSpace()
+        # The speed does not depend on the angle, so the design uses (i_a, omega) only
+        Ad, Bd, _ = discretize(sys.A[:2, :2], sys.B[:2, :1], round(dt, _DT_DECIMALS), 'zoh')
+        Aa = np.zeros((3, 3))
+        Aa[:2, :2] = Ad
+        Aa[2] = (0, dt, 1)
+        Ba = np.zeros((3, 1))
+        Ba[:2] = Bd
+
+        weights = np.broadcast_arrays(*(np.asarray(w, dtype=float) for w in (q_current, q_speed, q_integral, r_voltage)))
+        gains = list()
+        for q_i, q_w, q_z, r in zip(*(w.reshape(-1) for w in weights)):
+            Q, R = np.diag((q_i, q_w, q_z)), np.array([[r]])
+            P = linalg.solve_discrete_are(Aa, Ba, Q, R)
+            gains.append(linalg.solve(R + Ba.T @ P @ Ba, Ba.T @ P @ Aa)[0])
+        return cls(np.array(gains), (B_M / k, R_a * B_M / k + k), dt=dt, **kwargs)
+
+    def reset(self, shape: tuple):
+        '''Clears the state of the controller for (gain sets, channels)'''
+        self.integral = np.zeros(shape)
+
+    def control(self, reference, current, speed) -> np.ndarray:
+        '''Returns the voltage for one sample, given the reference speed and the measured current and speed'''
+        i_ss, v_ss = self.feedforward[0] * reference, self.feedforward[1] * reference
+        deviation = speed - reference
+        v = v_ss - self.k_current * (current - i_ss) - self.k_speed * deviation - self.k_integral * self.integral
+        v_sat = np.clip(v, self.v_min, self.v_max)
+        windup = (v != v_sat) & (np.sign(deviation) == np.sign(v_sat - v))
+        self.integral = np.where(windup, self.integral, self.integral + self.dt * deviation)
+        return v_sat
+
+def simulateClosedLoop(system, controller, time, reference, load=0., channels=MOTOR_CHANNELS, x0=None) -> tuple:
+    '''
+    Simulates a plant driven by a speed controller on every channel, with the controller's voltage
+    held over each sample (the plant is discretized exactly for it), for every gain set at once.
+
+    Inputs:
+    ---
+    system : signal.lti or tuple (A, B, C, D)
+        The plant, e.g. `DC_Motor.createStateSpace` or `Tank.createStateSpace`
+    controller : PIDController or LQRController
+        The controller used on every channel, with N gain sets
+    time : list
+        Evenly spaced sample times (s), with the sample time of the controller
+    reference, load : float or list
+        The reference speed (rad/s) and load (N-m) of each channel, broadcastable to
+        N x len(time) x channels, e.g. len(time) x channels, or len(time) for a single channel
+    channels : tuple=MOTOR_CHANNELS
+        (voltage input, load input, current state, speed state) of each motor of the plant
+    x0 : list=None
+        The initial state of the plant, zero if not given
+
+    Outputs:
+    ---
+    voltage : ndarray (N x len(time) x channels)
+        The saturated voltage applied at each sample
+    X : ndarray (N x len(time) x n)
+        The state of the plant at each sample
+    '''
+    if isinstance(system, signal.lti): sys = system._as_ss()
+    else: sys = signal.StateSpace(*system)
+    time = np.asarray(time, dtype=float)
+    steps = np.diff(time)
+    if len(steps) and not np.allclose(steps, controller.dt):
+        raise ValueError("The time steps must all equal the sample time of the controller.")
+    Ad, Bd, _ = discretize(sys.A, sys.B, round(controller.dt, _DT_DECIMALS), 'zoh')
+
+    channels = np.array(channels)
+    c, n = len(channels), sys.A.shape[0]
+    def expand(values):
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 0: return values.reshape(1, 1, 1)
+        if values.ndim == 1: values = values[:, np.newaxis]
+        if values.ndim == 2: values = values[np.newaxis]
+        return values
+    reference, load = expand(reference), expand(load)
+    N = max(controller.size, len(reference), len(load))
+    reference = np.broadcast_to(reference, (N, len(time), c))
+    load = np.broadcast_to(load, (N, len(time), c))
+
+    controller.reset((N, c))
+    x = np.zeros((N, n)) + (0. if x0 is None else x0)
+    u = np.zeros((N, sys.B.shape[1]))
+    X = np.empty((len(time), N, n))
+    voltage = np.empty((len(time), N, c))
+    for k in range(len(time)):
+        X[k] = x
+        v = controller.control(reference[:, k], x[:, channels[:, 2]], x[:, channels[:, 3]])
+        voltage[k] = v
+        u[:, channels[:, 0]] = v
+        u[:, channels[:, 1]] = load[:, k]
+        x = x @ Ad.T + u @ Bd.T
+    return np.swapaxes(voltage, 0, 1), np.swapaxes(X, 0, 1)
+
+def trackingCost(time, speed, reference) -> np.ndarray:
+    '''
+    Returns the integral of the absolute speed error of every gain set (N), summed over channels, for
+    comparing gain sets; speed is N x len(time) x channels and reference broadcasts against it
+    '''
+    error = np.abs(np.asarray(speed) - reference)
+    return error.sum(axis=tuple(range(2, error.ndim))).sum(axis=1) * (time[1] - time[0])
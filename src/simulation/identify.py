@@ -0,0 +1,134 @@
+# Program: identify.py
+# Purpose: Fit the constants of DC motors (R_a, L_a, J_M, k, B_M) to recorded voltage, speed and
+#   current traces by nonlinear least squares, with the Jacobian from the sensitivity equations of
+#   the linear model, for many motors at once.
+
+import numpy as np
+
+from src.simulation.ss_solver import ss_solver_batch
+
+# The fitted constants, in the order of `DC_Motor.getParameters`
+PARAMETERS = ('R_a', 'L_a', 'J_M', 'k', 'B_M')
+
+def sensitivitySystems(theta) -> tuple:
+    '''
+    Returns the stacked (A, B) of the motor's (i_a, omega) dynamics augmented with their
+    sensitivities to each constant, for N sets of constants (N x 5). The state is
+    (x, dx/dR_a, dx/dL_a, dx/dJ_M, dx/dk, dx/dB_M), 12 in all, and each sensitivity follows
+    d/dt (dx/dp) = A (dx/dp) + (dA/dp) x + (dB/dp) u.
+    '''
+    R, L, J, k, B_M = np.moveaxis(np.asarray(theta, dtype=float), -1, 0)
+    N = R.shape[0]
+    zero = np.zeros(N)
+    def stack(rows):
+        return np.moveaxis(np.array(rows), -1, 0)
+
+    A = stack([[-R / L, -k / L], [k / J, -B_M / J]])
+    B = stack([[1 / L, zero], [zero, -1 / J]])
+    dA = [stack([[-1 / L, zero], [zero, zero]]),
+          stack([[R / L ** 2, k / L ** 2], [zero, zero]]),
+          stack([[zero, zero], [-k / J ** 2, B_M / J ** 2]]),
+          stack([[zero, -1 / L], [1 / J, zero]]),
+          stack([[zero, zero], [zero, -1 / J]])]
+    dB = [np.zeros((N, 2, 2)),
+          stack([[-1 / L ** 2, zero], [zero, zero]]),
+          stack([[zero, zero], [zero, 1 / J ** 2]]),
+          np.zeros((N, 2, 2)),
+          np.zeros((N, 2, 2))]
+
+    A_aug = np.zeros((N, 12, 12))
+    B_aug = np.zeros((N, 12, 2))
+    A_aug[:, :2, :2] = A
+    B_aug[:, :2] = B
+    for j in range(5):
+        rows = slice(2 + 2 * j, 4 + 2 * j)
+        A_aug[:, rows, :2] = dA[j]
+        A_aug[:, rows, rows] = A
+        B_aug[:, rows] = dB[j]
+    return A_aug, B_aug
+
+def identifyMotors(time, voltage, rpm, current=None, load=0., initial=None, max_iterations: int=50,
+                   tol: float=1e-10) -> dict:
+    '''
+    Fits the constants of N motors to their recorded traces by Levenberg-Marquardt on the logarithm
+    of the constants (which keeps them positive and evenly scaled). Every iteration is a single
+    batched simulation of the sensitivity systems, which gives both the residuals and the exact
+    Jacobian, and each motor accepts or rejects its own step.
+
+    Without a current trace the constants are only determined up to a common scale, so the current
+    should be recorded as well when the constants themselves are wanted.
+
+    Inputs:
+    ---
+    time : list
+        The sample times (s), shared by every motor
+    voltage : list
+        The supply voltage (V), len(time) or N x len(time)
+    rpm : list
+        The measured shaft speed (rpm), len(time) or N x len(time)
+    current : list=None
+        The measured armature current (A), len(time) or N x len(time)
+    load : float or list=0.
+        The load torque (N-m), one value or one per sample (and per motor)
+    initial : list=None
+        The starting guess (5 or N x 5), the constants of a default DC_Motor if None
+    max_iterations : int=50
+        The most iterations
+    tol : float=1e-10
+        Stop once no motor reduces its cost by more than this fraction in an iteration
+
+    Outputs:
+    ---
+    A dict of 'parameters' (N x 5, in the order of PARAMETERS), 'cost' (N, half the sum of squared
+    residuals, each trace scaled by its standard deviation), 'iterations' and 'converged' (N)
+    '''
+    time = np.asarray(time, dtype=float)
+    omega = np.atleast_2d(np.asarray(rpm, dtype=float)) * 2 * np.pi / 60
+    traces = [omega] if current is None else [omega, np.atleast_2d(np.asarray(current, dtype=float))]
+    N = max(len(np.atleast_2d(voltage)), *(len(t) for t in traces))
+    measured = np.stack([np.broadcast_to(t, (N, len(time))) for t in traces], axis=-1)
+    # Each trace weighs in by its own spread, so neither dominates because of its units
+    scale = np.maximum(measured.std(axis=1, keepdims=True), 1e-12)
+
+    U = np.stack([np.broadcast_to(np.atleast_2d(np.asarray(a, dtype=float)), (N, len(time))) for a in (voltage, load)], -1)
+    X0 = np.zeros((N, 12))
+    X0[:, 1] = measured[:, 0, 0]
+    if current is not None: X0[:, 0] = measured[:, 0, 1]
+
+    if initial is None:
+        from src.objects.DC_Motor import DC_Motor
+        initial = DC_Motor().getParameters()
+    log_theta = np.log(np.broadcast_to(np.asarray(initial, dtype=float), (N, 5))).copy()
+    outputs = [1, 0][:len(traces)]
+
+    def evaluate(log_theta):
+        theta = np.exp(log_theta)
+        T, Y, X = ss_solver_batch(sensitivitySystems(theta), time, U, X0)
+        residuals = (X[:, :, outputs] - measured) / scale
+        # d(model)/d(log p) = p d(model)/dp
+        jacobian = X[:, :, 2:].reshape(N, len(time), 5, 2)[:, :, :, outputs] * theta[:, np.newaxis, :, np.newaxis]
+        jacobian = np.moveaxis(jacobian, 2, -1) / scale[..., np.newaxis]
+        return residuals.reshape(N, -1), jacobian.reshape(N, -1, 5)
+
+    residuals, jacobian = evaluate(log_theta)
+    cost = 0.5 * (residuals ** 2).sum(axis=1)
+    damping = np.full(N, 1e-3)
+    converged = np.zeros(N, dtype=bool)
+    for iteration in range(1, max_iterations + 1):
+        H = np.einsum('nki,nkj->nij', jacobian, jacobian)
+        g = np.einsum('nki,nk->ni', jacobian, residuals)
+        damped = H + damping[:, np.newaxis, np.newaxis] * (H * np.eye(5) + 1e-12 * np.eye(5))
+        step = -np.linalg.solve(damped, g[..., np.newaxis])[..., 0]
+        step[converged] = 0.
+
+        trial_residuals, trial_jacobian = evaluate(log_theta + step)
+        trial_cost = 0.5 * (trial_residuals ** 2).sum(axis=1)
+        better = (trial_cost < cost) & ~converged
+        converged |= better & (cost - trial_cost <= tol * cost)
+        converged |= np.abs(step).max(axis=1) < 1e-12
+
+        log_theta[better] += step[better]
+        residuals[better], jacobian[better], cost[better] = trial_residuals[better], trial_jacobian[better], trial_cost[better]
+        damping = np.where(better, damping / 3, damping * 4)
+        if converged.all(): break
+    return {'parameters': np.exp(log_theta), 'cost': cost, 'iterations': iteration, 'converged': converged}
@@ -0,0 +1,324 @@
+# Program: kalman.py
+# Purpose: Fuse measurements of the motors (encoder speed, current) back into the state of the
+#   twin with discrete Kalman filters built on the continuous-time state-space models, for one
+#   vehicle with irregular, late or missing samples, or for a fleet in one vectorized step.
+
+from bisect import bisect_right
+
+import numpy as np
+from scipy import signal, linalg
+
+from src.simulation.ss_solver import discretize, _DT_DECIMALS
+
+def _asMatrix(value, size: int) -> np.ndarray:
+    '''A covariance given as a scalar, a diagonal or a matrix, as a size x size matrix'''
+    value = np.asarray(value, dtype=float)
+    if value.ndim == 0: return value * np.eye(size)
+    if value.ndim == 1: return np.diag(value)
+    return value
+
+def steadyStateGain(Ad, C, Q, R, tol: float=1e-12, max_iterations: int=100000) -> tuple:
+    """
+    Compute the steady-state Kalman gain of a discrete system.
+
+    Parameters
+    ----------
+    Ad : ndarray (n x n)
+        The discrete state transition matrix.
+    C : ndarray (p x n)
+        The measurement matrix.
+    Q : ndarray (n x n)
+        The covariance of the process noise added in every step.
+    R : ndarray (p x p)
+        The covariance of the measurement noise.
+    tol, max_iterations : optional
+        Convergence criteria for the fallback iteration, see the notes.
+
+    Returns
+    -------
+    K : ndarray (n x p)
+        The gain applied to the innovation, ``x += K (z - C x)``.
+    P : ndarray (n x n)
+        The steady-state covariance of the predicted (prior) state.
+
+    Notes
+    -----
+    The prior covariance solves the discrete algebraic Riccati equation,
+    using `scipy.linalg.solve_discrete_are`. That requires every state
+    that is not observed to be stable, which fails e.g. for the shaft
+    angle when only the speed of a motor is measured: its variance grows
+    without bound. The gain still converges in that case, so the Riccati
+    recursion is iterated until the gain stops changing instead.
+    """
+    try:
+        P = linalg.solve_discrete_are(Ad.T, C.T, Q, R)
+        if not np.isfinite(P).all(): raise ValueError
+    except (ValueError, np.linalg.LinAlgError):
+        P = Q.copy()
+        K = np.zeros((Ad.shape[0], C.shape[0]))
+        for i in range(max_iterations):
+            K_last = K
+            K = linalg.solve(C @ P @ C.T + R, C @ P, assume_a='pos').T
+            P = Ad @ (P - K @ C @ P) @ Ad.T + Q
+            if np.abs(K - K_last).max() <= tol * max(1., np.abs(K).max()): break
+        P = (P + P.T) / 2
+    K = linalg.solve(C @ P @ C.T + R, C @ P, assume_a='pos').T
+    return K, P
+
+def maskedGain(P, C, R, mask) -> np.ndarray:
+    '''
+    Returns the gain (... x n x p) that updates with only the measurements where mask is True, for
+    one filter or a stack of them. The columns of the missing measurements are zero.
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    Cm = C * mask[..., :, np.newaxis]
+    outer = mask[..., :, np.newaxis] & mask[..., np.newaxis, :]
+    S = Cm @ P @ np.swapaxes(Cm, -1, -2) + np.where(outer, R, 0.) + np.eye(mask.shape[-1]) * ~mask[..., np.newaxis]
+    PCt = P @ np.swapaxes(Cm, -1, -2)
+    return np.swapaxes(np.linalg.solve(S, np.swapaxes(PCt, -1, -2)), -1, -2)
+
+class KalmanFilter:
+    '''
+    Estimates the state of a continuous-time linear system from noisy, timestamped measurements of
+    its outputs, holding the input constant between samples (zero order hold).
+
+    With steady_state=True the gain is computed once, for the nominal step size, so that every
+    sample costs a few small matrix products; the covariance is then fixed at its steady-state
+    value. Otherwise the covariance is propagated with every sample, which is exact for irregular
+    sampling and during the transient after initialization.
+
+    Measurements may be partly or wholly missing (NaN or None), and may arrive out of order: a
+    sample older than the latest is slotted in among the last `history` samples, and the samples
+    after it are filtered again.
+    '''
+
+    def __init__(self, system, dt: float, Q, R, **kwargs):
+        '''
+        Inputs:
+        ---
+        system : signal.lti or tuple (A, B, C, D)
+            The continuous-time model, whose outputs C x + D u are what is measured
+        dt : float
+            The nominal time between samples (s)
+        Q : float or list
+            The covariance of the process noise added over a step of dt, a matrix, its diagonal or a scalar
+        R : float or list
+            The covariance of the measurement noise, a matrix, its diagonal or a scalar
+        C, D : list=None
+            Measure C x + D u instead of the outputs of the system, e.g. also the current of a motor
+        x0 : list=None
+            The initial state, zero if not given
+        P0 : list=None
+            The initial covariance, the steady-state covariance if not given
+        t0 : float=0.
+            The time of the initial state (s)
+        steady_state : bool=True
+            Use the precomputed steady-state gain rather than propagating the covariance
+        history : int=64
+            The number of past samples kept to slot late measurements in
+        '''
+        if isinstance(system, signal.lti): sys = system._as_ss()
+        else: sys = signal.StateSpace(*system)
+        self.A, self.B, self.C, self.D = sys.A, sys.B, sys.C, sys.D
+        self.x0 = None
+        self.P0 = None
+        self.t0 = 0.
+        self.steady_state = True
+        self.history = 64
+
+        for key, value in kwargs.items():
+            if key == 'C': self.C = np.atleast_2d(np.asarray(value, dtype=float))
+            elif key == 'D': self.D = np.atleast_2d(np.asarray(value, dtype=float))
+            elif hasattr(self, key): setattr(self, key, value)
+            else: raise KeyError("Unknown KalmanFilter option: " + key)
+        n, p = self.A.shape[0], self.C.shape[0]
+        if self.D.shape != (p, self.B.shape[1]): self.D = np.zeros((p, self.B.shape[1]))
+
+        self.dt = round(dt, _DT_DECIMALS)
+        self.Q = _asMatrix(Q, n)
+        self.R = _asMatrix(R, p)
+        self.Ad, self.Bd, _ = discretize(self.A, self.B, self.dt, 'zoh')
+        self.K, self.P_prior = steadyStateGain(self.Ad, self.C, self.Q, self.R)
+        I_KC = np.eye(n) - self.K @ self.C
+        self.P_post = I_KC @ self.P_prior @ I_KC.T + self.K @ self.R @ self.K.T
+        self.masked_gains = dict()
+        self.stats = {'samples': 0, 'late': 0, 'dropped': 0, 'missing': 0}
+        self.reset(self.x0, self.P0, self.t0)
+
+    def reset(self, x0=None, P0=None, t: float=0.):
+        '''Sets the state, covariance and time of the filter and forgets the past samples'''
+        self.x = np.zeros(self.A.shape[0]) if x0 is None else np.array(x0, dtype=float)
+        self.P = self.P_prior.copy() if P0 is None else _asMatrix(P0, self.A.shape[0]).copy()
+        self.t = t
+        self.records = list()
+        self.snapshots = list()
+
+    def predict(self, u=None, dt: float=None):
+        '''Advances the estimate over a step of dt (the nominal step if not given) with the input u held'''
+        if dt is None: dt = self.dt
+        key = round(dt, _DT_DECIMALS)
+        if key == self.dt: Ad, Bd = self.Ad, self.Bd
+        else: Ad, Bd, _ = discretize(self.A, self.B, key, 'zoh')
+        self.x = Ad @ self.x
+        if u is not None: self.x += Bd @ np.asarray(u, dtype=float)
+        if self.steady_state: self.P = self.P_prior
+        # Q is the noise added over the nominal step, scaled in proportion for other steps
+        else: self.P = Ad @ self.P @ Ad.T + self.Q * (dt / self.dt)
+        self.t += dt
+
+    def update(self, z, u=None):
+        '''Corrects the estimate with the measurement z, whose missing entries are NaN (or None for none)'''
+        if z is None: return
+        z = np.asarray(z, dtype=float)
+        mask = np.isfinite(z)
+        if not mask.any():
+            self.stats['missing'] += 1
+            return
+        y = self.C @ self.x
+        if u is not None: y += self.D @ np.asarray(u, dtype=float)
+        innovation = np.where(mask, z - y, 0.)
+
+        if self.steady_state:
+            if mask.all(): K = self.K
+            else:
+                key = mask.tobytes()
+                if key not in self.masked_gains: self.masked_gains[key] = maskedGain(self.P_prior, self.C, self.R, mask)
+                K = self.masked_gains[key]
+        else: K = maskedGain(self.P, self.C, self.R, mask)
+        self.x = self.x + K @ innovation
+        if self.steady_state and mask.all():
+            self.P = self.P_post
+            return
+        # Joseph form, which keeps the covariance symmetric and positive
+        I_KC = np.eye(len(self.x)) - K @ (self.C * mask[:, np.newaxis])
+        self.P = I_KC @ self.P @ I_KC.T + K @ (self.R * np.outer(mask, mask)) @ K.T
+
+    def _advance(self, t: float, z, u):
+        if t > self.t: self.predict(u, t - self.t)
+        self.update(z, u)
+        self.t = t
+
+    def step(self, t: float, z, u=None) -> np.ndarray:
+        '''
+        Filters the sample measured at time t, and returns the estimate of the state at the latest time.
+
+        Inputs:
+        ---
+        t : float
+            The time of the measurement (s)
+        z : list
+            The measurement, with NaN for missing entries, or None if there is none
+        u : list=None
+            The input held since the previous sample, zero if not given
+        '''
+        self.stats['samples'] += 1
+        if t >= self.t or not self.records:
+            self._advance(t, z, u)
+            self.records.append((t, z, u))
+            self.snapshots.append((self.x, self.P, self.t))
+            if len(self.records) > self.history:
+                del self.records[0], self.snapshots[0]
+            return self.x
+
+        # Late: rewind to the last sample before t and filter forwards again
+        self.stats['late'] += 1
+        i = bisect_right([r[0] for r in self.records], t)
+        if i == 0:
+            self.stats['dropped'] += 1
+            return self.x
+        later = self.records[i:]
+        del self.records[i:], self.snapshots[i:]
+        self.x, self.P, self.t = self.snapshots[-1]
+        for record in [(t, z, u)] + later:
+            self._advance(*record)
+            self.records.append(record)
+            self.snapshots.append((self.x, self.P, self.t))
+        return self.x
+
+    def output(self, u=None) -> np.ndarray:
+        '''Returns the estimate of the measured quantities, C x + D u'''
+        y = self.C @ self.x
+        if u is not None: y = y + self.D @ np.asarray(u, dtype=float)
+        return y
+
+class BatchKalmanFilter:
+    '''
+    Steady-state Kalman filters for a fleet of N vehicles sampled together at a fixed step,
+    advanced in one vectorized step. The vehicles may share one model or each have their own.
+    Measurements that are missing (NaN) for some vehicles are handled with a gain for that
+    pattern of measurements, computed for those vehicles only.
+    '''
+
+    def __init__(self, A, B, C, dt: float, Q, R, D=None, x0=None):
+        '''
+        Inputs:
+        ---
+        A, B, C : list
+            The continuous-time model, shared (n x n, n x m, p x n) or per vehicle (N x n x n, ...)
+        dt : float
+            The time between samples (s)
+        Q, R : float or list
+            The process and measurement noise covariances, as for KalmanFilter, shared by the fleet
+        D : list=None
+            The feedthrough of the measurement, zero if not given
+        x0 : list=None
+            The initial states (N x n), which also sets N when the model is shared
+        '''
+        A, B, C = (np.asarray(M, dtype=float) for M in (A, B, C))
+        n, p = A.shape[-1], C.shape[-2]
+        self.dt = dt
+        self.Q = _asMatrix(Q, n)
+        self.R = _asMatrix(R, p)
+        self.Ad, self.Bd, _ = discretize(A, B, dt, 'zoh')
+        self.C = C
+        self.D = np.zeros(C.shape[:-1] + (B.shape[-1],)) if D is None else np.asarray(D, dtype=float)
+
+        if A.ndim == 2:
+            self.K, self.P = steadyStateGain(self.Ad, C, self.Q, self.R)
+        else:
+            gains = [steadyStateGain(self.Ad[i], C[i] if C.ndim == 3 else C, self.Q, self.R) for i in range(len(A))]
+            self.K = np.stack([K for K, P in gains])
+            self.P = np.stack([P for K, P in gains])
+
+        if x0 is not None: self.x = np.array(x0, dtype=float)
+        elif A.ndim == 3: self.x = np.zeros((len(A), n))
+        else: raise ValueError("x0 is needed to size the fleet when the model is shared.")
+
+    def _apply(self, M, v):
+        '''M v for every vehicle, with M shared or per vehicle'''
+        return np.einsum('ij,nj->ni' if M.ndim == 2 else 'nij,nj->ni', M, v)
+
+    def step(self, z, u=None) -> np.ndarray:
+        '''
+        Advances every vehicle by one step with the inputs u (N x m) held, corrects it with the
+        measurements z (N x p, NaN where missing), and returns the states (N x n)
+        '''
+        x = self._apply(self.Ad, self.x)
+        if u is not None:
+            u = np.asarray(u, dtype=float)
+            x += self._apply(self.Bd, u)
+        z = np.asarray(z, dtype=float)
+        y = self._apply(self.C, x)
+        if u is not None: y += self._apply(self.D, u)
+        mask = np.isfinite(z)
+        innovation = np.where(mask, z - y, 0.)
+
+        if mask.all():
+            x += self._apply(self.K, innovation)
+        else:
+            full = mask.all(axis=1)
+            if full.any():
+                K = self.K if self.K.ndim == 2 else self.K[full]
+                x[full] += self._apply(K, innovation[full])
+            partial = ~full & mask.any(axis=1)
+            if partial.any():
+                P = self.P if self.P.ndim == 2 else self.P[partial]
+                C = self.C if self.C.ndim == 2 else self.C[partial]
+                K = maskedGain(P, C, self.R, mask[partial])
+                x[partial] += np.einsum('nij,nj->ni', K, innovation[partial])
+        self.x = x
+        return x
+
+    def output(self) -> np.ndarray:
+        '''Returns the estimate of the measured quantities (N x p), without feedthrough'''
+        return self._apply(self.C, self.x)
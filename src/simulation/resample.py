@@ -0,0 +1,63 @@
+# Program: resample.py
+# Purpose: Map sampled signals (such as solver output) onto arbitrary query times
+#   using binary search, for use by the simulation, GUI and analysis code.
+
+import numpy as np
+
+KINDS = ('hold', 'next', 'nearest', 'linear')
+
+def resample(t, values, query, kind='hold'):
+    """
+    Resample a signal defined at the sorted times `t` onto the times `query`.
+
+    Parameters
+    ----------
+    t : array_like (1D)
+        The sample times of the signal, sorted in ascending order.
+    values : array_like (1D or 2D)
+        The signal at each time in `t`. If there are several signals, each
+        column of the rank-2 array is one signal.
+    query : array_like (1D)
+        The times at which the signal is desired, in any order.
+    kind : {'hold', 'next', 'nearest', 'linear'}, optional
+        'hold' takes the last sample at or before each query time (zero
+        order hold), 'next' the first sample at or after it, 'nearest' the
+        closest sample, and 'linear' interpolates between the neighboring
+        samples. Queries outside of `t` take the first or last sample.
+
+    Returns
+    -------
+    ndarray
+        The signal at each time in `query`, with one row per query time.
+
+    Notes
+    -----
+    Each query costs one binary search, so resampling N queries from M
+    samples is O(N log M).
+    """
+    t = np.asarray(t, dtype=float)
+    values = np.asarray(values)
+    query = np.asarray(query, dtype=float)
+    if kind not in KINDS:
+        raise ValueError("Unknown resampling kind '%s', expected one of %s" % (kind, KINDS))
+    if len(t) != len(values):
+        raise ValueError("values must have the same number of rows as elements in t.")
+
+    last = len(t) - 1
+    if kind == 'hold':
+        index = np.searchsorted(t, query, side='right') - 1
+        return values[np.clip(index, 0, last)]
+    
+    index = np.clip(np.searchsorted(t, query, side='left'), 0, last)
+    if kind == 'next':
+        return values[index]
+
+    before = np.clip(index - 1, 0, last)
+    if kind == 'nearest':
+        closer = np.abs(query - t[before]) <= np.abs(t[index] - query)
+        return values[np.where(closer, before, index)]
+
+    span = t[index] - t[before]
+    weight = np.divide(query - t[before], span, out=np.ones_like(span), where=span > 0)
+    weight = np.clip(weight, 0., 1.).reshape((-1,) + (1,) * (values.ndim - 1))
+    return values[before] + weight * (values[index] - values[before])
@@ -0,0 +1,94 @@
+# Program: segments.py
+# Purpose: Describe an input by its segments, a value (and optionally a ramp) held between
+#   breakpoints, so that a mission of a few hundred commands is a few hundred rows rather than
+#   one row per sample, and `ss_solver` can integrate across every step in the input exactly.
+
+import numpy as np
+
+class InputSegments:
+    '''
+    A piecewise-linear input with m channels. Segment k starts at breakpoints[k] and holds
+    values[k] + slopes[k] (t - breakpoints[k]) until the next breakpoint, where the input may jump.
+    Times before the first breakpoint belong to the first segment.
+    '''
+
+    def __init__(self, breakpoints, values, slopes=None):
+        '''
+        Inputs:
+        ---
+        breakpoints : list
+            The start time of each segment (s), strictly increasing
+        values : list
+            The input at the start of each segment, K or K x m
+        slopes : list=None
+            The rate of change of the input within each segment (per s), shaped like values.
+            Every segment is constant if None
+        '''
+        self.breakpoints = np.asarray(breakpoints, dtype=float).reshape(-1)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.breakpoints), -1)
+        if slopes is None: self.slopes = np.zeros_like(self.values)
+        else: self.slopes = np.asarray(slopes, dtype=float).reshape(self.values.shape)
+        if len(self.breakpoints) == 0: raise ValueError("An input needs at least one segment.")
+        if np.any(np.diff(self.breakpoints) <= 0): raise ValueError("The breakpoints must be strictly increasing.")
+
+    @staticmethod
+    def fromSchedule(schedule) -> 'InputSegments':
+        '''
+        Returns the constant segments of a list of (start time, value) pairs, as used by `Scenario`.
+        Of several pairs with the same start time, the last one is held
+        '''
+        starts, values = zip(*schedule)
+        starts = np.asarray(starts, dtype=float)
+        last = np.append(starts[1:] != starts[:-1], True)
+        return InputSegments(starts[last], np.asarray(values, dtype=float)[last])
+
+    @staticmethod
+    def stack(*channels) -> 'InputSegments':
+        '''
+        Combines InputSegments and constants into one input, with the channels in the given order
+        and a breakpoint wherever any channel has one
+        '''
+        parts = [c if isinstance(c, InputSegments) else InputSegments([-np.inf], [c]) for c in channels]
+        breakpoints = np.unique(np.concatenate([p.breakpoints for p in parts]))
+        if len(breakpoints) > 1: breakpoints = breakpoints[np.isfinite(breakpoints)]
+        values, slopes = list(), list()
+        for p in parts:
+            index = p.segmentOf(breakpoints)
+            values.append(p.valuesAt(breakpoints, index))
+            slopes.append(p.slopes[index])
+        return InputSegments(breakpoints, np.hstack(values), np.hstack(slopes))
+
+    @property
+    def inputs(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def ramped(self) -> bool:
+        '''True if any segment changes within itself'''
+        return bool(np.any(self.slopes))
+
+    def __len__(self) -> int:
+        return len(self.breakpoints)
+
+    def segmentOf(self, time) -> np.ndarray:
+        '''Returns the index of the segment each time falls in'''
+        index = np.searchsorted(self.breakpoints, time, side='right') - 1
+        return np.clip(index, 0, len(self.breakpoints) - 1)
+
+    def valuesAt(self, time, index) -> np.ndarray:
+        '''Returns the input at each time (len(time) x m) as given by the segments at index'''
+        time = np.asarray(time, dtype=float)
+        offset = time - self.breakpoints[index]
+        if not self.ramped: return self.values[index]
+        return self.values[index] + self.slopes[index] * np.where(np.isfinite(offset), offset, 0.)[..., np.newaxis]
+
+    def evaluate(self, time) -> np.ndarray:
+        '''Samples the input at every time (len(time) x m), taking the new value at a breakpoint'''
+        return self.valuesAt(time, self.segmentOf(time))
+
+    def __call__(self, time) -> np.ndarray:
+        return self.evaluate(time)
+
+    def edges(self, start: float, stop: float) -> np.ndarray:
+        '''Returns the breakpoints strictly between start and stop'''
+        return self.breakpoints[(self.breakpoints > start) & (self.breakpoints < stop)]
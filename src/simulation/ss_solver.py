@@ -7,12 +7,91 @@
 # Sources: https://github.com/scipy/scipy/blob/v1.8.1/scipy/signal/_ltisys.py#L1764-L1938
 
 import numpy as np
-from scipy import signal, integrate, interpolate
+from scipy import signal, integrate, interpolate, linalg
 
-def ss_solver(system, T, U=None, X0=None, **kwargs):
+from src.simulation.cache import LRUCache
+from src.simulation.segments import InputSegments
+
+# Step sizes are grouped after rounding to this many decimals, so that
+# floating point noise in T (e.g. from np.arange) does not defeat reuse of
+# a discretization.
+_DT_DECIMALS = 12
+
+# Discretizations of single systems, shared by every solver and stepper
+DISCRETIZATION_CACHE = LRUCache('discretization', maxsize=1024)
+
+def discretize(A, B, dt, method='zoh'):
+    """
+    Exactly discretize the continuous-time pair (A, B) over a step of
+    length `dt` using the matrix exponential.
+
+    Parameters
+    ----------
+    A : array_like (n x n or N x n x n)
+        The state matrix, or a stack of N state matrices.
+    B : array_like (n x m or N x n x m)
+        The input matrix, or a stack of N input matrices.
+    dt : float
+        The step size.
+    method : {'zoh', 'foh'}, optional
+        'zoh' holds the input constant over the step, 'foh' varies it
+        linearly from one sample to the next.
+
+    Returns
+    -------
+    Ad : ndarray (n x n or N x n x n)
+        The state transition matrix, ``expm(A * dt)``.
+    B0 : ndarray (n x m or N x n x m)
+        The input matrix applied to the input at the start of the step.
+    B1 : ndarray (n x m or N x n x m)
+        The input matrix applied to the input at the end of the step
+        (zero for 'zoh').
+
+    Notes
+    -----
+    The state advances as ``x[k+1] = Ad x[k] + B0 u[k] + B1 u[k+1]``. Both
+    holds are obtained from a single exponential of the block matrix
+    ``[[A dt, B dt, 0], [0, 0, I], [0, 0, 0]]``, whose first block row
+    is ``[Ad, G0, G1]`` with ``u(t) = u[k] + (t / dt) (u[k+1] - u[k])``.
+    Stacks are exponentiated in one call to `scipy.linalg.expm`.
+
+    Single systems are cached in `DISCRETIZATION_CACHE`, keyed on the
+    matrices, the step size and the method, and the returned arrays are
+    read-only because they are shared.
+    """
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    B = np.atleast_2d(np.asarray(B, dtype=float))
+    if method not in ('zoh', 'foh'):
+        raise ValueError("Unknown discretization method '%s'" % method)
+    if A.ndim == 2 and B.ndim == 2:
+        key = (A.shape, B.shape, A.tobytes(), B.tobytes(), float(dt), method)
+        return DISCRETIZATION_CACHE.get(key, lambda: _readOnly(_discretize(A, B, dt, method)))
+    return _discretize(A, B, dt, method)
+
+def _readOnly(arrays):
+    for a in arrays: a.setflags(write=False)
+    return arrays
+
+def _discretize(A, B, dt, method):
+    n, m = B.shape[-2:]
+
+    stack = np.broadcast_shapes(A.shape[:-2], B.shape[:-2])
+    M = np.zeros(stack + (n + 2 * m, n + 2 * m))
+    M[..., :n, :n] = A * dt
+    M[..., :n, n:n + m] = B * dt
+    M[..., n:n + m, n + m:] = np.eye(m)
+    E = linalg.expm(M)
+
+    Ad = E[..., :n, :n]
+    if method == 'zoh':
+        return Ad, E[..., :n, n:n + m], np.zeros(stack + (n, m))
+    return Ad, E[..., :n, n:n + m] - E[..., :n, n + m:], E[..., :n, n + m:]
+
+def ss_solver(system, T, U=None, X0=None, method='odeint', **kwargs):
     """
     Simulate output of a continuous-time linear system, by using
-    the ODE solver `scipy.integrate.odeint`.
+    the ODE solver `scipy.integrate.odeint` or an exact discretization of
+    the system.
 
     Parameters
     ----------
@@ -29,15 +108,24 @@ def ss_solver(system, T, U=None, X0=None, **kwargs):
         The time steps at which the input is defined and at which the
         output is desired.  The default is 101 evenly spaced points on
         the interval [0,10.0].
-    U : array_like (1D or 2D), optional
+    U : array_like (1D or 2D) or InputSegments, optional
         An input array describing the input at each time T.  Linear
         interpolation is used between given times.  If there are
         multiple inputs, then each column of the rank-2 array
         represents an input.  If U is not given, the input is assumed
-        to be zero.
+        to be zero.  An `InputSegments` describes the input between the
+        times in `T` as well, see the notes.
     X0 : array_like (1D), optional
         The initial condition of the state vector.  If `X0` is not
         given, the initial conditions are assumed to be 0.
+    method : {'odeint', 'foh', 'zoh'}, optional
+        'odeint' (the default) integrates the system numerically. 'foh'
+        discretizes the system with the matrix exponential once per
+        distinct step size in `T` and treats the input exactly as the
+        linear interpolation used by 'odeint', so the two agree to within
+        the tolerance of `odeint` (``rtol = atol = 1.49e-8`` by default).
+        'zoh' holds each input sample constant until the next time in `T`.
+        With `InputSegments`, 'foh' and 'zoh' are the same exact solution.
     kwargs : dict
         Additional keyword arguments are passed on to the function
         `odeint`.  See the notes below for more details.
@@ -61,6 +149,18 @@ def ss_solver(system, T, U=None, X0=None, **kwargs):
     If (num, den) is passed in for ``system``, coefficients for both the
     numerator and denominator should be specified in descending exponent
     order (e.g. ``s^2 + 3s + 5`` would be represented as ``[1, 3, 5]``).
+
+    The 'foh' and 'zoh' methods do not call back into Python for every
+    evaluation of the vector field, and are not slowed down by stiff
+    systems such as the electrical pole of `DC_Motor`.
+
+    When `U` is an `InputSegments`, the integration restarts at every
+    breakpoint between the first and last time in `T`, so a step in the
+    input is never smeared across a sample. 'foh' and 'zoh' propagate the
+    state in closed form from each breakpoint or output time to the next,
+    so the cost grows with ``len(T)`` plus the number of segments and `T`
+    may be as sparse as the outputs wanted. 'odeint' integrates each
+    segment separately, with the segment's own constant or ramped input.
     """
 
     if isinstance(system, signal.lti): sys = system._as_ss()
@@ -73,6 +173,16 @@ def ss_solver(system, T, U=None, X0=None, **kwargs):
     T = np.atleast_1d(T)
     if len(T.shape) != 1: raise ValueError("T must be a rank-1 array.")
 
+    if isinstance(U, InputSegments):
+        if U.inputs != sys.inputs:
+            raise ValueError("The number of inputs in U (%d) is not compatible with the "
+                             "number of system inputs (%d)" % (U.inputs, sys.inputs))
+        if method in ('zoh', 'foh'): xout = _propagateSegments(sys.A, sys.B, T, U, X0)
+        elif method == 'odeint': xout = _integrateSegments(sys.A, sys.B, T, U, X0, **kwargs)
+        else: raise ValueError("Unknown solver method '%s'" % method)
+        yout = np.dot(sys.C, np.transpose(xout)) + np.dot(sys.D, np.transpose(U.evaluate(T)))
+        return T, np.squeeze(np.transpose(yout)), xout
+
     if U is not None:
         U = np.atleast_1d(U)
         if len(U.shape) == 1: U = U.reshape(-1, 1)
@@ -83,7 +193,17 @@ def ss_solver(system, T, U=None, X0=None, **kwargs):
         if sU[1] != sys.inputs:
             raise ValueError("The number of inputs in U (%d) is not compatible with the" 
                              "number of system inputs (%d)" % (sU[1], sys.inputs))
-        
+
+    if method in ('zoh', 'foh'):
+        if U is None: xout = _propagate(sys.A, sys.B, T, X0, method)
+        else: xout = _propagate(sys.A, sys.B, T, X0, method, U[:-1], U[1:])
+        yout = np.dot(sys.C, np.transpose(xout))
+        if U is not None: yout = yout + np.dot(sys.D, np.transpose(U))
+        return T, np.squeeze(np.transpose(yout)), xout
+    elif method != 'odeint':
+        raise ValueError("Unknown solver method '%s'" % method)
+
+    if U is not None:
         # Create a callable that uses linear interpolation to
         # calculate the input at any time.
         ufunc = interpolate.interp1d(T, U, kind='linear', axis=0, bounds_error=False)
@@ -102,3 +222,232 @@ def ss_solver(system, T, U=None, X0=None, **kwargs):
         yout = np.dot(sys.C, np.transpose(xout))
 
     return T, np.squeeze(np.transpose(yout)), xout
+
+
+def _propagate(A, B, T, X0, method, U_start=None, U_end=None):
+    '''
+    Advance the state over every step in T with exact discrete transitions, with the input
+    U_start[k] at the start of step k and, for 'foh', U_end[k] at its end.
+    '''
+    n = A.shape[0]
+    xout = np.empty((len(T), n))
+    xout[0] = X0
+    if len(T) == 1: return xout
+
+    dts = np.round(np.diff(T), _DT_DECIMALS)
+    steps, index = np.unique(dts, return_inverse=True)
+    index = index.reshape(-1)
+    Ads, B0s, B1s = zip(*[discretize(A, B, dt, method) for dt in steps])
+
+    # The input enters every step additively, so its contribution is
+    # computed for the whole horizon at once
+    if U_start is None: drive = np.zeros((len(T) - 1, n))
+    else:
+        B0s, B1s = np.array(B0s), np.array(B1s)
+        drive = np.einsum('kij,kj->ki', B0s[index], U_start)
+        if method == 'foh': drive += np.einsum('kij,kj->ki', B1s[index], U_end)
+
+    x = xout[0]
+    if len(steps) == 1:
+        Ad = Ads[0]
+        for k in range(len(T) - 1):
+            x = Ad @ x + drive[k]
+            xout[k + 1] = x
+    else:
+        for k in range(len(T) - 1):
+            x = Ads[index[k]] @ x + drive[k]
+            xout[k + 1] = x
+    return xout
+
+def ss_solver_stream(system, chunks, X0=None, method='foh'):
+    """
+    Simulate a continuous-time linear system over a horizon that arrives
+    in chunks, yielding the response chunk by chunk so that memory use
+    does not grow with the horizon.
+
+    Parameters
+    ----------
+    system : an instance of the `lti` class or a tuple describing the system.
+        As for `ss_solver`.
+    chunks : iterable of (T, U) pairs
+        Consecutive pieces of the horizon: the times of each chunk
+        (1D, increasing, after the last time of the chunk before) and
+        the input at those times (1D or 2D, or None for zero input).
+    X0 : array_like (1D), optional
+        The state at the first time of the first chunk, zero by default.
+    method : {'foh', 'zoh'}, optional
+        The discretization used for every step, see `discretize`.
+
+    Yields
+    ------
+    T : 1D ndarray
+        The times of the chunk.
+    yout : ndarray
+        The response at those times.
+    xout : ndarray
+        The state at those times.
+
+    Notes
+    -----
+    The state, and the last time and input, are carried from one chunk
+    to the next, so the step that joins two chunks is taken exactly as
+    `ss_solver` would take it and the concatenated chunks equal one call
+    of `ss_solver` over the whole horizon. Nothing is kept from a chunk
+    once it has been yielded; pass the chunks on to a `Recorder` or to
+    `src.simulation.streaming.RunningStats` to keep what is needed.
+    """
+    if method not in ('zoh', 'foh'): raise ValueError("Unknown solver method '%s'" % method)
+    if isinstance(system, signal.lti): sys = system._as_ss()
+    else: sys = signal.lti(*system)._as_ss()
+    n, m = sys.B.shape
+
+    x = np.zeros(n) if X0 is None else np.asarray(X0, dtype=float)
+    last_t, last_u = None, None
+    for T, U in chunks:
+        T = np.atleast_1d(np.asarray(T, dtype=float))
+        if len(T) == 0: continue
+        U = np.zeros((len(T), m)) if U is None else np.asarray(U, dtype=float).reshape(len(T), m)
+
+        if last_t is None:
+            xout = _propagate(sys.A, sys.B, T, x, method, U[:-1], U[1:])
+        else:
+            # The chunk is solved from the last sample of the one before, which is then dropped
+            T_joined = np.concatenate(([last_t], T))
+            U_joined = np.concatenate((last_u[np.newaxis], U))
+            xout = _propagate(sys.A, sys.B, T_joined, x, method, U_joined[:-1], U_joined[1:])[1:]
+        x, last_t, last_u = xout[-1], T[-1], U[-1]
+
+        yout = xout @ sys.C.T + U @ sys.D.T
+        yield T, (yout[:, 0] if yout.shape[1] == 1 else yout), xout
+
+def _propagateSegments(A, B, T, segments, X0):
+    '''
+    Advance the state exactly under a segmented input, over a grid of the times in T and the
+    breakpoints between them. No breakpoint falls inside a step of the grid, so the input is
+    constant or linear over every step and 'zoh' or 'foh' is exact. Returns the states at T.
+    '''
+    edges = segments.edges(T[0], T[-1])
+    grid = np.union1d(T, edges) if len(edges) else T
+    if len(grid) == 1: return np.array([X0], dtype=float).reshape(1, -1)
+
+    # Each step takes the input of the segment it starts in, at both of its ends
+    index = segments.segmentOf(grid[:-1])
+    U_start = segments.valuesAt(grid[:-1], index)
+    if segments.ramped:
+        xout = _propagate(A, B, grid, X0, 'foh', U_start, segments.valuesAt(grid[1:], index))
+    else: xout = _propagate(A, B, grid, X0, 'zoh', U_start)
+    if grid is T: return xout
+    return xout[np.searchsorted(grid, T)]
+
+def _integrateSegments(A, B, T, segments, X0, **kwargs):
+    '''Integrate with odeint from breakpoint to breakpoint, restarting at each. Returns the states at T.'''
+    def fprime(x, t, k):
+        """The vector field of the linear system within segment k."""
+        u = segments.values[k] + segments.slopes[k] * (t - segments.breakpoints[k] if segments.ramped else 0.)
+        return np.dot(A, x) + np.dot(B, u)
+
+    xout = np.empty((len(T), A.shape[0]))
+    xout[0] = X0
+    cuts = np.concatenate(([T[0]], segments.edges(T[0], T[-1]), [T[-1]]))
+    x = xout[0]
+    for start, stop in zip(cuts[:-1], cuts[1:]):
+        rows = np.flatnonzero((T > start) & (T <= stop))
+        times = np.concatenate(([start], T[rows]))
+        if times[-1] < stop: times = np.append(times, stop)
+        if len(times) < 2: continue
+        k = int(segments.segmentOf(start))
+        solution = integrate.odeint(fprime, x, times, args=(k,), **kwargs)
+        xout[rows] = solution[1:len(rows) + 1]
+        x = solution[-1]
+    return xout
+
+def ss_solver_batch(system, T, U=None, X0=None, method='foh'):
+    """
+    Simulate an ensemble of N continuous-time linear systems that share
+    the same time steps, vectorized across the ensemble.
+
+    Parameters
+    ----------
+    system : tuple (A, B) or (A, B, C, D)
+        Stacks of N system matrices: A is N x n x n and B is N x n x m.
+        C and D may be stacks (N x p x n, N x p x m) or single matrices
+        shared by the ensemble. If they are not given, the output is the
+        full state.
+    T : array_like (1D)
+        The time steps at which the input is defined and at which the
+        output is desired.
+    U : array_like (2D or 3D), optional
+        The input at each time in T, either a T x m array shared by every
+        system or an N x T x m array with one input sequence per system.
+        If U is not given, the input is assumed to be zero.
+    X0 : array_like (1D or 2D), optional
+        The initial state, either shared (n) or per system (N x n). The
+        default is zero.
+    method : {'foh', 'zoh'}, optional
+        The discretization used for every step, see `discretize`.
+
+    Returns
+    -------
+    T : 1D ndarray
+        The time values for the output.
+    yout : ndarray (N x T x p, or N x T if p is 1)
+        The response of each system.
+    xout : ndarray (N x T x n)
+        The time-evolution of each state-vector.
+
+    Notes
+    -----
+    The ensemble is discretized with one stacked matrix exponential per
+    distinct step size, after which every step is a single batched
+    matrix product, so the only Python loop is over the time steps.
+    """
+    A = np.asarray(system[0], dtype=float)
+    B = np.asarray(system[1], dtype=float)
+    if A.ndim != 3 or B.ndim != 3:
+        raise ValueError("A and B must be stacks of matrices (N x n x n, N x n x m).")
+    N, n, m = B.shape
+    if len(system) == 4: C, D = np.asarray(system[2], dtype=float), np.asarray(system[3], dtype=float)
+    else: C, D = np.eye(n), np.zeros((n, m))
+
+    T = np.atleast_1d(T)
+    if len(T.shape) != 1: raise ValueError("T must be a rank-1 array.")
+
+    if U is not None:
+        U = np.asarray(U, dtype=float)
+        if U.ndim == 1: U = U.reshape(-1, 1)
+        if U.ndim == 2: U = np.broadcast_to(U, (N,) + U.shape)
+        if U.shape[1] != len(T):
+            raise ValueError("U must have the same number of rows as elements in T.")
+        if U.shape[2] != m:
+            raise ValueError("The number of inputs in U (%d) is not compatible with the" 
+                             "number of system inputs (%d)" % (U.shape[2], m))
+
+    # Time is the leading axis while stepping so that every step reads and
+    # writes one contiguous N x n block
+    xout = np.empty((len(T), N, n))
+    xout[0] = 0. if X0 is None else X0
+    if len(T) > 1:
+        dts = np.round(np.diff(T), _DT_DECIMALS)
+        steps, index = np.unique(dts, return_inverse=True)
+        index = index.reshape(-1)
+        Ads = list()
+        drive = np.zeros((len(T) - 1, N, n))
+        if U is not None: U_t = np.ascontiguousarray(np.swapaxes(U, 0, 1))
+        for s, dt in enumerate(steps):
+            Ad, B0, B1 = discretize(A, B, dt, method)
+            Ads.append(Ad)
+            if U is None: continue
+            mask = index == s
+            drive[mask] = np.einsum('nij,knj->kni', B0, U_t[:-1][mask], optimize=True)
+            if method == 'foh': drive[mask] += np.einsum('nij,knj->kni', B1, U_t[1:][mask], optimize=True)
+
+        x = xout[0]
+        for k in range(len(T) - 1):
+            x = np.einsum('nij,nj->ni', Ads[index[k]], x) + drive[k]
+            xout[k + 1] = x
+    xout = np.ascontiguousarray(np.swapaxes(xout, 0, 1))
+
+    yout = np.einsum('ij,nkj->nki' if C.ndim == 2 else 'nij,nkj->nki', C, xout)
+    if U is not None: yout = yout + np.einsum('ij,nkj->nki' if D.ndim == 2 else 'nij,nkj->nki', D, U)
+    if yout.shape[2] == 1: yout = yout[:, :, 0]
+    return T, yout, xout
@@ -0,0 +1,100 @@
+# Program: stepper.py
+# Purpose: Advance linear systems one sample at a time from a cached discrete transition,
+#   for use inside a live digital-twin loop that receives one input sample at a time.
+
+import numpy as np
+from scipy import signal
+
+from src.simulation.ss_solver import discretize, _DT_DECIMALS
+
+class Stepper:
+    '''
+    Keeps the state of a continuous-time linear system and advances it by one sample per call to
+    `step`, holding each input constant over its step (zero order hold). The discrete transition
+    is computed once per distinct step size and reused, so each step costs two small matrix
+    products regardless of how long the system has been running.
+    '''
+
+    def __init__(self, system, dt: float, x0=None):
+        '''
+        Inputs:
+        ---
+        system : signal.lti or tuple (A, B, C, D)
+            The continuous-time system to advance
+        dt : float
+            The default step size (s)
+        x0 : list=None
+            The initial state, zero if not given
+        '''
+        if isinstance(system, signal.lti): sys = system._as_ss()
+        else: sys = signal.StateSpace(*system)
+        self.A, self.B, self.C, self.D = sys.A, sys.B, sys.C, sys.D
+        self.dt = dt
+        self.transitions = dict()
+        self.default = self.transition(dt)
+        self.reset(x0)
+
+    def reset(self, x0=None, t: float=0.):
+        '''Sets the state (zero if not given) and the time of the stepper'''
+        if x0 is None: self.x = np.zeros(self.A.shape[0])
+        else: self.x = np.array(x0, dtype=float)
+        self.t = t
+
+    def transition(self, dt: float) -> tuple:
+        '''Returns the discrete (Ad, Bd) for a step of dt, computing it only on first use'''
+        key = round(dt, _DT_DECIMALS)
+        if key not in self.transitions:
+            Ad, Bd, _ = discretize(self.A, self.B, key, 'zoh')
+            self.transitions[key] = (Ad, Bd)
+        return self.transitions[key]
+
+    def step(self, u, dt: float=None):
+        '''
+        Advances the state over one step with the input u held constant, and returns the output
+        at the end of the step.
+
+        Inputs:
+        ---
+        u : list
+            The input over the step
+        dt : float=None
+            The step size (s), the default step size if not given
+        '''
+        if dt is None or dt == self.dt: dt, (Ad, Bd) = self.dt, self.default
+        else: Ad, Bd = self.transition(dt)
+        u = np.asarray(u, dtype=float)
+        self.x = Ad @ self.x + Bd @ u
+        self.t += dt
+        return self.C @ self.x + self.D @ u
+
+class TankStepper:
+    '''
+    Advances the coupled drivetrain of a Tank (see `Tank.createStateSpace`) one sample at a time,
+    and moves the tank with the sprocket speeds from the start of each step, as in
+    `Tank.integrateTrajectory`.
+    '''
+
+    def __init__(self, tank, dt: float, x0=None):
+        '''
+        Inputs:
+        ---
+        tank : Tank
+            The tank to advance, whose pose and speeds are updated by every step
+        dt : float
+            The default step size (s)
+        x0 : list=None
+            The initial state of the drivetrain, zero if not given
+        '''
+        self.tank = tank
+        self.motors = Stepper(tank.createStateSpace(), dt, x0)
+        self.to_rpm = 60 / 2 / np.pi / tank.gear_reduction
+
+    def step(self, port_voltage: float, strb_voltage: float, port_load: float=0., strb_load: float=0., 
+             dt: float=None) -> tuple:
+        '''Advances the motors and the pose over one step, and returns the new pose (x, y, theta)'''
+        if dt is None: dt = self.motors.dt
+        port_rpm = self.motors.x[1] * self.to_rpm
+        strb_rpm = self.motors.x[4] * self.to_rpm
+        self.motors.step((port_voltage, port_load, strb_voltage, strb_load), dt)
+        self.tank.move(port_rpm, strb_rpm, dt)
+        return self.tank.x, self.tank.y, self.tank.theta
@@ -0,0 +1,66 @@
+# Program: streaming.py
+# Purpose: Feed `ss_solver_stream` with the chunks of arbitrarily long horizons and reduce what it
+#   yields on the fly, so a soak simulation of any length runs in constant memory.
+#
+# Usage:
+#   chunks = segmentChunks(InputSegments.stack(voltage, load), end_time=3 * 86400, dt=0.01)
+#   stats = RunningStats()
+#   for T, Y, X in ss_solver_stream(motor.sys, chunks): stats.update(Y)
+
+import numpy as np
+
+def timeChunks(end_time: float, dt: float, chunk_size: int=100000, start_time: float=0.):
+    '''
+    Yields the times start_time, start_time + dt, ... up to (not including) end_time in arrays of
+    up to chunk_size, each time computed from its index so no error accumulates over the horizon
+    '''
+    samples = int(np.ceil((end_time - start_time) / dt - 1e-9))
+    for start in range(0, samples, chunk_size):
+        yield start_time + np.arange(start, min(start + chunk_size, samples)) * dt
+
+def segmentChunks(segments, end_time: float, dt: float, chunk_size: int=100000, start_time: float=0.):
+    '''Yields the (T, U) chunks of `timeChunks` with the input sampled from an `InputSegments`'''
+    for T in timeChunks(end_time, dt, chunk_size, start_time):
+        yield T, segments.evaluate(T)
+
+class RunningStats:
+    '''
+    The count, minimum, maximum, mean and variance of every column of a signal that arrives in
+    chunks, merged chunk by chunk (Chan et al.) so that no sample is kept
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values):
+        '''Adds a chunk of samples (len x columns, or len for one column)'''
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0: return
+        n = len(values)
+        low, high, mean = values.min(axis=0), values.max(axis=0), values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        if self.count == 0:
+            self.min, self.max, self.mean, self.m2 = low, high, mean, m2
+        else:
+            total = self.count + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self.m2 = self.m2 + m2 + delta ** 2 * self.count * n / total
+            self.min = np.minimum(self.min, low)
+            self.max = np.maximum(self.max, high)
+        self.count += n
+
+    @property
+    def var(self):
+        return None if self.count == 0 else self.m2 / self.count
+
+    @property
+    def std(self):
+        return None if self.count == 0 else np.sqrt(self.var)
+
+    def getStats(self) -> dict:
+        return {'count': self.count, 'min': self.min, 'max': self.max, 'mean': self.mean, 'std': self.std}
@@ -0,0 +1,40 @@
+import numpy as np
+from src.gui.AnimationScheduler import AnimationScheduler
+
+class FakeClock:
+    ''' A wall clock where every frame takes frame_time to draw'''
+    def __init__(self, frame_time):
+        self.now = 0.
+        self.frame_time = frame_time
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def play(time, speed, frame_time, max_fps):
+    clock = FakeClock(frame_time)
+    scheduler = AnimationScheduler(time, speed, max_fps, clock=clock, sleep=clock.sleep)
+    shown = list()
+    for sim_time in scheduler:
+        shown.append((clock.now, sim_time))
+        clock.now += frame_time
+    return scheduler, np.array(shown)
+
+def test_slow_frames_are_dropped():
+    time = np.arange(0, 10, 0.03)
+    scheduler, shown = play(time, speed=1., frame_time=0.1, max_fps=None)
+    # The simulation time shown always matches the wall clock
+    assert np.allclose(shown[:-1, 1], shown[:-1, 0])
+    assert shown[-1, 1] == time[-1]
+    stats = scheduler.getStats()
+    assert stats['dropped'] > 0.6 * len(time)
+    assert np.isclose(stats['fps'], 10., rtol=0.05)
+
+def test_fast_frames_are_paced():
+    time = np.arange(0, 1, 0.03)
+    scheduler, shown = play(time, speed=0.1, frame_time=0.001, max_fps=30.)
+    assert np.allclose(np.diff(shown[:-1, 0]), 1 / 30)
+    assert np.allclose(shown[:-1, 1], shown[:-1, 0] * 0.1)
+    assert scheduler.getStats()['dropped'] == 0
@@ -0,0 +1,81 @@
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+from matplotlib.transforms import Bbox
+from src.gui.BlitManager import BlitManager
+from src.gui.TankAnimator import TankAnimator
+from src.objects.Tank import Tank
+
+def animators():
+    time = np.arange(0, 10, 0.03)
+    kwargs = dict(time=time, port_rpm=20 + 0 * time, strb_rpm=15 + 0 * time, headless=True)
+    dirty = TankAnimator(tank=Tank(), **kwargs)
+    full = TankAnimator(tank=Tank(), **kwargs)
+    full.bm.dirty_regions = False
+    return dirty, full
+
+def test_dirty_regions_match_full_blit():
+    dirty, full = animators()
+    # Step forwards, then jump around the run
+    for j in list(range(0, 60, 3)) + [250, 10, 333, 0]:
+        assert np.array_equal(np.asarray(dirty.renderFrame(j)), np.asarray(full.renderFrame(j)))
+    stats = dirty.bm.get_stats()
+    assert stats['frames'] == 24
+    assert stats['mean_blit_fraction'] < 1
+
+def test_zoom_invalidates_background():
+    dirty, full = animators()
+    dirty.renderFrame(5)
+    full.renderFrame(5)
+    for anim in (dirty, full):
+        anim.ax.set_xlim(-20, 20)
+        anim.ax.set_ylim(-20, 20)
+    assert dirty.bm._bg is None
+    assert np.array_equal(np.asarray(dirty.renderFrame(6)), np.asarray(full.renderFrame(6)))
+
+def test_unchanged_frame_is_skipped():
+    dirty, full = animators()
+    dirty.renderFrame(20)
+    pixels = dirty.bm.get_stats()['blit_pixels']
+    dirty.renderFrame(20)
+    stats = dirty.bm.get_stats()
+    assert stats['skipped_frames'] == 1
+    assert stats['blit_pixels'] == pixels
+
+def test_only_moved_artist_is_redrawn():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(xlim=(0, 100), ylim=(0, 100))
+    moving, still = Circle((20, 20), 3), Circle((80, 80), 3)
+    for circle in (moving, still): ax.add_patch(circle)
+    bm = BlitManager(fig.canvas, [moving, still])
+    bm.update()
+
+    blits, drawn = [], []
+    blit, draw_animated = fig.canvas.blit, bm._draw_animated
+    fig.canvas.blit = lambda bbox=None: blits.append(bbox) or blit(bbox)
+    bm._draw_animated = lambda artists=None: drawn.append(artists) or draw_animated(artists)
+    old = Bbox.from_bounds(*bm._extents[moving])
+    moving.set(center=(25, 20))
+    bm.update()
+    new = Bbox.from_bounds(*bm._extents[moving])
+
+    assert drawn == [[moving]]
+    x0, y0, x1, y1 = Bbox.union([old, new]).extents
+    assert blits[0].extents.tolist() == [int(x0), int(y0), int(x1) + 1, int(y1) + 1]
+
+def test_every_manager_on_an_axes_is_invalidated():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    first, second = Circle((0.2, 0.2), 0.1), Circle((0.8, 0.8), 0.1)
+    for circle in (first, second): ax.add_patch(circle)
+    managers = [BlitManager(fig.canvas, [first]), BlitManager(fig.canvas, [second])]
+    for bm in managers: bm.update()
+    ax.set_xlim(0, 2)
+    assert all(bm._bg is None for bm in managers)
+    managers[0].disconnect()
+    for bm in managers: bm.update()
+    ax.set_xlim(0, 1)
+    assert managers[0]._bg is not None and managers[1]._bg is None
@@ -0,0 +1,43 @@
+import numpy as np
+from src.gui.DrawTank import Chassis, Tread, Ridges, FrontDot, TankGeometry
+from src.objects.Tank import Tank
+
+def rotateAndTranslate(x, y, tank):
+    '''The per-point transform the patches used before TankGeometry'''
+    c, s = np.cos(tank.theta), np.sin(tank.theta)
+    return tank.x + c * x - s * y, tank.y + s * x + c * y
+
+def oldRidges(tank, side, time, num_ridge_lines=4, ridge_steps_per_second=7):
+    '''The ridge lines (ridge, end, xy) as the per-ridge loop of the original Ridges computed them'''
+    spacing = tank.td_height / num_ridge_lines
+    bump = tank.td_height / num_ridge_lines / ridge_steps_per_second + np.floor((time - np.fix(time)) * ridge_steps_per_second)
+    direction = np.sign(tank.port_rpm if side == 'port' else tank.strb_rpm)
+    left = -tank.td_width - tank.ch_width / 2 if side == 'port' else tank.ch_width / 2
+    bottom, top = -tank.td_height / 2, tank.td_height / 2
+    lines = list()
+    for i in range(num_ridge_lines):
+        y = bottom + i * spacing + direction * bump
+        if y - top > 0 and direction == 1: y = bottom + y - top
+        elif y - bottom < 0 and direction == -1: y = top + y - bottom
+        lines.append([rotateAndTranslate(left, y, tank), rotateAndTranslate(left + tank.td_width, y, tank)])
+    return np.array(lines)
+
+def test_geometry_matches_per_patch_transforms():
+    rng = np.random.default_rng(0)
+    tank = Tank()
+    parts = [Chassis(tank), Tread(tank, 'port'), Tread(tank, 'strb')]
+    corners = [(-tank.ch_width / 2, -tank.ch_height / 2), (-tank.td_width - tank.ch_width / 2, -tank.td_height / 2),
+               (tank.ch_width / 2, -tank.td_height / 2)]
+    ridges, dot = [Ridges(tank, 0., 'port'), Ridges(tank, 0., 'strb')], FrontDot(tank)
+    for x, y, theta, port, strb, time in rng.uniform([-50, -50, -7, -20, -20, 0], [50, 50, 7, 20, 20, 30], (50, 6)):
+        tank.updatePosition(x, y, theta)
+        tank.updateSpeed(port, strb)
+        for part, corner in zip(parts, corners):
+            assert np.allclose(part.update().get_xy(), rotateAndTranslate(*corner, tank))
+            assert np.isclose(part.update().get_angle(), theta * 180 / np.pi)
+        height = tank.ch_height / 2 * 4/5
+        assert np.allclose(dot.update().get_center(), (x + height * np.cos(np.pi/2 + theta), y + height * np.sin(np.pi/2 + theta)))
+        for ridge, side in zip(ridges, ('port', 'strb')):
+            assert np.allclose(ridge.update(time).get_segments(), oldRidges(tank, side, time))
+        # Every part reads the one geometry of the tank
+        assert all(part.geometry is TankGeometry.of(tank) for part in parts + ridges + [dot])
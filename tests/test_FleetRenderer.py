@@ -0,0 +1,27 @@
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from src.gui.DrawTank import Chassis, Tread, FrontDot, TankGeometry
+from src.gui.FleetRenderer import FleetRenderer
+from src.objects.Tank import Tank
+
+def test_fleet_matches_single_tank_geometry():
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(xlim=(-50, 50), ylim=(-50, 50))
+    poses = np.array([[0., 0., 0.], [10., -5., 0.7], [-20., 30., -2.5], [3., 3., np.pi]])
+    port_rpm, strb_rpm, time = np.array([10., -5., 0., 3.]), np.array([10., 5., -2., -3.]), 1.37
+    fleet = FleetRenderer(ax, len(poses))
+    fleet.update(poses[:, 0], poses[:, 1], poses[:, 2], port_rpm, strb_rpm, time)
+    bodies = np.array([p.vertices[:4] for p in fleet.bodies.get_paths()]).reshape(len(poses), 3, 4, 2)
+    ridges = np.array(fleet.ridges.get_segments()).reshape(len(poses), 2, -1, 2, 2)
+
+    for i, (x, y, theta) in enumerate(poses):
+        tank = Tank()
+        tank.updatePosition(x, y, theta)
+        tank.updateSpeed(port_rpm[i], strb_rpm[i])
+        for j, part in enumerate((Chassis(tank), Tread(tank, 'port'), Tread(tank, 'strb'))):
+            corners = part.get_patch().get_patch_transform().transform([[0, 0], [1, 0], [1, 1], [0, 1]])
+            assert np.allclose(bodies[i, j], corners)
+        assert np.allclose(fleet.dots.get_offsets()[i], FrontDot(tank).get_patch().get_center())
+        assert np.allclose(ridges[i], TankGeometry.of(tank).getRidges(time))
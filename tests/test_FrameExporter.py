@@ -0,0 +1,35 @@
+import os
+import numpy as np
+from PIL import Image
+from src.gui.FrameExporter import FrameExporter
+from src.gui.TankAnimator import TankAnimator
+from src.objects.Tank import Tank
+
+def run():
+    time = np.arange(0, 0.6, 0.03)
+    return time, 20 + 0 * time, 15 - 10 * time
+
+def frames(directory, count):
+    return [np.asarray(Image.open(os.path.join(directory, 'frame_%06d.png' % j))) for j in range(count)]
+
+def test_headless_render_leaves_no_window():
+    time, port_rpm, strb_rpm = run()
+    anim = TankAnimator(tank=Tank(), time=time, port_rpm=port_rpm, strb_rpm=strb_rpm, headless=True)
+    frame = np.asarray(anim.renderFrame(5))
+    assert frame.shape[2] == 4 and frame.shape[:2] == anim.fig.canvas.get_width_height()[::-1]
+    assert (anim.tank.x, anim.tank.y, anim.tank.theta) == (anim.x[5], anim.y[5], anim.theta[5])
+
+def test_export_is_repeatable_and_matches_parallel(tmp_path):
+    time, port_rpm, strb_rpm = run()
+    tank = Tank()
+    pose = (tank.x, tank.y, tank.theta)
+    serial = FrameExporter(tank, time, port_rpm, strb_rpm)
+    assert serial.exportFrames(str(tmp_path / 'first')) == len(time)
+    assert (tank.x, tank.y, tank.theta) == pose
+    assert serial.exportFrames(str(tmp_path / 'second')) == len(time)
+    first, second = frames(tmp_path / 'first', len(time)), frames(tmp_path / 'second', len(time))
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+
+    parallel = FrameExporter(tank, time, port_rpm, strb_rpm, workers=3)
+    assert parallel.exportFrames(str(tmp_path / 'parallel')) == len(time)
+    assert all(np.array_equal(a, b) for a, b in zip(first, frames(tmp_path / 'parallel', len(time))))
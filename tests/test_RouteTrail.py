@@ -0,0 +1,39 @@
+import numpy as np
+from matplotlib.figure import Figure
+from src.gui.RouteTrail import RouteTrail
+
+def trail(max_length, min_distance=0.):
+    return RouteTrail(Figure().add_subplot(), max_length, min_distance)
+
+def test_bounded_and_wraps_around():
+    route = trail(5)
+    xs = np.arange(12.)
+    for x in xs: route.append(x, -x)
+    points = route.getPoints()
+    assert len(points) == 5
+    assert np.array_equal(points, np.column_stack((xs[-5:], -xs[-5:])))
+    # The slice is contiguous even though the writes wrapped around the buffer
+    assert np.shares_memory(points, route.buffer)
+
+def test_every_point_is_written_twice():
+    route = trail(4)
+    route.extend(np.arange(7.), np.zeros(7))
+    assert np.array_equal(route.buffer[:4], route.buffer[4:])
+    assert sorted(route.buffer[:4, 0]) == [3., 4., 5., 6.]
+
+def test_extend_longer_than_buffer():
+    route = trail(3)
+    route.extend(np.arange(10.), np.arange(10.))
+    assert np.array_equal(route.getPoints()[:, 0], [7., 8., 9.])
+    x, y = route.get_line().get_data()
+    assert np.array_equal(x, [7., 8., 9., 9.])
+
+def test_distance_decimation():
+    route = trail(100, min_distance=1.)
+    # Steps of 0.25 along x keep one point per unit of path length
+    xs = np.arange(0, 5.01, 0.25)
+    route.extend(xs, np.zeros_like(xs))
+    assert np.array_equal(route.getPoints()[:, 0], [0., 1., 2., 3., 4., 5.])
+    # Stopping in place adds nothing
+    for _ in range(10): route.append(5., 0.)
+    assert len(route.getPoints()) == 6
@@ -0,0 +1,44 @@
+import logging
+import os
+import numpy as np
+from src.dt import SweepRunner as SweepRunner_module
+from src.dt.Scenario import Scenario
+from src.dt.SweepRunner import SweepRunner, _runChunk
+
+def test_parallel_matches_serial():
+    scenarios = Scenario.grid(R_a=[0.4, 0.5, 0.6], mass=[4., 6.], end_time=[2.])
+    progress = list()
+    serial = SweepRunner(scenarios, workers=1).run()
+    parallel = SweepRunner(scenarios, workers=2, chunk_size=2, progress=lambda d, t: progress.append((d, t))).run()
+    assert serial.shape == (6, 5, len(scenarios[0].getTime()))
+    assert np.allclose(serial, parallel)
+    assert progress[-1] == (6, 6)
+
+    time, port_rpm, strb_rpm = scenarios[3].simulate()
+    assert np.allclose(serial[3, 0], port_rpm)
+    # The tank reused for the trajectory matches a freshly built one
+    x, y, theta = scenarios[3].buildTank().integrateTrajectory(time, port_rpm, strb_rpm)
+    assert np.allclose(serial[3, 2:], (x, y, theta))
+
+def crashOnSecondChunk(name, shape, scenarios, start):
+    '''A worker that dies on the chunk starting at scenario 2, breaking the pool'''
+    if start == 2: os._exit(1)
+    return _runChunk(name, shape, scenarios, start)
+
+def test_broken_pool_reruns_only_unfinished(monkeypatch, caplog):
+    scenarios = Scenario.grid(R_a=[0.4, 0.5, 0.6], mass=[4., 6.], end_time=[1.])
+    serial = SweepRunner(scenarios, workers=1).run()
+    monkeypatch.setattr(SweepRunner_module, '_runChunk', crashOnSecondChunk)
+    progress = list()
+    simulated = list()
+    simulateInto = SweepRunner_module.simulateInto
+    monkeypatch.setattr(SweepRunner_module, 'simulateInto',
+                        lambda results, chunk, start: simulated.append(start) or simulateInto(results, chunk, start))
+
+    with caplog.at_level(logging.WARNING, logger='src.dt.SweepRunner'):
+        results = SweepRunner(scenarios, workers=2, chunk_size=2, progress=lambda d, t: progress.append(d)).run()
+    assert np.allclose(results, serial)
+    assert 'running the' in caplog.text
+    # Only the chunks the pool did not finish are simulated again, and each chunk is counted once
+    assert 2 in simulated and len(set(simulated)) == len(simulated) and set(simulated) <= {0, 2, 4}
+    assert progress == [2, 4, 6]
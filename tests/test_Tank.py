@@ -0,0 +1,39 @@
+import numpy as np
+from src.objects.DC_Motor import DC_Motor
+from src.objects.Tank import Tank
+
+def test_trajectory_matches_move():
+    time = np.arange(0, 5, 0.03)
+    port_rpm = 20 * np.sin(time)
+    strb_rpm = np.where(time < 2, 10., -port_rpm)
+    strb_rpm[10:20] = 0.
+    strb_rpm[30:40] = port_rpm[30:40]
+
+    tank = Tank(theta=0.3)
+    x, y, theta = tank.integrateTrajectory(time, port_rpm, strb_rpm)
+    for j in range(len(time)):
+        if j == len(time) - 1: step_duration = time[j] - time[j-1]
+        else: step_duration = time[j+1] - time[j]
+        tank.move(port_rpm[j], strb_rpm[j], step_duration)
+        assert np.allclose([tank.x, tank.y, tank.theta], [x[j], y[j], theta[j]])
+
+def test_pivot_in_place():
+    tank = Tank()
+    x, y, theta = tank.integrateTrajectory([0, 1, 2], [30, 30, 30], [-30, -30, -30])
+    assert np.allclose(x, 0) and np.allclose(y, 0)
+    assert np.all(np.diff(theta) < 0)
+
+def test_symmetric_drivetrain_matches_single_motor():
+    tank = Tank(mass=5.)
+    time = np.arange(0, 2, 0.01)
+    v_s = np.zeros_like(time) + 12
+    T_L = np.zeros_like(time) + 0.1
+    port_rpm, strb_rpm = tank.simulateDrivetrain(time, v_s, v_s, T_L, T_L)
+    assert np.allclose(port_rpm, strb_rpm)
+
+    # Driving straight, each motor carries its tread and half of the vehicle's mass
+    r = tank.tread.driver.radius / tank.gear_reduction
+    J_eff = tank.port_motor.J_M + tank.tread.MoI / tank.gear_reduction ** 2 + r ** 2 * tank.mass / 2
+    motor = DC_Motor(rotor_moment_of_intertia=J_eff)
+    T, Y, X = motor.simulateMotor(time, v_s, T_L)
+    assert np.allclose(port_rpm, X[:, 1] * 60 / 2 / np.pi / tank.gear_reduction)
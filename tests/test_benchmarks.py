@@ -0,0 +1,21 @@
+from src.analysis import benchmarks
+
+def results(**medians):
+    return {'meta': {}, 'results': {name: {'median': value} for name, value in medians.items()}}
+
+def test_compare_flags_regressions():
+    baseline = results(a=1.0, b=1.0, c=1.0, gone=1.0)
+    current = results(a=1.05, b=1.5, c=0.5, added=1.0)
+    rows = {row[0]: row for row in benchmarks.compare(baseline, current, threshold=0.1)}
+    assert rows['a'][-1] == 'ok'
+    assert rows['b'][-1] == 'regression'
+    assert rows['c'][-1] == 'improvement'
+    assert rows['gone'][-1] == 'missing'
+    assert rows['added'][-1] == 'new'
+    assert 'regression' in benchmarks.formatComparison(list(rows.values()))
+
+def test_run_benchmark():
+    run = benchmarks.run(['Tank.integrateTrajectory'], repeat=2)
+    result = run['results']['Tank.integrateTrajectory']
+    assert 0 < result['min'] <= result['median']
+    assert run['meta']['seed'] == benchmarks.SEED
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import cli
+
+ROOT = os.path.dirname(os.path.abspath(cli.__file__))
+
+def test_parse_settings():
+    assert cli.parseSettings(['R_a=0.6', "controller='pid'", 'port_schedule=[(0, 12)]', 'name=run']) == \
+        {'R_a': 0.6, 'controller': 'pid', 'port_schedule': [(0, 12)], 'name': 'run'}
+
+def test_simulate_never_loads_pyplot(tmp_path):
+    record = str(tmp_path / 'run.tankrec')
+    script = ("import sys, cli; cli.main(['simulate', '--set', 'end_time=1', '--record', %r]);"
+              "assert 'matplotlib' not in sys.modules, 'matplotlib was imported'" % record)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    assert 'final pose' in result.stdout
+
+    from src.pipeline.recording import Recording
+    assert len(Recording(record)) == 34
+
+def test_ingest_and_bench_skip_the_simulation_stack():
+    script = ("import sys, cli; cli.buildParser(bench_commands=True).parse_args(['bench', 'run']);"
+              "assert not any(m.startswith(('scipy', 'matplotlib', 'src.objects')) for m in sys.modules)")
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
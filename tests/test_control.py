@@ -0,0 +1,39 @@
+import numpy as np
+from src.objects.DC_Motor import DC_Motor
+from src.dt.Scenario import Scenario
+from src.simulation.control import PIDController, LQRController, simulateClosedLoop, trackingCost
+
+def test_controllers_track_reference():
+    motor = DC_Motor()
+    time = np.arange(0, 0.5, 0.001)
+    for controller in (PIDController.fromMotor(motor), LQRController.fromMotor(motor)):
+        voltage, X = simulateClosedLoop(motor.createStateSpace(), controller, time, 150.)
+        assert abs(X[0, -1, 1] - 150.) < 0.1
+        # The supply saturates at first
+        assert voltage.max() == 12.
+        assert voltage.min() >= -12.
+
+def test_gain_sets_match_single_runs():
+    motor = DC_Motor()
+    time = np.arange(0, 0.2, 0.001)
+    reference = np.where(time < 0.1, 100., -50.)
+    time_constants = np.array([0.01, 0.03, 0.1])
+    batch = PIDController.fromMotor(motor, time_constant=time_constants, kd=1e-4)
+    voltage, X = simulateClosedLoop(motor.createStateSpace(), batch, time, reference)
+    assert X.shape == (3, len(time), 3)
+    for i, tc in enumerate(time_constants):
+        single = PIDController.fromMotor(motor, time_constant=tc, kd=1e-4)
+        v, x = simulateClosedLoop(motor.createStateSpace(), single, time, reference)
+        assert np.allclose(x[0], X[i])
+
+    cost = trackingCost(time, X[:, :, 1:2], reference[:, np.newaxis])
+    assert cost.shape == (3,)
+    assert cost.argmin() == 0
+
+def test_scenario_closed_loop():
+    for controller in ('pid', 'lqr'):
+        scenario = Scenario(end_time=3., controller=controller)
+        time, port_rpm, strb_rpm = scenario.simulate()
+        late = time > 0.5
+        assert np.allclose(port_rpm[late & (time < 1.)], 30., atol=0.1)
+        assert np.allclose(strb_rpm[late & (time < 1.)], 20., atol=0.1)
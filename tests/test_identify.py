@@ -0,0 +1,39 @@
+import numpy as np
+from src.objects.DC_Motor import DC_Motor
+from src.simulation.identify import identifyMotors, sensitivitySystems
+
+def traces(parameters, time):
+    '''The voltage, load, shaft rpm and current of motors with the given constants (N x 5)'''
+    voltage = np.where((time * 5).astype(int) % 2 == 0, 12., 4.)
+    load = 0.05 * np.sin(3 * time)
+    T, Y, X = DC_Motor.simulateEnsemble(time, voltage, load, *np.transpose(parameters))
+    return voltage, load, X[:, :, 1] * 60 / 2 / np.pi, X[:, :, 0]
+
+def test_sensitivities_match_finite_differences():
+    theta = np.array([DC_Motor().getParameters()])
+    A, B = sensitivitySystems(theta)
+    for j in range(5):
+        h = theta[0, j] * 1e-6
+        bumped = theta.copy()
+        bumped[0, j] += h
+        A_h, B_h = sensitivitySystems(bumped)
+        assert np.allclose((A_h[0, :2, :2] - A[0, :2, :2]) / h, A[0, 2 + 2 * j:4 + 2 * j, :2], rtol=1e-4)
+        assert np.allclose((B_h[0, :2] - B[0, :2]) / h, B[0, 2 + 2 * j:4 + 2 * j], rtol=1e-4, atol=1e-6)
+
+def test_identify_one_motor():
+    time = np.arange(0, 1, 0.001)
+    worn = DC_Motor(0.65, 1.2e-3, 3e-4, 0.045, 2e-4)
+    voltage, load, rpm, current = traces([worn.getParameters()], time)
+    fitted = DC_Motor.identify(time, voltage, rpm[0], current[0], load)
+    assert np.allclose(fitted.getParameters(), worn.getParameters(), rtol=1e-6)
+
+def test_identify_fleet_with_noise():
+    rng = np.random.default_rng(0)
+    time = np.arange(0, 1, 0.001)
+    true = np.array(DC_Motor().getParameters()) * rng.uniform(0.7, 1.4, (10, 5))
+    voltage, load, rpm, current = traces(true, time)
+    rpm = rpm + rng.normal(0, 1, rpm.shape)
+    current = current + rng.normal(0, 0.05, current.shape)
+    fit = identifyMotors(time, voltage, rpm, current, load)
+    assert fit['converged'].all()
+    assert np.allclose(fit['parameters'], true, rtol=0.05)
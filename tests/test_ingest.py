@@ -0,0 +1,100 @@
+import asyncio
+import json
+from src.pipeline.ingest import TelemetryIngestor, LocalBroker, topicMatches
+
+def test_topic_matches():
+    assert topicMatches('tanks/+/telemetry', 'tanks/t1/telemetry')
+    assert not topicMatches('tanks/+/telemetry', 'tanks/t1/status')
+    assert topicMatches('tanks/#', 'tanks/t1/telemetry')
+    assert not topicMatches('tanks/t1', 'tanks/t1/telemetry')
+
+async def publish(broker, count, vehicles=('t1', 't2')):
+    for i in range(count):
+        vehicle = vehicles[i % len(vehicles)]
+        await broker.publish('tanks/%s/telemetry' % vehicle, json.dumps({'seq': i}).encode())
+
+def test_batches_are_delivered_in_order():
+    broker = LocalBroker()
+    batches = []
+    async def sink(records): batches.append(records)
+    ingestor = TelemetryIngestor(broker.client(), vehicles=['t1'], batch_size=100, sink=sink)
+    async def scenario():
+        task = asyncio.create_task(ingestor.run())
+        await asyncio.sleep(0)
+        await publish(broker, 1000)
+        ingestor.stop()
+        await task
+    asyncio.run(scenario())
+
+    # Only t1 was subscribed to
+    seqs = [message['seq'] for batch in batches for topic, message in batch]
+    assert seqs == list(range(0, 1000, 2))
+    assert all(len(batch) <= 100 for batch in batches)
+    assert ingestor.getStats()['delivered'] == 500
+
+def test_full_queue_drops_oldest():
+    broker = LocalBroker()
+    seqs = []
+    async def sink(records):
+        seqs.extend(message['seq'] for topic, message in records)
+        await asyncio.sleep(0.01)
+    ingestor = TelemetryIngestor(broker.client(), queue_size=10, batch_size=5, sink=sink)
+    async def scenario():
+        task = asyncio.create_task(ingestor.run())
+        await asyncio.sleep(0)
+        await publish(broker, 100)
+        ingestor.stop()
+        await task
+    asyncio.run(scenario())
+
+    stats = ingestor.getStats()
+    assert stats['dropped'] > 0
+    assert stats['delivered'] + stats['dropped'] == 100
+    # The newest messages survive
+    assert seqs[-10:] == list(range(90, 100))
+
+def test_block_policy_holds_back_publisher():
+    broker = LocalBroker()
+    count = []
+    async def sink(records): count.append(len(records))
+    ingestor = TelemetryIngestor(broker.client(), queue_size=10, batch_size=5, drop_policy='block', sink=sink)
+    async def scenario():
+        task = asyncio.create_task(ingestor.run())
+        await asyncio.sleep(0)
+        await publish(broker, 100)
+        ingestor.stop()
+        await task
+    asyncio.run(scenario())
+    assert sum(count) == 100
+    assert ingestor.getStats()['dropped'] == 0
+
+def test_reconnects_after_connection_loss():
+    broker = LocalBroker()
+    ingestor = TelemetryIngestor(broker.client(), reconnect_delay=0.01)
+    async def scenario():
+        task = asyncio.create_task(ingestor.run())
+        await asyncio.sleep(0)
+        broker.available = False
+        broker.drop()
+        await asyncio.sleep(0.05)
+        broker.available = True
+        await asyncio.sleep(0.2)
+        await publish(broker, 10)
+        ingestor.stop()
+        await task
+    asyncio.run(scenario())
+
+    stats = ingestor.getStats()
+    assert stats['disconnects'] == 1
+    assert stats['connect_failures'] >= 1
+    assert stats['connects'] == 2
+    assert stats['delivered'] == 10
+
+def test_stop_before_run():
+    broker = LocalBroker()
+    batches = []
+    ingestor = TelemetryIngestor(broker.client(), sink=batches.append)
+    ingestor.stop()
+    asyncio.run(asyncio.wait_for(ingestor.run(), 1.))
+    assert batches == []
+    assert ingestor.getStats()['connects'] == 0
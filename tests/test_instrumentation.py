@@ -0,0 +1,46 @@
+import time
+import numpy as np
+from src.analysis import instrumentation as inst
+from src.gui.TankAnimator import TankAnimator
+from src.objects.Tank import Tank
+
+def test_disabled_spans_record_nothing():
+    inst.disable()
+    inst.reset()
+    with inst.span('stage'): pass
+    inst.count('frames')
+    assert inst.HISTOGRAMS == {} and inst.COUNTERS == {}
+
+def test_spans_histograms_and_export():
+    inst.enable()
+    inst.reset()
+    try:
+        for _ in range(3):
+            with inst.span('animate.frame', deadline=1e-3): time.sleep(2e-3)
+        with inst.span('animate.frame', deadline=1e-3): pass
+        inst.count('animate.frames', 4)
+        h = inst.HISTOGRAMS['animate.frame']
+        assert h.count == 4 and h.misses == 3
+        assert 2e-3 <= h.quantile(0.99) <= h.max
+        text = inst.exportPrometheus()
+        assert 'twin_stage_seconds_count{stage="animate.frame"} 4' in text
+        assert 'twin_stage_seconds_bucket{stage="animate.frame",le="+Inf"} 4' in text
+        assert 'twin_deadline_misses_total{stage="animate.frame"} 3' in text
+        assert 'twin_animate_frames_total 4' in text
+        assert 'animate.frame' in inst.summary()
+    finally:
+        inst.disable()
+        inst.reset()
+
+def test_animation_stages():
+    inst.enable()
+    inst.reset()
+    try:
+        t = np.arange(0, 0.5, 0.03)
+        anim = TankAnimator(tank=Tank(), time=t, port_rpm=20 + 0 * t, strb_rpm=15 + 0 * t, headless=True)
+        anim.animate(speed=10.)
+        assert {'animate.frame', 'animate.geometry', 'animate.blit'} <= set(inst.HISTOGRAMS)
+        assert inst.COUNTERS['animate.frames'] == inst.HISTOGRAMS['animate.frame'].count
+    finally:
+        inst.disable()
+        inst.reset()
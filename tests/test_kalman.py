@@ -0,0 +1,86 @@
+import numpy as np
+from src.objects.DC_Motor import DC_Motor
+from src.objects.Tank import Tank
+from src.simulation.kalman import BatchKalmanFilter
+
+def simulate(motor, time, voltage, rng, noise=1.):
+    '''The true states of a motor and noisy measurements of its speed'''
+    stepper = motor.stepper(time[1] - time[0])
+    X = [stepper.x]
+    for v in voltage[1:]:
+        stepper.step((v, 0.))
+        X.append(stepper.x)
+    X = np.array(X)
+    return X, X[:, 1] + noise * rng.standard_normal(len(time))
+
+def test_filter_tracks_motor():
+    rng = np.random.default_rng(0)
+    motor = DC_Motor()
+    time = np.arange(0, 2, 0.001)
+    voltage = np.where(time < 1, 12., 6.)
+    X, Z = simulate(motor, time, voltage, rng)
+
+    kf = motor.kalmanFilter(0.001, Q=np.diag([1e-4, 1e-3, 1e-8]), R=1.)
+    estimates = np.array([kf.step(t, [z], (v, 0.)) for t, z, v in zip(time, Z, voltage)])
+    error = np.abs(estimates[500:, 1] - X[500:, 1])
+    assert error.mean() < np.abs(Z[500:] - X[500:, 1]).mean() / 3
+
+    # Propagating the covariance converges to the same estimates
+    full = motor.kalmanFilter(0.001, Q=np.diag([1e-4, 1e-3, 1e-8]), R=1., steady_state=False, P0=1e3)
+    estimates_full = np.array([full.step(t, [z], (v, 0.)) for t, z, v in zip(time, Z, voltage)])
+    assert np.allclose(estimates_full[-100:, 1], estimates[-100:, 1], atol=0.05)
+
+def test_late_samples_match_in_order():
+    rng = np.random.default_rng(1)
+    motor = DC_Motor()
+    time = np.arange(0, 0.2, 0.001)
+    voltage = 12 + 0 * time
+    X, Z = simulate(motor, time, voltage, rng)
+
+    in_order = motor.kalmanFilter(0.001, Q=1e-2, R=1.)
+    for t, z in zip(time, Z): in_order.step(t, [z], (12., 0.))
+
+    shuffled = motor.kalmanFilter(0.001, Q=1e-2, R=1.)
+    order = np.arange(len(time))
+    order[10::20], order[11::20] = order[11::20].copy(), order[10::20].copy()
+    for k in order: shuffled.step(time[k], [Z[k]], (12., 0.))
+    assert shuffled.stats['late'] == 10
+    assert np.allclose(shuffled.x, in_order.x)
+
+def test_missing_measurements():
+    motor = DC_Motor()
+    kf = motor.kalmanFilter(0.01, Q=1e-2, R=[1., 1.], measure_current=True)
+    kf.step(0.01, [np.nan, np.nan], (12., 0.))
+    predicted = kf.x.copy()
+    kf.reset()
+    kf.step(0.01, None, (12., 0.))
+    assert np.allclose(kf.x, predicted)
+    assert kf.stats['missing'] == 1
+
+    # Only the current is measured, which is as if the filter measured nothing else
+    kf = motor.kalmanFilter(0.01, Q=1e-2, R=[1., 1.], measure_current=True, steady_state=False, P0=1.)
+    current_only = motor.kalmanFilter(0.01, Q=1e-2, R=1., C=[[1, 0, 0]], steady_state=False, P0=1.)
+    no_update = motor.kalmanFilter(0.01, Q=1e-2, R=1., C=[[1, 0, 0]], steady_state=False, P0=1.)
+    for f in (kf, current_only, no_update): f.step(0.01, None, (12., 0.))
+    kf.step(0.02, [5., np.nan], (12., 0.))
+    current_only.step(0.02, [5.], (12., 0.))
+    no_update.step(0.02, None, (12., 0.))
+    assert np.allclose(kf.x, current_only.x)
+    assert np.allclose(kf.P, current_only.P)
+    assert abs(kf.x[0] - 5.) < abs(no_update.x[0] - 5.)
+
+def test_batch_matches_single_filters():
+    rng = np.random.default_rng(2)
+    tank = Tank()
+    sys = tank.createStateSpace()
+    N, dt = 5, 0.01
+    batch = BatchKalmanFilter(sys.A, sys.B, sys.C, dt, Q=1e-3, R=1., x0=np.zeros((N, 6)))
+    singles = [tank.kalmanFilter(dt, Q=1e-3, R=1.) for i in range(N)]
+    for k in range(1, 50):
+        u = rng.uniform(0, 12, (N, 4))
+        z = rng.normal(10, 1, (N, 2))
+        z[k % N, k % 2] = np.nan
+        z[(k + 1) % N] = np.nan
+        x = batch.step(z, u)
+        for i, kf in enumerate(singles): kf.step(k * dt, z[i], u[i])
+    assert np.allclose(x, [kf.x for kf in singles])
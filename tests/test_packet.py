@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from src.pipeline.packet import PACKET_DTYPE, encodePackets, toPayloads, decodePackets, decodeBatch
+
+def test_packet_layout():
+    assert PACKET_DTYPE.itemsize == 56
+    assert PACKET_DTYPE.fields['time'][1] == 8
+
+def test_round_trip():
+    time = np.arange(0, 1, 0.01)
+    packets = encodePackets(time, vehicle_id=7, port_rpm=10 * time, x=1.5)
+    payloads = toPayloads(packets, per_payload=3)
+    assert len(payloads) == 34
+
+    decoded = decodeBatch([('tanks/7/telemetry', p) for p in payloads])
+    assert np.array_equal(decoded['sequence'], np.arange(100))
+    assert (decoded['vehicle_id'] == 7).all()
+    assert np.array_equal(decoded['time'], time)
+    assert np.allclose(decoded['port_rpm'], 10 * time)
+    assert (decoded['x'] == 1.5).all()
+    # Fields that were not given are not measured
+    assert np.isnan(decoded['port_current']).all()
+
+def test_bad_payloads():
+    packets = encodePackets([0.])
+    with pytest.raises(ValueError):
+        decodePackets(packets.tobytes()[:-1])
+    packets['version'] = 99
+    with pytest.raises(ValueError):
+        decodePackets(packets.tobytes())
+    with pytest.raises(KeyError):
+        encodePackets([0.], speed=1)
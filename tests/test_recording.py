@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from src.pipeline.packet import encodePackets
+from src.pipeline.recording import Recorder, Recording, Replayer
+
+def record(path, time, chunk_size=100):
+    with Recorder(path, chunk_size=chunk_size) as recorder:
+        # In uneven pieces, so that appends straddle chunks
+        for piece in np.array_split(np.arange(len(time)), 7):
+            t = time[piece]
+            recorder.append(t, port_rpm=np.sin(t), x=2 * t)
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run.rec')
+    time = np.arange(0, 10, 0.01)
+    record(path, time)
+
+    recording = Recording(path)
+    assert len(recording) == len(time)
+    assert recording.getTimeRange() == (time[0], time[-1])
+    data = recording.read()
+    assert np.array_equal(data['time'], time)
+    assert np.array_equal(data['port_rpm'], np.sin(time))
+    assert np.array_equal(data['x'], 2 * time)
+    assert np.isnan(data['strb_rpm']).all()
+
+def test_seek_and_window(tmp_path):
+    path = str(tmp_path / 'run.rec')
+    time = np.arange(0, 10, 0.01)
+    record(path, time)
+    recording = Recording(path)
+
+    for t in (-1., 0., 0.995, 1., 4.567, 9.99, 20.):
+        assert recording.indexOf(t) == np.searchsorted(time, t)
+        assert recording.indexOf(t, 'right') == np.searchsorted(time, t, 'right')
+    window = recording.window(2.5, 3.5, columns=('time', 'x'))
+    assert np.array_equal(window['time'], time[(time >= 2.5) & (time <= 3.5)])
+    assert set(window) == {'time', 'x'}
+
+def test_replay(tmp_path):
+    path = str(tmp_path / 'run.rec')
+    time = np.arange(0, 10, 0.01)
+    record(path, time)
+
+    replayer = Replayer(path, 1., 8.)
+    blocks = list(replayer.blocks(rows=64, columns=('time',)))
+    assert np.array_equal(np.concatenate([b['time'] for b in blocks]), time[100:801])
+
+    # Played back as fast as the clock allows
+    now = [0.]
+    def clock():
+        now[0] += 0.5
+        return now[0]
+    played = list(replayer.play(speed=1., max_fps=None, columns=('time',), clock=clock, sleep=lambda s: None))
+    assert len(played) > 1
+    assert np.array_equal(np.concatenate([b['time'] for b in played]), time[100:801])
+
+def test_record_packets_in_order(tmp_path):
+    path = str(tmp_path / 'live.rec')
+    with Recorder(path) as recorder:
+        recorder.appendPackets(encodePackets([0., 1.], port_rpm=3.))
+        with pytest.raises(ValueError):
+            recorder.append([0.5])
+    assert np.array_equal(Recording(path).read()['port_rpm'], [3., 3.])
+
+def test_replayed_poses_are_recorded_poses(tmp_path):
+    from src.dt.DigitalTwinInterface import Tank_TD
+    from src.dt.Scenario import Scenario
+    path = str(tmp_path / 'twin.rec')
+    twin = Tank_TD(Scenario(end_time=2.), to_plot=False)
+    twin.record(path)
+    recorded = Recording(path).read(('x', 'y', 'theta'))
+    # The pose recorded at time[0] is the starting pose, before the first step
+    assert (recorded['x'][0], recorded['y'][0], recorded['theta'][0]) == (twin.tank.x, twin.tank.y, twin.tank.theta)
+
+    # Poses that rpm integration would not reproduce are still replayed as recorded
+    with Recorder(path) as recorder:
+        recorder.append(twin.time, port_rpm=twin.port_rpm, strb_rpm=twin.strb_rpm, x=recorded['x'] + 1.,
+                        y=recorded['y'], theta=recorded['theta'])
+    anim = Replayer(path).animator(headless=True)
+    assert np.allclose(anim.poses[:len(twin.time), 0], recorded['x'] + 1., atol=1e-5)
+    assert np.allclose(anim.poses[:len(twin.time), 2], recorded['theta'], atol=1e-6)
+    for j in (0, 10, len(twin.time) - 2):
+        anim.renderFrame(j)
+        assert np.isclose(anim.tank.x, recorded['x'][j + 1] + 1., atol=1e-5)
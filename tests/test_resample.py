@@ -0,0 +1,18 @@
+import numpy as np
+from src.simulation.resample import resample
+
+def test_kinds():
+    t = np.array([0., 1., 2., 3.])
+    values = np.array([0., 10., 20., 30.])
+    query = [-1., 0., 0.4, 0.6, 1., 2.5, 4.]
+    assert np.allclose(resample(t, values, query, 'hold'), [0, 0, 0, 0, 10, 20, 30])
+    assert np.allclose(resample(t, values, query, 'next'), [0, 0, 10, 10, 10, 30, 30])
+    assert np.allclose(resample(t, values, query, 'nearest'), [0, 0, 0, 10, 10, 20, 30])
+    assert np.allclose(resample(t, values, query, 'linear'), [0, 0, 4, 6, 10, 25, 30])
+
+def test_columns():
+    t = np.arange(5.)
+    values = np.column_stack((t, -t))
+    out = resample(t, values, [0.5, 3.25], 'linear')
+    assert out.shape == (2, 2)
+    assert np.allclose(out, [[0.5, -0.5], [3.25, -3.25]])
@@ -0,0 +1,115 @@
+import numpy as np
+from src.objects.DC_Motor import DC_Motor
+from src.simulation.ss_solver import ss_solver, ss_solver_stream, discretize
+from src.simulation.streaming import segmentChunks, RunningStats
+from src.simulation.segments import InputSegments
+from src.simulation.cache import cacheInfo, clearCaches
+
+def stepInputs():
+    time = np.arange(0, 10, 0.03)
+    v_s = np.where(time < 10/3, 18., np.where(time < 5, -12., 24.))
+    T_L = np.zeros_like(time) + 0.5
+    return time, np.column_stack((v_s, T_L))
+
+def test_foh_matches_odeint():
+    motor = DC_Motor()
+    time, U = stepInputs()
+    T, Y, X = ss_solver(motor.sys, time, U, [0., 0., 0.])
+    T_d, Y_d, X_d = ss_solver(motor.sys, time, U, [0., 0., 0.], method='foh')
+    assert np.allclose(X_d, X, rtol=1e-5, atol=1e-5 * np.abs(X).max())
+    assert np.allclose(Y_d, Y, rtol=1e-5, atol=1e-5 * np.abs(Y).max())
+
+def test_foh_nonuniform_time():
+    motor = DC_Motor()
+    time = np.sort(np.concatenate((np.linspace(0, 1, 40), [0.0123, 0.517])))
+    U = np.column_stack((np.sin(time) * 12, np.zeros_like(time)))
+    T, Y, X = ss_solver(motor.sys, time, U, [0., 0., 0.])
+    T_d, Y_d, X_d = ss_solver(motor.sys, time, U, [0., 0., 0.], method='foh')
+    assert np.allclose(X_d, X, rtol=1e-5, atol=1e-5 * np.abs(X).max())
+
+def test_zoh_constant_input():
+    motor = DC_Motor()
+    Ad, B0, B1 = discretize(motor.sys.A, motor.sys.B, 0.03, 'zoh')
+    assert np.allclose(B1, 0)
+    Ad_f, B0_f, B1_f = discretize(motor.sys.A, motor.sys.B, 0.03, 'foh')
+    assert np.allclose(Ad, Ad_f)
+    # A constant input is held identically by either method
+    assert np.allclose(B0, B0_f + B1_f)
+
+def test_ensemble_matches_single():
+    time, U = stepInputs()
+    R_a = np.array([0.45, 0.5, 0.55])
+    k = np.array([0.05, 0.048, 0.052])
+    T, Y, X = DC_Motor.simulateEnsemble(time, U[:, 0], U[:, 1], R_a=R_a, k=k)
+    assert X.shape == (3, len(time), 3)
+    assert Y.shape == (3, len(time))
+    for i in range(3):
+        T_i, Y_i, X_i = DC_Motor(resistance_armature=R_a[i], torque_constant=k[i]).simulateMotor(time, U[:, 0], U[:, 1])
+        assert np.allclose(X[i], X_i)
+        assert np.allclose(Y[i], Y_i)
+
+def test_stepper_matches_solver():
+    motor = DC_Motor()
+    time, U = stepInputs()
+    T, Y, X = ss_solver(motor.sys, time, U, [0., 0., 0.], method='zoh')
+    stepper = motor.stepper(0.03)
+    for k in range(1, len(time)):
+        y = stepper.step(U[k-1], time[k] - time[k-1])
+        assert np.allclose(stepper.x, X[k])
+        assert np.allclose(y, Y[k])
+
+def test_shared_caches():
+    clearCaches()
+    motors = [DC_Motor() for i in range(5)]
+    assert all(motor.sys is motors[0].sys for motor in motors)
+    time, U = stepInputs()
+    for motor in motors:
+        motor.simulateMotor(time, U[:, 0], U[:, 1])
+    info = cacheInfo()
+    assert info['motor_state_space']['misses'] == 1
+    assert info['discretization']['misses'] == 1
+    assert info['discretization']['hits'] == 4
+    clearCaches()
+    assert cacheInfo()['discretization']['size'] == 0
+
+def segmentInputs():
+    voltage = InputSegments([0, 1/3, 0.5, 2/3], [18., -12., -12., 24.], [0., 0., 30., 0.])
+    return InputSegments.stack(voltage, 0.05)
+
+def test_input_segments_evaluate():
+    U = segmentInputs()
+    assert U.inputs == 2 and len(U) == 4
+    assert np.allclose(U([0.1, 1/3, 0.6, 1.]), [[18., .05], [-12., .05], [-9., .05], [24., .05]])
+
+def test_schedule_keeps_last_of_equal_starts():
+    U = InputSegments.fromSchedule([(0, 12.), (1, 6.), (1, -6.), (2, 0.)])
+    assert len(U) == 3
+    assert np.allclose(U([0.5, 1., 1.5, 2.])[:, 0], [12., -6., -6., 0.])
+
+def test_segments_exact_across_breakpoints():
+    motor = DC_Motor()
+    time = np.arange(0, 1, 0.03)
+    U = segmentInputs()
+    T, Y, X = ss_solver(motor.sys, time, U, method='odeint', rtol=1e-10, atol=1e-12)
+    T_d, Y_d, X_d = ss_solver(motor.sys, time, U, method='foh')
+    assert np.allclose(X_d, X, rtol=1e-7, atol=1e-7 * np.abs(X).max())
+    # Sparse outputs land on the same trajectory
+    sparse = [0., time[7], time[30]]
+    T_s, Y_s, X_s = ss_solver(motor.sys, sparse, U, method='zoh')
+    assert np.allclose(X_s, X_d[[0, 7, 30]])
+
+def test_stream_matches_solver():
+    motor = DC_Motor()
+    U = segmentInputs()
+    time = np.arange(0, 1, 0.001)
+    T, Y, X = ss_solver(motor.sys, time, U(time), method='foh')
+    chunks = list(ss_solver_stream(motor.sys, segmentChunks(U, 1, 0.001, chunk_size=137)))
+    assert np.array_equal(np.concatenate([c[0] for c in chunks]), time)
+    assert np.allclose(np.concatenate([c[2] for c in chunks]), X)
+    assert np.allclose(np.concatenate([c[1] for c in chunks]), Y)
+
+    stats = RunningStats()
+    for T_c, Y_c, X_c in chunks: stats.update(X_c)
+    assert stats.count == len(time)
+    assert np.allclose(stats.mean, X.mean(axis=0)) and np.allclose(stats.std, X.std(axis=0))
+    assert np.array_equal(stats.min, X.min(axis=0)) and np.array_equal(stats.max, X.max(axis=0))